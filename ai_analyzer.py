@@ -1,29 +1,40 @@
 import os
 import json
 import time
-import google.generativeai as genai
+from collections import defaultdict
 from dotenv import load_dotenv
 from database_manager import DatabaseManager
 from notifier import Notifier
+import gemini
+import metrics
+import profiling
+from prefilter import build_prefilter
+from priority import rank_queue
+from analysis_schema import ANALYSIS_SCHEMA, AnalysisValidationError, parse_analysis
+import logging
 import sys
-import io
+from log_config import setup_logging
 
-# 文字化け対策
-sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8')
+logger = logging.getLogger("ai_analyzer")
 
 load_dotenv()
 
-# Gemini設定
-API_KEY = os.environ.get("GEMINI_API_KEY")
-if not API_KEY:
-    raise ValueError("GEMINI_API_KEY not found in .env")
-
-genai.configure(api_key=API_KEY)
-# Use gemini-2.0-flash as confirmed by list_models
-model = genai.GenerativeModel('gemini-2.0-flash')
+# 同じ商品で分析失敗がこの回数に達したら隔離し、以降はAPIに送らない
+MAX_ANALYSIS_ATTEMPTS = int(os.environ.get("ANALYSIS_MAX_ATTEMPTS", "3"))
+# 0 にするとローカル事前フィルタを無効化し、全件をAIに送る
+PREFILTER_ENABLED = os.environ.get("PREFILTER_ENABLED", "1") != "0"
+# 1回の実行でAIに送る件数と、優先度付けのために読み込む候補数
+ANALYSIS_BATCH_SIZE = int(os.environ.get("ANALYSIS_BATCH_SIZE", "30"))
+ANALYSIS_CANDIDATE_POOL = int(os.environ.get("ANALYSIS_CANDIDATE_POOL", "100"))
+# API制限を考慮した、分析1件ごとの待機秒数
+ANALYSIS_INTERVAL = float(os.environ.get("ANALYSIS_INTERVAL_SECONDS", "2"))
 
 def analyze_product_with_ai(product):
-    """Geminiを使って商品を分析する"""
+    """Geminiを使って商品を分析する
+
+    通信エラー時は None を返す。応答がスキーマを満たさない場合は
+    AnalysisValidationError を送出する。
+    """
     
     prompt = f"""
     あなたはプロの「トレンド分析官」です。
@@ -51,42 +62,93 @@ def analyze_product_with_ai(product):
     }}
     """
     
+    model = gemini.get_model()
+    metrics.incr("model_calls")
     try:
-        response = model.generate_content(prompt, generation_config={"response_mime_type": "application/json"})
-        result_json = json.loads(response.text)
-        
-        # 配列で返ってきた場合の対策
-        if isinstance(result_json, list):
-            if len(result_json) > 0:
-                result_json = result_json[0]
-            else:
-                return None
-                
-        return result_json
+        response = model.generate_content(
+            prompt,
+            generation_config={
+                "response_mime_type": "application/json",
+                "response_schema": ANALYSIS_SCHEMA
+            }
+        )
     except Exception as e:
-        print(f"AI Analysis Error for {product['title']}: {e}")
+        # 通信エラーやレート制限は商品側の問題ではないので失敗回数に数えない
+        logger.warning(f"AI Analysis Error for {product['title']}: {e}", extra={"product_id": product['id']})
         return None
 
+    try:
+        text = response.text
+    except ValueError as e:
+        # セーフティブロック等で本文が返らなかった場合
+        raise AnalysisValidationError(f"no text in response: {e}") from e
+
+    return parse_analysis(text)
+
+@profiling.profiled("analyzer")
 def run_analysis_loop():
+    # APIキーが無ければ、DBに触る前にここで失敗させる
+    gemini.get_model()
     db = DatabaseManager()
-    notifier = Notifier()
+
+    def on_delivered(product_ids):
+        delivered_at = metrics.now_iso()
+        for product_id in product_ids:
+            db.mark_notified(product_id, delivered_at)
+        metrics.incr("notifications_sent", len(product_ids))
+
+    notifier = Notifier(on_delivered)
     
-    print("AI分析プロセスを開始します...")
+    logger.info("AI分析プロセスを開始します...")
     
-    # 処理件数を5件から30件に増やして、バックログ（溜まり）を防ぐ
-    new_products = db.get_new_products(limit=30)
+    # 保存済みの優先度の上位と新着を候補として読み込み、新しさを加えて並べ直す。
+    # 事前フィルタで絞ってからAIに送る
+    new_products = rank_queue(
+        db.get_new_products(limit=ANALYSIS_CANDIDATE_POOL)
+        + db.get_new_products(limit=ANALYSIS_CANDIDATE_POOL, newest=True)
+    )
     
     if not new_products:
-        print("分析待ちの商品はありません。")
+        logger.info("分析待ちの商品はありません。")
+        notifier.close()
+        metrics.flush(db, "analyzer")
         return
 
+    # 明らかな対象外はAIに送らずに除外する
+    if PREFILTER_ENABLED:
+        with profiling.span("prefilter"):
+            prefilter = build_prefilter(db)
+            new_products, rejected = prefilter.split(new_products)
+        if prefilter.report and prefilter.report["recall"] is not None:
+            metrics.gauge("prefilter_recall", prefilter.report["recall"])
+        # 理由とスコアが同じものはまとめて1回の更新で書き込む（スコアは表示と同じ桁に丸める）
+        discarded = defaultdict(list)
+        for product, reason, score in rejected:
+            logger.info(f"PreFilter discarded: {product['title']} ({reason})",
+                        extra={"product_id": product['id'], "prefilter_score": score})
+            discarded[(reason, None if score is None else round(score, 3))].append(product['id'])
+        for (reason, score), ids in discarded.items():
+            db.discard_products(ids, {"investment_value": "C", "prefilter": {"reason": reason, "score": score}})
+        metrics.incr("model_calls_avoided", len(rejected))
+        logger.info(f"PreFilter: AI呼び出しを {len(rejected)} 件削減 (残り {len(new_products)} 件)")
+
+    new_products = new_products[:ANALYSIS_BATCH_SIZE]
+
     for product in new_products:
-        print(f"\nAnalyzing: {product['title']} (¥{product['price']})")
-        
-        analysis = analyze_product_with_ai(product)
+        logger.info(f"Analyzing: {product['title']} (¥{product['price']})", extra={"product_id": product['id']})
         
+        started_at = metrics.now_iso()
+        try:
+            analysis = analyze_product_with_ai(product)
+        except AnalysisValidationError as e:
+            metrics.incr("analysis_invalid")
+            logger.warning(f"Invalid analysis response: {e}", extra={"product_id": product['id']})
+            db.record_analysis_failure(product, e, MAX_ANALYSIS_ATTEMPTS)
+            continue
+
         if analysis:
-            print(f"Result: {json.dumps(analysis, ensure_ascii=False)}")
+            logger.info(f"Result: {json.dumps(analysis, ensure_ascii=False)}",
+                        extra={"product_id": product['id'], "analysis": analysis})
             
             # ステータスの決定
             inv_val = analysis.get('investment_value', 'C')
@@ -96,16 +158,28 @@ def run_analysis_loop():
                 new_status = 'discarded'
             
             # DB更新
-            db.update_product_analysis(product['id'], analysis, new_status)
+            db.update_product_analysis(product['id'], analysis, new_status, {
+                "analysis_started_at": started_at,
+                "analyzed_at": metrics.now_iso()
+            })
+            metrics.incr(f"analyzed_{new_status}")
             
             # 通知（利益商品の場合）
             if new_status == 'profitable':
-                notifier.send_profitable_item(product, analysis)
+                if notifier.send_profitable_item(product, analysis):
+                    metrics.incr("notifications_queued")
             
             # API制限考慮
-            time.sleep(2)
+            time.sleep(ANALYSIS_INTERVAL)
         else:
-            print("Skipping update due to error.")
+            metrics.incr("analysis_errors")
+            logger.warning("Skipping update due to error.", extra={"product_id": product['id']})
+
+    notifier.close()
+    metrics.flush(db, "analyzer")
 
 if __name__ == "__main__":
+    if "--profile" in sys.argv:
+        profiling.enable()
+    setup_logging("analyzer")
     run_analysis_loop()
@@ -0,0 +1,118 @@
+import json
+import re
+import unicodedata
+
+# Geminiに渡すレスポンススキーマ（OpenAPIサブセット形式）
+ANALYSIS_SCHEMA = {
+    "type": "OBJECT",
+    "properties": {
+        "trend_reason": {"type": "STRING"},
+        "heat_level": {"type": "STRING", "enum": ["High", "Medium", "Low"]},
+        "future_prediction": {"type": "STRING"},
+        "investment_value": {"type": "STRING", "enum": ["S", "A", "B", "C"]},
+        "genre": {"type": "STRING"},
+    },
+    "required": ["trend_reason", "heat_level", "future_prediction", "investment_value", "genre"],
+}
+
+HEAT_LEVELS = ("High", "Medium", "Low")
+INVESTMENT_VALUES = ("S", "A", "B", "C")
+TEXT_FIELDS = ("trend_reason", "future_prediction", "genre")
+
+_FENCE_RE = re.compile(r"^```(?:json)?\s*|\s*```$", re.IGNORECASE)
+
+
+class AnalysisValidationError(ValueError):
+    """AIの応答がスキーマを満たさず、修復もできなかった場合のエラー"""
+
+
+def validate_analysis(data):
+    """スキーマ違反の一覧を返す（空リストなら有効）"""
+    if not isinstance(data, dict):
+        return [f"object expected, got {type(data).__name__}"]
+
+    errors = []
+    for field in TEXT_FIELDS:
+        if not isinstance(data.get(field), str):
+            errors.append(f"{field}: string expected")
+    if data.get("heat_level") not in HEAT_LEVELS:
+        errors.append(f"heat_level: invalid value {data.get('heat_level')!r}")
+    if data.get("investment_value") not in INVESTMENT_VALUES:
+        errors.append(f"investment_value: invalid value {data.get('investment_value')!r}")
+    return errors
+
+
+def _extract_json(text):
+    """コードフェンスや前後の余計なテキストを除いて最初のJSON値を取り出す"""
+    text = _FENCE_RE.sub("", text.strip())
+    starts = [i for i in (text.find("{"), text.find("[")) if i >= 0]
+    if not starts:
+        raise AnalysisValidationError("no JSON value found in response")
+    try:
+        value, _ = json.JSONDecoder().raw_decode(text[min(starts):])
+    except json.JSONDecodeError as e:
+        raise AnalysisValidationError(f"invalid JSON: {e}") from e
+    return value
+
+
+def _fix_enum(value, choices):
+    """'high' や 'Ｓランク' などの表記揺れを正規の列挙値に寄せる"""
+    if not isinstance(value, str):
+        return value
+    norm = unicodedata.normalize("NFKC", value).strip()
+    for choice in choices:
+        if norm.lower() == choice.lower():
+            return choice
+    # "Sランク", "A (高い)" のように先頭に値が来るケース
+    for choice in choices:
+        if norm.upper().startswith(choice.upper()):
+            return choice
+    return value
+
+
+def repair_analysis(data):
+    """よくある欠陥をローカルで修復する（配列ラップ・列挙値の大小文字・文字列以外の値）
+
+    必須項目の欠損は補わない。validate_analysis で不正として扱い、再試行に回す。
+    """
+    # 配列で返ってきた場合は最初のオブジェクトを採用
+    if isinstance(data, list):
+        data = next((d for d in data if isinstance(d, dict)), None)
+    # {"analysis": {...}} のように1階層ラップされている場合
+    if isinstance(data, dict) and len(data) == 1:
+        inner = next(iter(data.values()))
+        if isinstance(inner, dict) and "investment_value" in inner:
+            data = inner
+    if not isinstance(data, dict):
+        return data
+
+    data = dict(data)
+    data["heat_level"] = _fix_enum(data.get("heat_level"), HEAT_LEVELS)
+    data["investment_value"] = _fix_enum(data.get("investment_value"), INVESTMENT_VALUES)
+    for field in TEXT_FIELDS:
+        if data.get(field) is not None and not isinstance(data[field], str):
+            data[field] = str(data[field])
+    return data
+
+
+def parse_analysis(text):
+    """AIの応答テキストを検証済みの分析結果dictに変換する
+
+    まず素のjson.loadsで高速に検証し、失敗した場合のみ修復パスを通す。
+    修復しても不正な場合は AnalysisValidationError を送出する。
+    """
+    if not text or not text.strip():
+        raise AnalysisValidationError("empty response")
+
+    try:
+        data = json.loads(text)
+        if not validate_analysis(data):
+            return data
+    except json.JSONDecodeError:
+        data = _extract_json(text)
+
+    data = repair_analysis(data)
+    errors = validate_analysis(data)
+    if errors:
+        raise AnalysisValidationError("; ".join(errors))
+    return data
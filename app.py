@@ -5,6 +5,7 @@ import json
 import os
 import subprocess
 import sys
+import metrics
 
 # ページ設定
 st.set_page_config(
@@ -96,17 +97,12 @@ def stop_bot():
 def get_all_genres():
     try:
         db = DatabaseManager()
-        res = db.supabase.table("products").select("ai_analysis").neq("status", "new").order("scraped_at", desc=True).limit(1000).execute()
-        genres = set()
-        for item in res.data:
-            ai = item.get('ai_analysis')
-            if not ai: continue
-            if isinstance(ai, str):
-                try: ai = json.loads(ai)
-                except: continue
-            if isinstance(ai, dict):
-                g = ai.get('genre')
-                if g: genres.add(g)
+        # ジャンルだけを射影して全件を走査する
+        rows = db.iter_rows(
+            "products", "id, genre:ai_analysis->>genre",
+            filters=lambda q: q.neq("status", "new").not_.is_("ai_analysis->>genre", "null")
+        )
+        genres = {row['genre'] for row in rows if row.get('genre')}
         return sorted(list(genres))
     except:
         return []
@@ -114,7 +110,7 @@ def get_all_genres():
 def load_data(search_query=None, selected_genres=None):
     db = DatabaseManager()
     try:
-        query = db.supabase.table("products").select("*").neq("status", "new").gt("price", 0)
+        query = db.supabase.table("products").select("*").neq("status", "new").neq("status", "quarantined").gt("price", 0)
         if search_query:
             filter_str = f"title.ilike.*{search_query}*,ai_analysis->>genre.ilike.*{search_query}*"
             query = query.or_(filter_str)
@@ -201,7 +197,7 @@ def show_product_research(is_admin):
                 if is_admin:
                     a1, a2 = st.columns(2)
                     if a1.button("🔄 再分析", key=f"re_{item['id']}"):
-                        DatabaseManager().supabase.table("products").update({"status": "new", "ai_analysis": None}).eq("id", item['id']).execute()
+                        DatabaseManager().requeue_for_analysis([item['id']])
                         st.rerun()
                     if a2.button("🗑️ 除外", key=f"del_{item['id']}"):
                         DatabaseManager().supabase.table("products").update({"status": "discarded"}).eq("id", item['id']).execute()
@@ -220,11 +216,52 @@ def show_settings(is_admin):
                 st.rerun()
     with c2 as col2:
         if st.button("🔥 トレンド自動取得"):
-            subprocess.run([sys.executable, "trend_watcher.py"])
+            subprocess.run([sys.executable, "scouter.py", "trends"])
             st.rerun()
     configs = db.get_active_search_configs()
     if configs: st.dataframe(pd.DataFrame(configs)[['keyword', 'target_profit', 'created_at']], use_container_width=True)
 
+@st.cache_data(ttl=60)
+def load_metrics(since_hours):
+    db = DatabaseManager()
+    return metrics.load_stage_rows(db, since_hours), metrics.load_recent_runs(db)
+
+def show_metrics():
+    st.header("📊 パイプライン計測")
+    since_hours = st.selectbox("集計期間", [6, 24, 72, 168], index=1, format_func=lambda h: f"直近{h}時間")
+    try:
+        stage_rows, runs = load_metrics(since_hours)
+    except Exception as e:
+        st.error(f"計測データ取得エラー: {e}")
+        return
+
+    latencies = metrics.stage_latencies(stage_rows)
+    if latencies.empty:
+        st.info("レイテンシの計測データがまだありません。")
+    else:
+        st.subheader("⏱️ 段階別レイテンシ (秒)")
+        st.dataframe(metrics.latency_percentiles(latencies).round(1), use_container_width=True)
+        stage = st.selectbox("ヒストグラム", list(metrics.STAGES.keys()), index=list(metrics.STAGES.keys()).index("time_to_alert"))
+        values = latencies[latencies["stage"] == stage]["seconds"]
+        if not values.empty:
+            bins = pd.cut(values, bins=min(20, max(values.nunique(), 1)))
+            hist = bins.value_counts(sort=False)
+            hist.index = [f"{iv.left:.0f}-{iv.right:.0f}s" for iv in hist.index]
+            st.bar_chart(hist)
+        with st.expander("キーワード別"):
+            st.dataframe(metrics.latency_percentiles(latencies, by=("keyword", "stage")).round(1), use_container_width=True)
+
+    if runs:
+        st.subheader("🔢 実行ごとのカウンタ")
+        df = pd.DataFrame(runs)
+        counters = pd.json_normalize(df["counters"]).fillna(0)
+        st.dataframe(pd.concat([df[["component", "finished_at"]], counters], axis=1), use_container_width=True)
+
+        rss = metrics.gauge_series(runs, "browser_rss_mb")
+        if not rss.empty:
+            st.subheader("🧠 ブラウザのメモリ (MB)")
+            st.line_chart(rss.set_index("time")["value"])
+
 def main():
     # --- サイドバーを最優先で描画 ---
     with st.sidebar:
@@ -248,10 +285,11 @@ def main():
 
     # --- メイン画面 ---
     if is_admin:
-        tab_h, tab_r, tab_s = st.tabs(["🏠 ホーム", "🔎 リサーチ", "⚙️ 設定"])
+        tab_h, tab_r, tab_s, tab_m = st.tabs(["🏠 ホーム", "🔎 リサーチ", "⚙️ 設定", "📊 メトリクス"])
         with tab_h: show_about()
         with tab_r: show_product_research(is_admin)
         with tab_s: show_settings(is_admin)
+        with tab_m: show_metrics()
     else:
         tab_h, tab_r = st.tabs(["🏠 ホーム", "🔎 リサーチ"])
         with tab_h: show_about()
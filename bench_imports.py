@@ -0,0 +1,69 @@
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+# CLIの各経路のコールドスタート（新しいプロセスでの import 時間）を計測する
+#
+#   python bench_imports.py              # 各経路の中央値
+#   python bench_imports.py analyze      # その経路で時間のかかったモジュール上位
+#   IMPORT_BUDGET_MS=150 python bench_imports.py   # "cli" が予算を超えたら終了コード1
+#
+# python 自体の起動時間（空の -c ""）を差し引いた値を表示する。
+
+RUNS = int(os.environ.get("BENCH_RUNS", "5"))
+BUDGET_MS = float(os.environ.get("IMPORT_BUDGET_MS", "0"))
+
+# 経路名 -> その経路で scouter.py が読み込むもの
+TARGETS = {
+    "cli": "import scouter",
+    "inspect": "import scouter, debug_db, debug_products, check_latest_profitable, inspect_analysis, database_manager as d; d.DatabaseManager",
+    "reset": "import scouter, reset_data_status, reanalyze_all, reset_data",
+    "trends": "import scouter, trend_watcher",
+    "analyze": "import scouter, ai_analyzer",
+    "scrape": "import scouter, main_scouter",
+    # 実際に接続・モデル生成する時点で読み込まれる重い依存
+    "supabase": "import supabase",
+    "gemini": "import google.generativeai",
+    "playwright": "import playwright.sync_api",
+}
+
+
+def measure(code):
+    timings = []
+    for _ in range(RUNS):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, "-W", "ignore", "-c", code], check=True, env={**os.environ, "PYTHONDONTWRITEBYTECODE": "1"})
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings)
+
+
+def top_modules(code, limit=15):
+    """-X importtime の累積時間が大きいモジュール"""
+    result = subprocess.run([sys.executable, "-W", "ignore", "-X", "importtime", "-c", code], capture_output=True, text=True, check=True)
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative_us, name = line[len("import time:"):].split("|")
+        rows.append((int(cumulative_us), name.strip()))
+    for cumulative_us, name in sorted(rows, reverse=True)[:limit]:
+        print(f"{cumulative_us / 1000:>9.1f}ms  {name}")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        top_modules(TARGETS[sys.argv[1]])
+        sys.exit(0)
+
+    baseline = measure("pass")
+    print(f"python起動: {baseline:.0f}ms（以下はこれを差し引いた値）")
+    results = {}
+    for name, code in TARGETS.items():
+        results[name] = measure(code) - baseline
+        print(f"{name:<12}{results[name]:>8.0f}ms")
+
+    if BUDGET_MS and results["cli"] > BUDGET_MS:
+        print(f"cli の起動が予算 {BUDGET_MS:.0f}ms を超えています")
+        sys.exit(1)
@@ -0,0 +1,105 @@
+import json
+import os
+import sys
+import time
+from playwright.sync_api import sync_playwright
+from browser_policy import EXTRA_PATTERNS, USER_AGENT, ResourcePolicy
+from platforms import MercariAdapter
+
+# 検索ページの転送量と読み込み時間を、遮断ポリシーの有無で比較する
+#
+# 1. 実ページを HAR として記録（ポリシーなしで全リソースを保存）
+#      python bench_page_load.py --record "https://jp.mercari.com/search?keyword=Switch&sort=created_time&order=desc"
+# 2. 記録済みフィクスチャを再生して比較（ネットワークには出ない）
+#      python bench_page_load.py
+
+FIXTURE_DIR = os.environ.get("PAGE_FIXTURE_DIR", "fixtures/pages")
+RUNS = int(os.environ.get("BENCH_RUNS", "3"))
+
+
+def record(urls):
+    os.makedirs(FIXTURE_DIR, exist_ok=True)
+    with sync_playwright() as p:
+        browser = p.chromium.launch(headless=True)
+        for i, url in enumerate(urls):
+            har_path = os.path.join(FIXTURE_DIR, f"page{i}.har")
+            context = browser.new_context(user_agent=USER_AGENT, record_har_path=har_path, record_har_content="embed")
+            page = context.new_page()
+            page.goto(url, wait_until="load")
+            page.wait_for_timeout(5000)
+            context.close()
+            print(f"recorded {url} -> {har_path}")
+        browser.close()
+
+
+def measure(browser, har_path, policy):
+    """HARを再生して1回分の (転送バイト数, リクエスト数, 遮断数, DOMContentLoaded秒, load秒) を返す"""
+    context = browser.new_context(user_agent=USER_AGENT)
+    context.route_from_har(har_path, not_found="abort")
+
+    page = context.new_page()
+    if policy:
+        # スクレイパーと同じくCDPで遮断する（遮断されたリクエストは ERR_BLOCKED_BY_CLIENT で失敗する）
+        policy.apply(page)
+    requests = []
+    failed = []
+    page.on("requestfinished", requests.append)
+    page.on("requestfailed", failed.append)
+    url = _har_page_url(har_path)
+
+    start = time.perf_counter()
+    page.goto(url, wait_until="domcontentloaded")
+    dom_ready = time.perf_counter() - start
+    page.wait_for_load_state("load")
+    loaded = time.perf_counter() - start
+    page.wait_for_timeout(500)
+
+    transferred = 0
+    for request in requests:
+        sizes = request.sizes()
+        transferred += sizes["responseBodySize"] + sizes["responseHeadersSize"]
+    blocked = sum(1 for request in failed if "ERR_BLOCKED_BY_CLIENT" in (request.failure or ""))
+    context.close()
+    return transferred, len(requests), blocked, dom_ready, loaded
+
+
+def _har_page_url(har_path):
+    """HARに記録された最初のページの、最初のリクエスト（ドキュメント）のURLを返す"""
+    with open(har_path, encoding="utf-8") as f:
+        log = json.load(f)["log"]
+    entries = log["entries"]
+    if log.get("pages"):
+        page_id = log["pages"][0]["id"]
+        entries = [e for e in entries if e.get("pageref") == page_id] or entries
+    return entries[0]["request"]["url"]
+
+
+def compare():
+    fixtures = sorted(f for f in os.listdir(FIXTURE_DIR) if f.endswith(".har")) if os.path.isdir(FIXTURE_DIR) else []
+    if not fixtures:
+        print(f"{FIXTURE_DIR} にフィクスチャがありません。--record で記録してください。")
+        return
+
+    # スクレイパーのワーカーと同じ遮断パターン（共通 + プラットフォーム固有）
+    policy = ResourcePolicy(extra=EXTRA_PATTERNS + MercariAdapter.block_patterns)
+    print(f"{'fixture':<14}{'mode':<8}{'KB':>10}{'reqs':>7}{'blocked':>9}{'DCL(s)':>9}{'load(s)':>9}")
+    with sync_playwright() as p:
+        browser = p.chromium.launch(headless=True)
+        for fixture in fixtures:
+            har_path = os.path.join(FIXTURE_DIR, fixture)
+            for mode, active in (("before", None), ("after", policy)):
+                runs = [measure(browser, har_path, active) for _ in range(RUNS)]
+                kb = sum(r[0] for r in runs) / len(runs) / 1024
+                reqs = sum(r[1] for r in runs) / len(runs)
+                blocked = sum(r[2] for r in runs) / len(runs)
+                dcl = sorted(r[3] for r in runs)[len(runs) // 2]
+                load = sorted(r[4] for r in runs)[len(runs) // 2]
+                print(f"{fixture:<14}{mode:<8}{kb:>10.1f}{reqs:>7.0f}{blocked:>9.0f}{dcl:>9.2f}{load:>9.2f}")
+        browser.close()
+
+
+if __name__ == "__main__":
+    if "--record" in sys.argv:
+        record(sys.argv[sys.argv.index("--record") + 1:])
+    else:
+        compare()
@@ -0,0 +1,64 @@
+import fnmatch
+import os
+
+# 検索ページ用のブラウザ設定
+#
+# 検索結果から読むのはテキストと属性だけなので、画像・動画・フォント・計測タグは
+# 読み込まない。Playwright の route() はHTTPキャッシュを無効にしてしまうため、
+# Chromium の Network.setBlockedURLs（CDP）でURLパターンごとに遮断し、
+# 永続プロファイルのディスクキャッシュ（JS/CSS）はキーワード間・実行間で使い回す。
+
+USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
+PROFILE_DIR = os.environ.get("BROWSER_PROFILE_DIR", ".browser_profile")
+
+BLOCK_PATTERNS = {
+    "image": ["*.jpg*", "*.jpeg*", "*.png*", "*.gif*", "*.webp*", "*.avif*", "*.svg*", "*.ico*"],
+    "media": ["*.mp4*", "*.webm*", "*.m3u8*", "*.mp3*"],
+    "font": ["*.woff*", "*.ttf*", "*.otf*", "*.eot*"],
+    "tracker": ["*google-analytics.com*", "*googletagmanager.com*", "*doubleclick.net*",
+                "*googlesyndication.com*", "*facebook.net*", "*facebook.com/tr*", "*criteo.*",
+                "*adservice.google.*", "*clarity.ms*", "*hotjar.com*", "*amplitude.com*",
+                "*branch.io*", "*sentry.io*", "*datadoghq*", "*newrelic.com*", "*nr-data.net*",
+                "*appsflyer.com*", "*tiktok.com/i18n/pixel*", "*yimg.jp/images/listing*"],
+}
+# 遮断するカテゴリ（カンマ区切り）。空にするとすべて読み込む
+BLOCKED_CATEGORIES = [c.strip() for c in os.environ.get("BROWSER_BLOCK", "image,media,font,tracker").split(",") if c.strip()]
+# 追加で遮断するURLパターン（カンマ区切り）。プラットフォーム固有のものは platforms.py 側に持つ
+EXTRA_PATTERNS = [p.strip() for p in os.environ.get("BROWSER_BLOCK_EXTRA", "").split(",") if p.strip()]
+
+
+class ResourcePolicy:
+    """遮断するURLパターンの集合"""
+
+    def __init__(self, categories=None, extra=None):
+        categories = BLOCKED_CATEGORIES if categories is None else categories
+        self.patterns = [p for c in categories for p in BLOCK_PATTERNS.get(c, [])]
+        self.patterns += EXTRA_PATTERNS if extra is None else extra
+
+    def should_block(self, url):
+        return any(fnmatch.fnmatchcase(url, pattern) for pattern in self.patterns)
+
+    def apply(self, page):
+        """ページにCDPで遮断パターンを設定する（キャッシュは有効なまま）"""
+        if not self.patterns:
+            return
+        session = page.context.new_cdp_session(page)
+        session.send("Network.enable")
+        session.send("Network.setBlockedURLs", {"urls": self.patterns})
+
+
+def launch_search_context(playwright, profile_dir=PROFILE_DIR, headless=True):
+    """永続プロファイル付きのブラウザコンテキストを起動する（ディスクキャッシュを実行間で共有）"""
+    return playwright.chromium.launch_persistent_context(
+        profile_dir,
+        headless=headless,
+        user_agent=USER_AGENT,
+        service_workers="block",
+    )
+
+
+def open_search_page(context, policy=None):
+    """遮断ポリシーを適用した検索用ページを返す"""
+    page = context.pages[0] if context.pages else context.new_page()
+    (policy or ResourcePolicy()).apply(page)
+    return page
@@ -0,0 +1,147 @@
+import logging
+import os
+import metrics
+from browser_policy import PROFILE_DIR, launch_search_context, open_search_page
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+# 長時間動かすスクレイパー用のブラウザ管理
+#
+# 同じChromiumで何百回も page.goto すると、レンダラやGPUプロセスのメモリが
+# 少しずつ増え続ける。一定ページ数ごと、または子プロセスの合計RSSが上限を超えたら
+# コンテキスト（＝永続プロファイルのブラウザ本体）を閉じて作り直す。
+# ディスクキャッシュはプロファイルに残るので、作り直しのコストは起動時間だけで済む。
+# ブラウザが落ちた場合は次に page() を呼んだときに自動で起動し直す。
+
+MAX_PAGES = int(os.environ.get("BROWSER_MAX_PAGES", "200"))
+# 子プロセス全体のRSS上限。複数プラットフォームを並行で動かす場合は全ブラウザの合計と比べる
+MAX_RSS_MB = float(os.environ.get("BROWSER_MAX_RSS_MB", "1500"))
+
+logger = logging.getLogger("browser_session")
+
+
+def child_rss_mb(pid=None):
+    """このプロセスの子孫（Playwrightドライバ・Chromium各プロセス）の合計RSS(MB)。測れなければ None"""
+    pid = pid or os.getpid()
+    if psutil:
+        total = 0
+        for child in psutil.Process(pid).children(recursive=True):
+            try:
+                total += child.memory_info().rss
+            except psutil.Error:
+                continue
+        return total / 1024 ** 2
+    return _proc_child_rss_mb(pid)
+
+
+def _proc_child_rss_mb(pid):
+    # psutil がない Linux 向け: /proc/<pid>/stat から親子関係とRSSを読む
+    if not os.path.isdir("/proc"):
+        return None
+    page_size = os.sysconf("SC_PAGE_SIZE")
+    children, rss = {}, {}
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                fields = f.read().rsplit(")", 1)[1].split()
+        except (OSError, IndexError):
+            continue
+        children.setdefault(int(fields[1]), []).append(int(entry))
+        rss[int(entry)] = int(fields[21]) * page_size
+
+    total, stack = 0, list(children.get(pid, []))
+    while stack:
+        child = stack.pop()
+        total += rss.get(child, 0)
+        stack.extend(children.get(child, []))
+    return total / 1024 ** 2
+
+
+class BrowserSession:
+    """検索用ブラウザコンテキストの寿命管理（再利用・定期的な作り直し・クラッシュ時の再起動）"""
+
+    def __init__(self, playwright, profile_dir=PROFILE_DIR, policy=None, max_pages=MAX_PAGES, max_rss_mb=MAX_RSS_MB):
+        self.playwright = playwright
+        self.profile_dir = profile_dir
+        self.policy = policy
+        self.max_pages = max_pages
+        self.max_rss_mb = max_rss_mb
+        self.context = None
+        self._page = None
+        self.pages_loaded = 0
+        self.crashed = False
+        self._closing = False
+        if psutil is None and not os.path.isdir("/proc"):
+            logger.warning("psutil が無く /proc も読めないためブラウザのRSSを測れません。"
+                           f"作り直しは {max_pages} ページごとのみになります（pip install psutil）")
+
+    def page(self):
+        """使えるページを返す（未起動なら起動、落ちていれば起動し直す）"""
+        if self.context is not None and not self.healthy():
+            logger.warning("ブラウザが応答しないため再起動します", extra={"pages": self.pages_loaded})
+            metrics.incr("browser_restarts")
+            self.close()
+        if self.context is None:
+            self._start()
+        return self._page
+
+    def _start(self):
+        context = launch_search_context(self.playwright, self.profile_dir)
+        try:
+            page = open_search_page(context, self.policy)
+        except Exception:
+            # ページを開けなかったブラウザは残さない（次の page() で起動し直す）
+            context.close()
+            raise
+        self.context, self._page = context, page
+        self.pages_loaded = 0
+        self.crashed = False
+        self._page.on("crash", self._on_crash)
+        self.context.on("close", self._on_crash)
+        metrics.incr("browser_launches")
+
+    def _on_crash(self, *_):
+        if not self._closing:
+            self.crashed = True
+
+    def healthy(self):
+        return self.context is not None and not self.crashed and not self._page.is_closed()
+
+    def page_done(self):
+        """1ページ処理するごとに呼ぶ。メモリを記録し、上限を超えていればコンテキストを作り直す"""
+        self.pages_loaded += 1
+        rss = child_rss_mb()
+        if rss is not None:
+            metrics.gauge("browser_rss_mb", round(rss, 1))
+            logger.debug(f"Browser RSS: {rss:.0f}MB ({self.pages_loaded} pages)",
+                         extra={"rss_mb": round(rss, 1), "pages": self.pages_loaded})
+
+        if self.pages_loaded >= self.max_pages:
+            self.recycle(f"{self.pages_loaded}ページに達した")
+        elif rss is not None and rss >= self.max_rss_mb:
+            self.recycle(f"RSSが{rss:.0f}MBに達した")
+
+    def recycle(self, reason):
+        """ブラウザを閉じる（次の page() で新しく起動する）"""
+        logger.info(f"ブラウザを作り直します: {reason}", extra={"pages": self.pages_loaded})
+        metrics.incr("browser_recycles")
+        self.close()
+
+    def close(self):
+        if self.context is None:
+            return
+        self._closing = True
+        try:
+            self.context.close()
+        except Exception as e:
+            # 既に落ちている場合は閉じる操作自体が失敗する
+            logger.debug(f"ブラウザの終了に失敗: {e}")
+        finally:
+            self.context = None
+            self._page = None
+            self._closing = False
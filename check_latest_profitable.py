@@ -1,5 +1,5 @@
 from database_manager import DatabaseManager
-import json
+from itertools import islice
 import sys
 import io
 
@@ -7,22 +7,22 @@ sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8')
 
 def check_profitable():
     db = DatabaseManager()
-    response = db.supabase.table("products")\
-        .select("title, price, ai_analysis, status")\
-        .eq("status", "profitable")\
-        .order("scraped_at", desc=True)\
-        .limit(5)\
-        .execute()
+    rows = db.iter_rows(
+        "products", "id, title, price, ai_analysis, status, scraped_at",
+        filters=lambda q: q.eq("status", "profitable"),
+        key="scraped_at", desc=True, page_size=5, prefetch=False
+    )
+    items = list(islice(rows, 5))
     
-    if not response.data:
+    if not items:
         print("有望な商品は見つかりませんでした。")
         return
 
-    print(f"--- 最新の有望商品 ({len(response.data)}件) ---")
-    for item in response.data:
+    print(f"--- 最新の有望商品 ({len(items)}件) ---")
+    for item in items:
         print(f"\n商品: {item['title']}")
         print(f"価格: ¥{item['price']:,}")
-        ai = item.get('ai_analysis', {})
+        ai = item.get('ai_analysis') or {}
         print(f"価値ランク: {ai.get('investment_value')}")
         print(f"理由: {ai.get('trend_reason')}")
 
@@ -1,68 +1,347 @@
 import os
-from supabase import create_client, Client
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
 from dotenv import load_dotenv
+import metrics
 
 load_dotenv()
 
+logger = logging.getLogger("database_manager")
+
+# 一括読み込みの1ページあたりの行数（Supabaseは1リクエスト最大1000行）
+PAGE_SIZE = int(os.environ.get("DB_PAGE_SIZE", "1000"))
+# 一括更新・削除で1リクエストにまとめるIDの数（URLの長さで決まる）
+ID_CHUNK_SIZE = int(os.environ.get("DB_ID_CHUNK_SIZE", "100"))
+
 class DatabaseManager:
     def __init__(self):
         url: str = os.environ.get("SUPABASE_URL")
         key: str = os.environ.get("SUPABASE_KEY")
         if not url or not key:
             raise ValueError("SUPABASE_URL and SUPABASE_KEY must be set in .env")
-        self.supabase: Client = create_client(url, key)
+        # supabase の import は重いので、実際に接続するときまで読み込まない
+        from supabase import create_client
+        self.supabase = create_client(url, key)
+        # DB往復回数の計測（PostgRESTへのHTTPリクエストごとに加算）
+        self.supabase.postgrest.session.event_hooks["request"].append(
+            lambda request: metrics.incr("db_round_trips")
+        )
+
+    def iter_pages(self, table, columns="*", filters=None, key="id", since=None, desc=False,
+                   page_size=PAGE_SIZE, prefetch=True):
+        """テーブルを (key, id) のキーセットでページ単位に読むジェネレータ
+
+        - columns: select する列（必要な列だけに絞ると転送量が減る）
+        - filters: クエリを受け取って条件を足した新しいクエリを返す関数
+          例: lambda q: q.eq("status", "new")
+        - key: 並び順の列（NULLを含まないこと）。"id" 以外なら id を同順の第2キーにする
+        - since: (key の値, id) を渡すとその続きから読む（key="id" なら id のみ）
+        - prefetch: 呼び出し側が1ページを処理している間に次のページを取得しておく
+
+        OFFSETを使わないので、テーブルが大きくても各ページのコストは一定。
+        サーバ側の上限で1ページが page_size より少なくても、空のページが返るまで読む。
+        """
+        cursor = since
+        if key != "id" and cursor is not None and not isinstance(cursor, (tuple, list)):
+            raise ValueError("since must be (key value, id) when key is not 'id'")
+
+        def fetch(cursor):
+            query = self.supabase.table(table).select(columns)
+            if filters:
+                query = filters(query)
+            query = query.order(key, desc=desc)
+            if key != "id":
+                query = query.order("id", desc=desc)
+            if cursor is not None:
+                op = "lt" if desc else "gt"
+                if key == "id":
+                    query = getattr(query, op)("id", cursor)
+                else:
+                    value, last_id = cursor
+                    query = query.or_(f'{key}.{op}."{value}",and({key}.eq."{value}",id.{op}.{last_id})')
+            return query.limit(page_size).execute().data
+
+        def next_cursor(rows):
+            last = rows[-1]
+            return last["id"] if key == "id" else (last[key], last["id"])
+
+        if not prefetch:
+            while True:
+                rows = fetch(cursor)
+                if not rows:
+                    return
+                yield rows
+                cursor = next_cursor(rows)
+
+        executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"prefetch-{table}")
+        try:
+            pending = executor.submit(fetch, cursor)
+            while True:
+                rows = pending.result()
+                if not rows:
+                    return
+                pending = executor.submit(fetch, next_cursor(rows))
+                yield rows
+        finally:
+            # 途中で読むのをやめた場合は先読み中のページを待たずに捨てる
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def iter_rows(self, table, columns="*", **kwargs):
+        """iter_pages を1行ずつ返すようにしたもの（引数は iter_pages と同じ）"""
+        for rows in self.iter_pages(table, columns, **kwargs):
+            yield from rows
+
+    def update_by_ids(self, table, values, ids, chunk_size=ID_CHUNK_SIZE):
+        """ID のリスト（またはイテレータ）の行を分割して更新し、件数を返す（結果の行は受け取らない）"""
+        from postgrest.types import ReturnMethod
+        return self._by_id_chunks(ids, chunk_size, lambda chunk: self.supabase.table(table)
+                                  .update(values, returning=ReturnMethod.minimal).in_("id", chunk).execute())
+
+    def delete_by_ids(self, table, ids, chunk_size=ID_CHUNK_SIZE):
+        """ID のリスト（またはイテレータ）の行を分割して削除し、件数を返す"""
+        from postgrest.types import ReturnMethod
+        return self._by_id_chunks(ids, chunk_size, lambda chunk: self.supabase.table(table)
+                                  .delete(returning=ReturnMethod.minimal).in_("id", chunk).execute())
+
+    def delete_all(self, table, key, chunk_size=ID_CHUNK_SIZE):
+        """id列の無いテーブルの全行を主キー key の値で分割して削除し、件数を返す"""
+        from postgrest.types import ReturnMethod
+        done = 0
+        while True:
+            rows = self.supabase.table(table).select(key).limit(chunk_size).execute().data
+            if not rows:
+                return done
+            self.supabase.table(table).delete(returning=ReturnMethod.minimal)\
+                .in_(key, [row[key] for row in rows]).execute()
+            done += len(rows)
+
+    def _by_id_chunks(self, ids, chunk_size, run):
+        done, chunk = 0, []
+        for row_id in ids:
+            chunk.append(row_id)
+            if len(chunk) >= chunk_size:
+                run(chunk)
+                done += len(chunk)
+                chunk = []
+        if chunk:
+            run(chunk)
+            done += len(chunk)
+        return done
+
+    def requeue_for_analysis(self, ids):
+        """商品を分析待ちに戻し、件数を返す（失敗回数・優先度もリセットして隔離から出す）"""
+        return self.update_by_ids("products", {
+            "status": "new",
+            "ai_analysis": None,
+            "analysis_attempts": 0,
+            "last_analysis_error": None,
+            "priority": 0.0,
+            "enqueued_at": datetime.now(timezone.utc).isoformat(),
+            # 前回の分析の段階時刻が残ると、段階ごとの所要時間が負になる
+            "analysis_started_at": None,
+            "analyzed_at": None,
+            "notified_at": None,
+        }, ids)
 
     def get_active_search_configs(self):
         """有効な検索設定を取得する"""
-        response = self.supabase.table("search_configs")\
-            .select("*")\
-            .eq("is_active", True)\
-            .execute()
-        return response.data
+        return list(self.iter_rows("search_configs", filters=lambda q: q.eq("is_active", True)))
 
-    def product_exists(self, platform: str, item_id: str) -> bool:
-        """商品が既にDBに存在するかチェックする"""
+    def get_known_items(self, platform, item_ids, columns="id, item_id, price"):
+        """item_ids のうち既にDBにある商品を {item_id: 行} で返す（1回の問い合わせ）"""
+        if not item_ids:
+            return {}
         response = self.supabase.table("products")\
-            .select("id")\
+            .select(columns)\
             .eq("platform", platform)\
-            .eq("item_id", item_id)\
+            .in_("item_id", list(item_ids))\
             .execute()
-        return len(response.data) > 0
+        return {row['item_id']: row for row in response.data}
 
-    def save_product(self, product_data: dict):
-        """商品データを保存する"""
+    def save_products(self, rows):
+        """商品をまとめて保存し、新規に入った行を返す（既存の (platform, item_id) は無視、全行が同じ列を持つこと）"""
+        if not rows:
+            return []
         try:
-            # 重複チェック
-            if self.product_exists(product_data['platform'], product_data['item_id']):
-                print(f"Skipping existing item: {product_data['item_id']}")
-                return None
-            
-            response = self.supabase.table("products").insert(product_data).execute()
-            print(f"Saved item: {product_data['title'][:20]}...")
-            return response.data
+            response = self.supabase.table("products")\
+                .upsert(rows, on_conflict="platform,item_id", ignore_duplicates=True)\
+                .execute()
         except Exception as e:
-            print(f"Error saving product: {e}")
-            return None
+            logger.error(f"Error saving products: {e}", extra={"count": len(rows)})
+            return []
+        for row in response.data:
+            logger.info(f"Saved item: {row['title'][:20]}...",
+                        extra={"item_id": row['item_id'], "platform": row['platform'], "keyword": row.get('keyword')})
+        return response.data
+
+    def get_new_products(self, limit=5, newest=False):
+        """分析待ち(status='new')の商品を保存済みの優先度の高い順（newest なら新着順）に取得する"""
+        query = self.supabase.table("products").select("*").eq("status", "new")
+        if newest:
+            query = query.order("enqueued_at", desc=True, nullsfirst=False)
+        else:
+            query = query.order("priority", desc=True, nullsfirst=False).order("scraped_at", desc=True)
+        return query.limit(limit).execute().data
+
+    def get_labeled_products(self, limit=1000):
+        """AIの判定済み(profitable/discarded)の商品を学習用に新しい順に最大 limit 件取得する
+
+        事前フィルタで自動除外した商品は、自己強化を避けるため含めない。
+        """
+        rows = []
+        pages = self.iter_pages(
+            "products", "id, title, price, status, scraped_at",
+            filters=self._labeled, key="scraped_at", desc=True, page_size=min(PAGE_SIZE, limit)
+        )
+        for page in pages:
+            rows.extend(page[:limit - len(rows)])
+            if len(rows) >= limit:
+                pages.close()
+                break
+        return rows
+
+    def count_labeled_products(self):
+        """get_labeled_products の対象になる商品の件数（行は受け取らない）"""
+        response = self._labeled(self.supabase.table("products").select("id", count="exact")).limit(1).execute()
+        return response.count or 0
+
+    @staticmethod
+    def _labeled(query):
+        # 事前フィルタで自動除外した商品は、自己強化を避けるため学習に含めない
+        return query.in_("status", ["profitable", "discarded"]).is_("ai_analysis->prefilter", "null")
+
+    def iter_product_pages(self, columns="id, keyword, price, scraped_at", since=None, page_size=PAGE_SIZE, key="scraped_at"):
+        """productsを (key, id) のキーセットで古い順にページ単位で取得するジェネレータ
+
+        since に (key の値, id) を渡すとその続きから読む。key は scraped_at か updated_at。
+        """
+        return self.iter_pages("products", columns, key=key, since=since, page_size=page_size)
+
+    def get_search_config_index_rows(self):
+        """キーワードの重複判定用に、全検索設定の最小限の列を取得する"""
+        return list(self.iter_rows("search_configs", "id, keyword, source, trend_score, is_active"))
 
-    def get_new_products(self, limit=5):
-        """分析待ち(status='new')の商品を取得する"""
+    def upsert_search_configs(self, rows):
+        """検索設定をまとめて追加・更新する（全行が同じ列を持つこと）"""
+        if rows:
+            self.supabase.table("search_configs").upsert(rows, on_conflict="id").execute()
+
+    def expire_trend_keywords(self, ttl_days):
+        """一定期間トレンドに挙がらなかったトレンド由来のキーワードを無効化し、件数を返す"""
+        cutoff = (datetime.now(timezone.utc) - timedelta(days=ttl_days)).isoformat()
+        response = self.supabase.table("search_configs")\
+            .update({"is_active": False})\
+            .eq("source", "trend")\
+            .eq("is_active", True)\
+            .lt("trend_seen_at", cutoff)\
+            .execute()
+        return len(response.data)
+
+    def get_feed_states(self, urls):
+        """RSSフィードの条件付きGET用の状態(ETag/Last-Modified)を {url: row} で返す"""
+        response = self.supabase.table("trend_feeds")\
+            .select("url, etag, last_modified")\
+            .in_("url", urls)\
+            .execute()
+        return {row['url']: row for row in response.data}
+
+    def save_feed_states(self, rows):
+        """フィードの状態をまとめて保存する"""
+        if rows:
+            self.supabase.table("trend_feeds").upsert(rows, on_conflict="url").execute()
+
+    def get_seen_headlines(self, hashes):
+        """既に処理した見出しのハッシュ集合を返す"""
+        if not hashes:
+            return set()
+        response = self.supabase.table("seen_headlines")\
+            .select("hash")\
+            .in_("hash", list(hashes))\
+            .execute()
+        return {row['hash'] for row in response.data}
+
+    def mark_headlines_seen(self, rows, retention_days=30):
+        """処理した見出しを記録し、保持期間を過ぎたものを削除する"""
+        if rows:
+            self.supabase.table("seen_headlines")\
+                .upsert(rows, on_conflict="hash", ignore_duplicates=True)\
+                .execute()
+        cutoff = (datetime.now(timezone.utc) - timedelta(days=retention_days)).isoformat()
+        self.supabase.table("seen_headlines").delete().lt("first_seen_at", cutoff).execute()
+
+    def update_product(self, product_id, values):
+        """商品1件の任意の列を更新する"""
+        self.supabase.table("products").update(values).eq("id", product_id).execute()
+
+    def get_due_price_checks(self, platform, now, scraped_after, limit, columns="*"):
+        """価格の再確認時刻を過ぎた出品中の商品を、再確認が遅れている順に取得する（対象外・隔離中は除く）"""
         response = self.supabase.table("products")\
-            .select("*")\
-            .eq("status", "new")\
+            .select(columns)\
+            .eq("platform", platform)\
+            .eq("listing_status", "open")\
+            .not_.in_("status", ["discarded", "quarantined"])\
+            .lte("next_check_at", now.isoformat())\
+            .gte("scraped_at", scraped_after.isoformat())\
+            .order("next_check_at")\
             .limit(limit)\
             .execute()
         return response.data
 
-    def update_product_analysis(self, item_id, analysis_result, new_status):
-        """分析結果とステータスを更新する"""
+    def insert_price_history(self, rows):
+        """価格の差分をまとめて追記する"""
+        if rows:
+            from postgrest.types import ReturnMethod
+            self.supabase.table("price_history").insert(rows, returning=ReturnMethod.minimal).execute()
+
+    def update_product_analysis(self, item_id, analysis_result, new_status, timings=None):
+        """分析結果とステータスを更新する（timings: 段階時刻の列も同じ更新で書き込む）"""
         try:
             self.supabase.table("products")\
                 .update({
                     "ai_analysis": analysis_result,
-                    "status": new_status
+                    "status": new_status,
+                    **(timings or {})
                 })\
                 .eq("id", item_id)\
                 .execute()
-            print(f"Updated product {item_id} status to {new_status}")
+            logger.debug(f"Updated product {item_id} status to {new_status}")
+        except Exception as e:
+            logger.error(f"Error updating product: {e}", extra={"product_id": item_id})
+
+    def discard_products(self, item_ids, analysis_result):
+        """同じ分析結果で除外する商品をIDの分割単位でまとめて更新する"""
+        try:
+            self.update_by_ids("products", {"ai_analysis": analysis_result, "status": "discarded"}, item_ids)
+        except Exception as e:
+            logger.error(f"Error discarding products: {e}")
+
+    def mark_notified(self, item_id, notified_at):
+        """通知が完了した時刻を記録する"""
+        try:
+            self.supabase.table("products")\
+                .update({"notified_at": notified_at})\
+                .eq("id", item_id)\
+                .execute()
+        except Exception as e:
+            logger.error(f"Error updating product: {e}", extra={"product_id": item_id})
+
+    def record_analysis_failure(self, product, error, max_attempts=3):
+        """分析失敗を記録し、規定回数を超えた商品は隔離(quarantined)する"""
+        attempts = (product.get('analysis_attempts') or 0) + 1
+        update = {
+            "analysis_attempts": attempts,
+            "last_analysis_error": str(error)[:500]
+        }
+        if attempts >= max_attempts:
+            update["status"] = "quarantined"
+        try:
+            self.supabase.table("products")\
+                .update(update)\
+                .eq("id", product['id'])\
+                .execute()
+            if attempts >= max_attempts:
+                logger.warning(f"Quarantined product {product['id']} after {attempts} failed attempts",
+                               extra={"product_id": product['id']})
         except Exception as e:
-            print(f"Error updating product: {e}")
+            logger.error(f"Error recording analysis failure: {e}", extra={"product_id": product['id']})
@@ -1,5 +1,5 @@
 from database_manager import DatabaseManager
-import pandas as pd
+from collections import Counter
 import sys
 import io
 
@@ -8,20 +8,27 @@ sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8')
 def debug_db_status():
     db = DatabaseManager()
     
-    # 全件取得
-    response = db.supabase.table("products").select("status, price").execute()
-    df = pd.DataFrame(response.data)
+    # 全件をページ単位で走査して集計（メモリには集計結果だけ持つ）
+    statuses = Counter()
+    zero_price = valid_price = 0
+    for row in db.iter_rows("products", "id, status, price"):
+        statuses[row['status']] += 1
+        if row['price'] == 0:
+            zero_price += 1
+        elif row['price'] > 0:
+            valid_price += 1
     
-    if df.empty:
+    if not statuses:
         print("DBは空です。")
         return
 
     print("--- DB保存状況の統計 ---")
-    print(df['status'].value_counts())
+    for status, count in statuses.most_common():
+        print(f"{status}: {count}")
     
     print("\n--- 価格0円のデータ数 ---")
-    print(f"価格0円: {len(df[df['price'] == 0])}件")
-    print(f"有効な価格: {len(df[df['price'] > 0])}件")
+    print(f"価格0円: {zero_price}件")
+    print(f"有効な価格: {valid_price}件")
 
 if __name__ == "__main__":
     debug_db_status()
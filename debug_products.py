@@ -1,6 +1,4 @@
-import os
 from database_manager import DatabaseManager
-from supabase import create_client
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -19,11 +17,9 @@ def check_products():
             print("解決策: スクレイピングを実行してデータを収集する必要があります。")
             return
 
-        # ステータスごとの内訳
-        status_res = db.supabase.table("products").select("status").execute()
+        # ステータスごとの内訳（全件をページ単位で走査）
         from collections import Counter
-        statuses = [item.get('status', 'unknown') for item in status_res.data]
-        counts = Counter(statuses)
+        counts = Counter(row.get('status') or 'unknown' for row in db.iter_rows("products", "id, status"))
         
         print("\nステータス内訳:")
         for status, count in counts.items():
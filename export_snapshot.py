@@ -0,0 +1,199 @@
+import glob
+import json
+import logging
+import os
+import sys
+import uuid
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from analysis_schema import ANALYSIS_SCHEMA
+from database_manager import DatabaseManager
+from log_config import setup_logging
+
+# products の分析用スナップショット（Parquet）への差分出力
+#
+#   snapshot/products/dt=YYYY-MM-DD/part-<実行ID>-<連番>.parquet
+#
+# dt は scraped_at（UTC）の日付。updated_at のキーセットで前回の続きから読み、
+# 1ページずつ書き出すのでメモリ使用量は件数によらず一定。更新された商品は
+# 元の日付パーティションに新しい行として追記され、読む側（snapshot_query.py）が
+# id ごとに updated_at の最新行だけを使う。--compact でパーティションを1ファイルに
+# まとめ直して古い版を捨てる。
+
+SNAPSHOT_DIR = os.environ.get("SNAPSHOT_DIR", "snapshot")
+PAGE_SIZE = int(os.environ.get("EXPORT_PAGE_SIZE", "1000"))
+# 前回の終端より少し前から読み直し、書き込み中だったトランザクションの取りこぼしを防ぐ
+OVERLAP_SECONDS = int(os.environ.get("EXPORT_OVERLAP_SECONDS", "300"))
+# 同時に開いておくパーティションのファイル数（超えたら古いものから閉じる）
+MAX_OPEN_FILES = int(os.environ.get("EXPORT_MAX_OPEN_FILES", "32"))
+
+PRODUCTS_DIR = os.path.join(SNAPSHOT_DIR, "products")
+STATE_PATH = os.path.join(SNAPSHOT_DIR, "_state.json")
+
+BASE_COLUMNS = ("id, platform, item_id, keyword, title, price, image_url, product_url, status, priority, "
+                "analysis_attempts, scraped_at, enqueued_at, analysis_started_at, analyzed_at, notified_at, "
+                "updated_at, ai_analysis")
+TIME_COLUMNS = ["scraped_at", "enqueued_at", "analysis_started_at", "analyzed_at", "notified_at", "updated_at"]
+ANALYSIS_FIELDS = list(ANALYSIS_SCHEMA["properties"])
+
+# ページごとに型が揺れないよう、スキーマを固定する
+SCHEMA = pa.schema(
+    [
+        ("id", pa.string()),
+        ("platform", pa.string()),
+        ("item_id", pa.string()),
+        ("keyword", pa.string()),
+        ("title", pa.string()),
+        ("price", pa.int64()),
+        ("image_url", pa.string()),
+        ("product_url", pa.string()),
+        ("status", pa.string()),
+        ("priority", pa.float64()),
+        ("analysis_attempts", pa.int64()),
+    ]
+    + [(column, pa.timestamp("us", tz="UTC")) for column in TIME_COLUMNS]
+    + [(f"ai_{field}", pa.string()) for field in ANALYSIS_FIELDS]
+    + [("ai_prefiltered", pa.bool_())]
+)
+
+logger = logging.getLogger("export_snapshot")
+
+
+def flatten(rows):
+    """1ページ分の行を ai_analysis を展開した DataFrame にする"""
+    df = pd.DataFrame.from_records(rows, columns=BASE_COLUMNS.split(", "))
+    analyses = [_as_dict(a) for a in df.pop("ai_analysis")]
+    for field in ANALYSIS_FIELDS:
+        df[f"ai_{field}"] = [a.get(field) if isinstance(a.get(field), str) else None for a in analyses]
+    df["ai_prefiltered"] = [bool(a.get("prefilter")) for a in analyses]
+    for column in TIME_COLUMNS:
+        df[column] = pd.to_datetime(df[column], utc=True, format="ISO8601")
+    df["analysis_attempts"] = df["analysis_attempts"].fillna(0).astype("int64")
+    df["priority"] = df["priority"].astype("float64")
+    return df
+
+
+def _as_dict(analysis):
+    # 古いデータには JSON 文字列で入っているものがある
+    if isinstance(analysis, str):
+        try:
+            analysis = json.loads(analysis)
+        except ValueError:
+            return {}
+    return analysis if isinstance(analysis, dict) else {}
+
+
+class PartitionWriter:
+    """日付パーティションごとの ParquetWriter を、開きすぎないように管理する"""
+
+    def __init__(self, root, run_id):
+        self.root = root
+        self.run_id = run_id
+        self.writers = OrderedDict()
+        self.file_count = 0
+        self.rows = 0
+
+    def write(self, df):
+        dates = df["scraped_at"].dt.strftime("%Y-%m-%d").fillna("unknown")
+        for dt, part in df.groupby(dates, sort=False):
+            self._writer(dt).write_table(pa.Table.from_pandas(part, schema=SCHEMA, preserve_index=False))
+            self.rows += len(part)
+
+    def _writer(self, dt):
+        if dt in self.writers:
+            self.writers.move_to_end(dt)
+            return self.writers[dt]
+        if len(self.writers) >= MAX_OPEN_FILES:
+            _, oldest = self.writers.popitem(last=False)
+            oldest.close()
+        directory = os.path.join(self.root, f"dt={dt}")
+        os.makedirs(directory, exist_ok=True)
+        self.file_count += 1
+        path = os.path.join(directory, f"part-{self.run_id}-{self.file_count:04d}.parquet")
+        writer = pq.ParquetWriter(path, SCHEMA, compression="zstd")
+        self.writers[dt] = writer
+        return writer
+
+    def close(self):
+        for writer in self.writers.values():
+            writer.close()
+        self.writers.clear()
+
+
+def load_state():
+    try:
+        with open(STATE_PATH, encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def save_state(state):
+    tmp = f"{STATE_PATH}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(state, f, ensure_ascii=False, indent=2)
+    os.replace(tmp, STATE_PATH)
+
+
+def export(db, full=False):
+    """前回の続きから products を書き出し、出力件数を返す"""
+    os.makedirs(PRODUCTS_DIR, exist_ok=True)
+    state = {} if full else load_state()
+    since = None
+    if state.get("watermark"):
+        # 前回の終端から OVERLAP_SECONDS 戻った時刻以降をすべて読む（重複は読む側で除く）
+        ts = pd.Timestamp(state["watermark"]) - timedelta(seconds=OVERLAP_SECONDS)
+        since = (ts.isoformat(), "00000000-0000-0000-0000-000000000000")
+
+    run_id = f"{datetime.now(timezone.utc):%Y%m%dT%H%M%S}-{uuid.uuid4().hex[:6]}"
+    writer = PartitionWriter(PRODUCTS_DIR, run_id)
+    watermark = state.get("watermark")
+    try:
+        for rows in db.iter_product_pages(BASE_COLUMNS, since=since, page_size=PAGE_SIZE, key="updated_at"):
+            writer.write(flatten(rows))
+            watermark = rows[-1]["updated_at"]
+            logger.debug(f"Exported {writer.rows} rows (up to {watermark})")
+    finally:
+        writer.close()
+
+    # ファイルを書き終えてから終端を進める（途中で落ちたら次回同じ範囲を書き直す）
+    save_state({"watermark": watermark, "last_run_id": run_id, "exported_at": datetime.now(timezone.utc).isoformat()})
+    logger.info(f"Exported {writer.rows} rows into {writer.file_count} files",
+                extra={"rows": writer.rows, "files": writer.file_count, "watermark": watermark})
+    return writer.rows
+
+
+def compact():
+    """パーティションごとに最新版の行だけを1ファイルに書き直す"""
+    import duckdb
+
+    con = duckdb.connect()
+    for directory in sorted(glob.glob(os.path.join(PRODUCTS_DIR, "dt=*"))):
+        files = sorted(glob.glob(os.path.join(directory, "*.parquet")))
+        if len(files) <= 1:
+            continue
+        target = os.path.join(directory, f"part-compact-{uuid.uuid4().hex[:8]}.parquet")
+        # ファイル一覧はSQLに埋め込まずパラメータで渡す（パスに引用符が入っても壊れない）
+        batches = con.execute("""
+            select * from read_parquet(?, hive_partitioning = false)
+            qualify row_number() over (partition by id order by updated_at desc) = 1
+        """, [files]).fetch_record_batch()
+        with pq.ParquetWriter(target, batches.schema, compression="zstd") as writer:
+            for batch in batches:
+                writer.write_batch(batch)
+        for path in files:
+            os.remove(path)
+        logger.info(f"Compacted {len(files)} files in {directory}")
+
+
+if __name__ == "__main__":
+    setup_logging("export_snapshot")
+    if "--compact" in sys.argv:
+        compact()
+    else:
+        export(DatabaseManager(), full="--full" in sys.argv)
@@ -0,0 +1,33 @@
+import os
+from dotenv import load_dotenv
+
+# Geminiモデルの遅延初期化
+#
+# google.generativeai の import は1秒近くかかるので、実際にモデルを使うときまで
+# 読み込まない。APIキーの確認も初回の get_model() で行う（import時には落ちない）。
+
+load_dotenv()
+
+MODEL_NAME = os.environ.get("GEMINI_MODEL", "gemini-2.0-flash")
+
+_model = None
+
+
+def get_model():
+    """共有の GenerativeModel を返す（初回呼び出し時に設定する）"""
+    global _model
+    if _model is None:
+        api_key = os.environ.get("GEMINI_API_KEY")
+        if not api_key:
+            raise ValueError("GEMINI_API_KEY not found in .env")
+        import google.generativeai as genai
+        genai.configure(api_key=api_key)
+        # Use gemini-2.0-flash as confirmed by list_models
+        _model = genai.GenerativeModel(MODEL_NAME)
+    return _model
+
+
+def set_model(model):
+    """モデルを差し替える（負荷試験の偽モデルなど）。None で次回に作り直す"""
+    global _model
+    _model = model
@@ -1,14 +1,17 @@
 import json
+from itertools import islice
 from database_manager import DatabaseManager
 
 def inspect_analysis_data():
     db = DatabaseManager()
-    # statusがprofitableなものを取得
-    res = db.supabase.table("products").select("ai_analysis").eq("status", "profitable").limit(5).execute()
+    # statusがprofitableなものを先頭の1ページだけ取得
+    rows = db.iter_rows("products", "id, ai_analysis", filters=lambda q: q.eq("status", "profitable"),
+                        page_size=5, prefetch=False)
+    items = list(islice(rows, 5))
     
-    print(f"取得件数: {len(res.data)}")
+    print(f"取得件数: {len(items)}")
     
-    for i, item in enumerate(res.data):
+    for i, item in enumerate(items):
         ai = item.get('ai_analysis')
         print(f"\n--- Item {i+1} ---")
         print(f"Raw Type: {type(ai)}")
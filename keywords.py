@@ -0,0 +1,79 @@
+import os
+import re
+import unicodedata
+from difflib import SequenceMatcher
+
+# 検索キーワードの正規化とあいまい一致
+#
+# "iPhone 17" と "iPhone17 Pro"、"ポケモンカード" と "ぽけもんかーど" のような
+# 表記揺れを同じキーワードとして扱い、重複したスクレイピングを防ぐ。
+# ただし "iPhone 16" と "iPhone 17"、"Nintendo Switch" と "Nintendo Switch 2" のように
+# 型番（数字）が違うものは文字列が似ていても別の商品として扱う。
+
+# この類似度以上なら既存キーワードと同じものとみなす
+SIMILARITY_THRESHOLD = float(os.environ.get("TREND_KEYWORD_SIMILARITY", "0.8"))
+
+# 空白と、キーワードの区切りに使われがちな記号
+_STRIP_RE = re.compile(r"[\s\-_・/／,，、.。!！?？'\"「」『』()（）\[\]【】]+")
+# カタカナ（ァ〜ヶ）をひらがなに寄せる。長音符などは対象外
+_KATAKANA_TO_HIRAGANA = {code: code - 0x60 for code in range(ord("ァ"), ord("ヶ") + 1)}
+_DIGITS_RE = re.compile(r"\d+")
+_WORD_RE = re.compile(r"[a-z]+")
+# 型番の一部として使われる語（"Pro" の有無は同じ系列の表記揺れとして許す）
+MODEL_WORDS = {"pro", "max", "mini", "plus", "ultra", "lite", "air", "oled", "se", "fe", "slim", "neo"}
+
+
+def normalize_keyword(keyword):
+    """幅（全角/半角）・大小文字・空白・カタカナ/ひらがなの違いを吸収したキーを返す"""
+    text = unicodedata.normalize("NFKC", keyword or "").casefold()
+    text = text.translate(_KATAKANA_TO_HIRAGANA)
+    return _STRIP_RE.sub("", text)
+
+
+def model_tokens(key):
+    """正規化済みキーから (数字の集合, 型番語の集合) を取り出す"""
+    return set(_DIGITS_RE.findall(key)), {w for w in _WORD_RE.findall(key) if w in MODEL_WORDS}
+
+
+def same_model(a, b):
+    """あいまい一致を許してよいか（数字が一致し、型番語が一致するか片方が他方を含む）"""
+    digits_a, words_a = model_tokens(a)
+    digits_b, words_b = model_tokens(b)
+    return digits_a == digits_b and (words_a <= words_b or words_b <= words_a)
+
+
+def similarity(a, b):
+    """正規化済みキー同士の類似度（0〜1）"""
+    if a == b:
+        return 1.0
+    matcher = SequenceMatcher(None, a, b)
+    # 安価な上限値で先に足切りする
+    if matcher.real_quick_ratio() < SIMILARITY_THRESHOLD or matcher.quick_ratio() < SIMILARITY_THRESHOLD:
+        return 0.0
+    return matcher.ratio()
+
+
+class KeywordIndex:
+    """既存の search_configs をメモリ上に読み込み、正規化キーで引けるようにした索引"""
+
+    def __init__(self, rows=()):
+        self.rows = {}      # 正規化キー -> 行
+        for row in rows:
+            self.add(row)
+
+    def add(self, row):
+        self.rows.setdefault(normalize_keyword(row['keyword']), row)
+
+    def match(self, keyword):
+        """同一とみなせる既存行を返す（なければ None）"""
+        key = normalize_keyword(keyword)
+        if key in self.rows:
+            return self.rows[key]
+        best, best_score = None, SIMILARITY_THRESHOLD
+        for other, row in self.rows.items():
+            if not same_model(key, other):
+                continue
+            score = similarity(key, other)
+            if score >= best_score:
+                best, best_score = row, score
+        return best
@@ -0,0 +1,517 @@
+import argparse
+import itertools
+import json
+import logging
+import os
+import random
+import statistics
+import sys
+import threading
+import time
+import zlib
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from priority import base_priority
+
+# パイプライン全体の負荷試験
+#
+# ローカルの Supabase（`supabase start` で立ち上げ、schema.sql を流したもの）に
+# 合成データを入れ、偽のメルカリ（ローカルHTTPサーバ）と偽のGemini（遅延・エラー率付き）で
+# scrape_and_save / run_analysis_loop / app.load_data を動かして、
+# コンポーネントごとのスループットとレイテンシのパーセンタイルを出す。
+#
+#   python load_test.py seed --products 1000000 --keywords 1000
+#   python load_test.py run --scrape-cycles 1 --analyze-runs 10 --app-queries 100
+#   python load_test.py cleanup
+#
+# 合成データは item_id が "lt"、キーワードが "LT " で始まるので、cleanup で消せる。
+# 事故防止のため、SUPABASE_URL がローカル以外なら LOADTEST_ALLOW_REMOTE=1 が必要。
+
+ITEM_PREFIX = "lt"
+KEYWORD_PREFIX = "LT "
+FIXTURE_PORT = int(os.environ.get("LOADTEST_FIXTURE_PORT", "8780"))
+FIXTURE_BASE_URL = f"http://127.0.0.1:{FIXTURE_PORT}"
+
+BRANDS = ["Nintendo", "Sony", "Apple", "ポケモン", "バンダイ", "Canon", "Nike", "ユニクロ", "サンリオ", "LEGO",
+          "Supreme", "ドラゴンボール", "ワンピース", "Fujifilm", "Panasonic", "ちいかわ", "Hermes", "Rolex"]
+ITEMS = ["Switch", "PS5", "iPhone", "カード", "フィギュア", "カメラ", "スニーカー", "ぬいぐるみ", "ブロック",
+         "パーカー", "限定版", "ゲームソフト", "腕時計", "バッグ", "レンズ", "トレカ BOX"]
+GENRES = ["ゲーム", "家電", "ファッション", "おもちゃ", "カメラ", "トレカ", "その他"]
+RANKS = ["S", "A", "B", "C"]
+ADJECTIVES = ["新品", "未開封", "美品", "中古", "ジャンク", "限定", "まとめ売り", "箱付き"]
+
+logger = logging.getLogger("load_test")
+
+
+# --- 合成データ ---------------------------------------------------------------
+
+def keyword_for(k):
+    return f"{KEYWORD_PREFIX}{BRANDS[k % len(BRANDS)]} {ITEMS[(k // len(BRANDS)) % len(ITEMS)]} {k}"
+
+
+def keyword_index(keyword):
+    """keyword_for の逆（末尾の番号）。合成キーワード以外は None"""
+    try:
+        return int(keyword.rsplit(" ", 1)[-1])
+    except ValueError:
+        return None
+
+
+def _unit(value):
+    # 決定的な 0〜1 の値（サーバ側でも同じ価格を再現できるように乱数ではなくハッシュで作る）
+    return zlib.crc32(str(value).encode()) / 0xFFFFFFFF
+
+
+def base_price(k):
+    return 1000 * (1 + int(_unit(f"kw{k}") * 50))
+
+
+def price_of(n, keywords):
+    """合成商品 n の価格（キーワードの相場を中心に対数正規っぽく散らす）"""
+    factor = statistics.NormalDist(0, 0.35).inv_cdf(min(max(_unit(n), 0.001), 0.999))
+    return max(300, int(base_price(n % keywords) * 2.718281828 ** factor) // 10 * 10)
+
+
+def synthetic_configs(keywords):
+    rng = random.Random(0)
+    for k in range(keywords):
+        yield {
+            "keyword": keyword_for(k),
+            "target_profit": rng.choice([1000, 3000, 5000, 10000]),
+            "is_active": True,
+            "source": "manual",
+            "trend_score": round(rng.expovariate(0.5), 2),
+        }
+
+
+def synthetic_products(products, keywords, days, now):
+    rng = random.Random(1)
+    for n in range(products):
+        k = n % keywords
+        keyword = keyword_for(k)
+        scraped_at = now - timedelta(seconds=days * 86400 * (1 - n / products))
+        status = rng.choices(["new", "profitable", "discarded", "quarantined"], [10, 20, 67, 3])[0]
+        analysis = None
+        if status in ("profitable", "discarded"):
+            rank = rng.choice(RANKS[:3]) if status == "profitable" else "C"
+            analysis = {
+                "trend_reason": "負荷試験用の合成データ",
+                "heat_level": rng.choice(["High", "Medium", "Low"]),
+                "future_prediction": "横ばい",
+                "investment_value": rank,
+                "genre": GENRES[k % len(GENRES)],
+            }
+        yield {
+            "platform": "mercari",
+            "item_id": f"{ITEM_PREFIX}{n:09d}",
+            "keyword": keyword,
+            "title": f"{keyword.removeprefix(KEYWORD_PREFIX)} {rng.choice(ADJECTIVES)} #{n}",
+            "price": price_of(n, keywords),
+            "image_url": f"{FIXTURE_BASE_URL}/thumb/{n}.jpg",
+            "product_url": f"{FIXTURE_BASE_URL}/item/{ITEM_PREFIX}{n:09d}",
+            "scraped_at": scraped_at.isoformat(),
+            "enqueued_at": scraped_at.isoformat(),
+            "analyzed_at": (scraped_at + timedelta(seconds=rng.uniform(30, 600))).isoformat() if analysis else None,
+            "status": status,
+            "ai_analysis": analysis,
+            "priority": base_priority({}, rng.random(), scraped_at),
+            "listing_status": "open",
+            "next_check_at": (scraped_at + timedelta(hours=6)).isoformat(),
+        }
+
+
+def _batches(rows, size):
+    it = iter(rows)
+    while True:
+        batch = list(itertools.islice(it, size))
+        if not batch:
+            return
+        yield batch
+
+
+def seed(db, products, keywords, days, batch_size, workers):
+    from postgrest.types import ReturnMethod
+
+    def insert(table, batch):
+        db.supabase.table(table).insert(batch, returning=ReturnMethod.minimal).execute()
+        return len(batch)
+
+    started = time.perf_counter()
+    for batch in _batches(synthetic_configs(keywords), batch_size):
+        insert("search_configs", batch)
+    logger.info(f"search_configs: {keywords}件")
+
+    now = datetime.now(timezone.utc)
+    done = 0
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        # 同時に持つバッチ数を workers*2 に抑えて、件数によらずメモリを一定にする
+        pending = []
+        for batch in _batches(synthetic_products(products, keywords, days, now), batch_size):
+            pending.append(pool.submit(insert, "products", batch))
+            if len(pending) >= workers * 2:
+                done += pending.pop(0).result()
+                if done % (batch_size * 100) == 0:
+                    logger.info(f"products: {done}/{products} ({done / (time.perf_counter() - started):.0f} rows/s)")
+        for future in pending:
+            done += future.result()
+    elapsed = time.perf_counter() - started
+    print(f"seeded {keywords} keywords, {done} products in {elapsed:.1f}s ({done / elapsed:.0f} rows/s)")
+
+
+def cleanup(db):
+    for table, column, prefix in (("products", "item_id", ITEM_PREFIX), ("search_configs", "keyword", KEYWORD_PREFIX)):
+        ids = (row['id'] for row in db.iter_rows(table, "id", filters=lambda q, c=column, p=prefix: q.like(c, f"{p}%")))
+        print(f"{table}: deleted {db.delete_by_ids(table, ids)}")
+
+
+# --- 偽のメルカリ ---------------------------------------------------------------
+
+class FixtureSite:
+    """検索結果ページと商品ページを返すローカルHTTPサーバ"""
+
+    def __init__(self, products, keywords, items_per_page=30, new_ratio=0.3, price_change_rate=0.05,
+                 sold_rate=0.05, gone_rate=0.02, latency_ms=50):
+        self.products = products
+        self.keywords = keywords
+        self.items_per_page = items_per_page
+        self.new_ratio = new_ratio
+        self.price_change_rate = price_change_rate
+        self.sold_rate = sold_rate
+        self.gone_rate = gone_rate
+        self.latency_ms = latency_ms
+        self._new_ids = itertools.count()
+        self._lock = threading.Lock()
+        self.requests = Counter()
+        self.server = ThreadingHTTPServer(("127.0.0.1", FIXTURE_PORT), self._handler())
+
+    def start(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def stop(self):
+        self.server.shutdown()
+
+    def _price(self, item_id):
+        n = int(item_id[len(ITEM_PREFIX):]) if item_id[len(ITEM_PREFIX):].isdigit() else None
+        if n is None:
+            return 500 + int(_unit(item_id) * 30000) // 10 * 10
+        price = price_of(n, self.keywords)
+        # 一部の既知商品は値下げ（時々値上げ）されている
+        if random.random() < self.price_change_rate:
+            price = int(price * random.choice([0.7, 0.85, 0.95, 1.1])) // 10 * 10
+        return price
+
+    def search_page(self, keyword):
+        k = keyword_index(keyword)
+        k = k if k is not None else zlib.crc32(keyword.encode()) % self.keywords
+        per_keyword = max(self.products // self.keywords, 1)
+        cells = []
+        for _ in range(self.items_per_page):
+            if random.random() < self.new_ratio:
+                with self._lock:
+                    item_id = f"{ITEM_PREFIX}n{os.getpid()}-{next(self._new_ids)}"
+            else:
+                item_id = f"{ITEM_PREFIX}{k + self.keywords * random.randrange(per_keyword):09d}"
+            title = f"{keyword.removeprefix(KEYWORD_PREFIX)} {random.choice(ADJECTIVES)}"
+            cells.append(
+                f'<li data-testid="item-cell"><a href="/item/{item_id}">'
+                f'<img alt="{title}" src="/thumb/{item_id}.jpg"></a>'
+                f'<span>¥{self._price(item_id):,}</span></li>'
+            )
+        return f"<html><body><ul>{''.join(cells)}</ul></body></html>"
+
+    def item_page(self, item_id):
+        sold = random.random() < self.sold_rate
+        button = "売り切れました" if sold else "購入手続きへ"
+        return (f'<html><body><div data-testid="price">¥{self._price(item_id):,}</div>'
+                f'<button data-testid="checkout-button">{button}</button></body></html>')
+
+    def _handler(self):
+        site = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                url = urlparse(self.path)
+                time.sleep(site.latency_ms / 1000 * random.uniform(0.5, 1.5))
+                if url.path == "/search":
+                    site.requests["search"] += 1
+                    body = site.search_page(parse_qs(url.query).get("keyword", [""])[0])
+                elif url.path.startswith("/item/"):
+                    site.requests["item"] += 1
+                    # 削除済みの出品
+                    if random.random() < site.gone_rate:
+                        self.send_error(404)
+                        return
+                    body = site.item_page(url.path.split("/item/", 1)[1])
+                else:
+                    self.send_error(404)
+                    return
+                data = body.encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/html; charset=utf-8")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+
+# --- 偽のGemini ---------------------------------------------------------------
+
+class FakeResponse:
+    def __init__(self, text):
+        self.text = text
+
+
+class FakeModel:
+    """GenerativeModel の代わり。対数正規の遅延・通信エラー・不正な応答を混ぜる"""
+
+    def __init__(self, median_ms=800, sigma=0.5, error_rate=0.02, invalid_rate=0.03):
+        self.median_ms = median_ms
+        self.sigma = sigma
+        self.error_rate = error_rate
+        self.invalid_rate = invalid_rate
+        self.latencies = []
+        self.outcomes = Counter()
+        self._lock = threading.Lock()
+
+    def generate_content(self, prompt, generation_config=None):
+        latency = self.median_ms / 1000 * random.lognormvariate(0, self.sigma)
+        time.sleep(latency)
+        with self._lock:
+            self.latencies.append(latency)
+        roll = random.random()
+        if roll < self.error_rate:
+            self.outcomes["error"] += 1
+            raise ConnectionError("fake Gemini: 503 Service Unavailable")
+        if roll < self.error_rate + self.invalid_rate:
+            self.outcomes["invalid"] += 1
+            return FakeResponse("申し訳ありませんが、この商品は分析できません。")
+        self.outcomes["ok"] += 1
+        return FakeResponse(json.dumps({
+            "trend_reason": "合成データのため推測です",
+            "heat_level": random.choice(["High", "Medium", "Low"]),
+            "future_prediction": "横ばい",
+            "investment_value": random.choices(RANKS, [5, 15, 30, 50])[0],
+            "genre": random.choice(GENRES),
+        }, ensure_ascii=False))
+
+
+# --- 計測 ---------------------------------------------------------------------
+
+def percentiles(values):
+    if not values:
+        return {"p50": None, "p95": None, "p99": None}
+    ordered = sorted(values)
+    pick = lambda q: ordered[min(int(q * len(ordered)), len(ordered) - 1)]
+    return {"p50": pick(0.5), "p95": pick(0.95), "p99": pick(0.99)}
+
+
+class Recorder:
+    """コンポーネントごとの呼び出し時間・処理件数・DB往復回数を集める"""
+
+    def __init__(self):
+        self.calls = defaultdict(list)      # component -> [秒]
+        self.items = Counter()
+        self.round_trips = Counter()
+        self.counters = defaultdict(Counter)
+
+    def measure(self, component, func, *args, items=None, **kwargs):
+        before = self._round_trips()
+        started = time.perf_counter()
+        result = func(*args, **kwargs)
+        self.calls[component].append(time.perf_counter() - started)
+        self.round_trips[component] += self._round_trips() - before
+        if items is not None:
+            self.items[component] += items(result)
+        return result
+
+    def _round_trips(self):
+        # flush でリセットされた分も含めた通算の DB 往復回数
+        import metrics
+
+        return metrics.snapshot().get("db_round_trips", 0) + sum(c["db_round_trips"] for c in self.counters.values())
+
+    def capture_flush(self):
+        """metrics.flush の直前にカウンタを控える（pipeline_runs への書き込みはそのまま行う）"""
+        import metrics
+
+        original = metrics.flush
+
+        def flush(db, component):
+            self.counters[component].update(metrics.snapshot())
+            original(db, component)
+
+        metrics.flush = flush
+
+    def report(self):
+        rows = {}
+        for component, durations in self.calls.items():
+            total = sum(durations)
+            items = self.items[component]
+            rows[component] = {
+                "calls": len(durations),
+                "items": items,
+                "items_per_s": round(items / total, 2) if total else None,
+                "db_round_trips_per_call": round(self.round_trips[component] / len(durations), 1),
+                **{k: round(v * 1000, 1) if v is not None else None for k, v in percentiles(durations).items()},
+            }
+        return rows
+
+
+def run(args):
+    # 取り込む前に、偽サイト・一時ファイル・待機時間の設定を環境変数で差し込む
+    os.environ["MERCARI_BASE_URL"] = FIXTURE_BASE_URL
+    os.environ.setdefault("BROWSER_PROFILE_DIR", os.path.join(".loadtest", "browser_profile"))
+    os.environ.setdefault("PRICE_STATS_PATH", os.path.join(".loadtest", "price_stats.pkl"))
+    os.environ.setdefault("NOTIFY_OUTBOX_PATH", os.path.join(".loadtest", "notify_outbox.db"))
+    os.environ.setdefault("PREFILTER_MODEL_PATH", os.path.join(".loadtest", "prefilter_model.pkl"))
+    os.environ["ANALYSIS_INTERVAL_SECONDS"] = str(args.analysis_interval)
+    os.makedirs(".loadtest", exist_ok=True)
+
+    import gemini
+    import metrics
+    from database_manager import DatabaseManager
+
+    components = set(args.components.split(","))
+    recorder = Recorder()
+    recorder.capture_flush()
+    model = FakeModel(args.model_latency_ms, args.model_sigma, args.model_error_rate, args.model_invalid_rate)
+    gemini.set_model(model)
+    site = FixtureSite(args.products, args.keywords, latency_ms=args.page_latency_ms)
+    site.start()
+
+    try:
+        if "scrape" in components:
+            import main_scouter
+            import platforms
+            platforms.MercariAdapter.settle_ms = (args.settle_ms, args.settle_ms)
+            platforms.MercariAdapter.item_settle_ms = (args.settle_ms, args.settle_ms)
+            for _ in range(args.scrape_cycles):
+                recorder.measure("scrape", main_scouter.scrape_and_save)
+            # 件数は保存した新着商品の数（ページ読み込み数は counters の page_loads / item_page_loads）
+            recorder.items["scrape"] = recorder.counters["scraper"]["products_saved"]
+
+        if "analyze" in components:
+            import ai_analyzer
+            for _ in range(args.analyze_runs):
+                recorder.measure("analyze", ai_analyzer.run_analysis_loop)
+            analyzer = recorder.counters["analyzer"]
+            recorder.items["analyze"] = sum(v for k, v in analyzer.items() if k.startswith("analyzed_")) \
+                + analyzer["model_calls_avoided"]
+
+        if "app" in components:
+            import app
+            rng = random.Random(2)
+            recorder.measure("app.genres", lambda: (app.get_all_genres.clear(), app.get_all_genres())[1], items=len)
+            for _ in range(args.app_queries):
+                mode = rng.choice(["profitable", "search", "genre"])
+                if mode == "search":
+                    query = rng.choice(ITEMS)
+                    recorder.measure("app.load_data", app.load_data, query, None, items=len)
+                elif mode == "genre":
+                    recorder.measure("app.load_data", app.load_data, None, rng.sample(GENRES, 2), items=len)
+                else:
+                    recorder.measure("app.load_data", app.load_data, items=len)
+    finally:
+        site.stop()
+
+    result = {
+        "scale": {"products": args.products, "keywords": args.keywords},
+        "components": recorder.report(),
+        "model": {
+            "calls": len(model.latencies),
+            "outcomes": dict(model.outcomes),
+            **{k: round(v * 1000, 1) if v is not None else None for k, v in percentiles(model.latencies).items()},
+        },
+        "fixture_requests": dict(site.requests),
+        "counters": {k: dict(v) for k, v in recorder.counters.items()},
+    }
+
+    stages = metrics.stage_latencies(metrics.load_stage_rows(DatabaseManager(), since_hours=args.stage_hours))
+    if not stages.empty:
+        result["stages_s"] = metrics.latency_percentiles(stages).round(2).reset_index().to_dict(orient="records")
+
+    print_report(result)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(result, f, ensure_ascii=False, indent=2, default=str)
+
+
+def print_report(result):
+    print(f"\n=== scale: {result['scale']['products']:,} products / {result['scale']['keywords']:,} keywords ===")
+    print(f"{'component':<16}{'calls':>6}{'items':>8}{'items/s':>10}{'p50ms':>10}{'p95ms':>10}{'p99ms':>10}{'db rt/call':>12}")
+    for name, row in result["components"].items():
+        print(f"{name:<16}{row['calls']:>6}{row['items']:>8}{row['items_per_s'] or 0:>10.2f}"
+              f"{row['p50'] or 0:>10.1f}{row['p95'] or 0:>10.1f}{row['p99'] or 0:>10.1f}{row['db_round_trips_per_call']:>12}")
+    model = result["model"]
+    if model["calls"]:
+        print(f"\nmodel: {model['calls']} calls {model['outcomes']} p50={model['p50']}ms p95={model['p95']}ms p99={model['p99']}ms")
+    if result.get("stages_s"):
+        print("\npipeline stages (s):")
+        for row in result["stages_s"]:
+            print(f"  {row['stage']:<18} p50={row['p50']:<10} p95={row['p95']:<10} p99={row['p99']:<10} n={row['count']}")
+
+
+def _check_target():
+    host = urlparse(os.environ.get("SUPABASE_URL", "")).hostname
+    if host not in ("localhost", "127.0.0.1", "::1") and os.environ.get("LOADTEST_ALLOW_REMOTE") != "1":
+        print(f"SUPABASE_URL がローカルではありません ({host})。本番に合成データを入れないよう中止します。")
+        sys.exit(1)
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="パイプライン全体の負荷試験")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("seed", help="合成データを投入する")
+    p.add_argument("--products", type=int, default=100_000)
+    p.add_argument("--keywords", type=int, default=1000)
+    p.add_argument("--days", type=float, default=30, help="scraped_at を散らす期間（日）")
+    p.add_argument("--batch-size", type=int, default=1000)
+    p.add_argument("--workers", type=int, default=4)
+
+    p = sub.add_parser("run", help="各コンポーネントを動かして計測する")
+    p.add_argument("--products", type=int, default=100_000, help="seed と同じ値（偽サイトが既知商品を出すのに使う）")
+    p.add_argument("--keywords", type=int, default=1000, help="seed と同じ値")
+    p.add_argument("--components", default="scrape,analyze,app")
+    p.add_argument("--scrape-cycles", type=int, default=1)
+    p.add_argument("--analyze-runs", type=int, default=5)
+    p.add_argument("--app-queries", type=int, default=50)
+    p.add_argument("--settle-ms", type=int, default=0, help="ページ読み込み後の待機（本番は6〜8秒）")
+    p.add_argument("--page-latency-ms", type=float, default=50)
+    p.add_argument("--analysis-interval", type=float, default=0, help="分析1件ごとの待機秒数（本番は2秒）")
+    p.add_argument("--model-latency-ms", type=float, default=800)
+    p.add_argument("--model-sigma", type=float, default=0.5)
+    p.add_argument("--model-error-rate", type=float, default=0.02)
+    p.add_argument("--model-invalid-rate", type=float, default=0.03)
+    p.add_argument("--stage-hours", type=int, default=1, help="段階別レイテンシの集計期間（時間）")
+    p.add_argument("--json", help="結果をJSONで保存するパス")
+
+    sub.add_parser("cleanup", help="合成データを削除する")
+    return parser
+
+
+if __name__ == "__main__":
+    # log_config は取り込み時に出力先を決めるので、その前に差し込む
+    os.environ.setdefault("LOG_DIR", os.path.join(".loadtest", "logs"))
+    from log_config import setup_logging
+
+    args = build_parser().parse_args()
+    setup_logging("load_test")
+    _check_target()
+    if args.command == "run":
+        run(args)
+    else:
+        from database_manager import DatabaseManager
+        db = DatabaseManager()
+        if args.command == "seed":
+            seed(db, args.products, args.keywords, args.days, args.batch_size, args.workers)
+        else:
+            cleanup(db)
@@ -0,0 +1,94 @@
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+from datetime import datetime, timezone
+
+# 構造化ログの設定
+#
+# - ファイル: logs/<component>.jsonl に JSON Lines で出力（サイズでローテーション）
+# - コンソール: 人が読める1行形式
+# - 書き込みは QueueHandler 経由で別スレッドが行うため、呼び出し側はブロックしない
+#
+# 環境変数:
+#   LOG_LEVEL      全体のレベル（既定 INFO）
+#   LOG_LEVELS     モジュール別のレベル 例: "ai_analyzer=DEBUG,database_manager=WARNING"
+#   LOG_DIR        出力先ディレクトリ（既定 logs）
+#   LOG_MAX_BYTES  ローテーションするサイズ（既定 5MB）
+#   LOG_BACKUPS    残す世代数（既定 5）
+
+LOG_DIR = os.environ.get("LOG_DIR", "logs")
+LOG_MAX_BYTES = int(os.environ.get("LOG_MAX_BYTES", str(5 * 1024 * 1024)))
+LOG_BACKUPS = int(os.environ.get("LOG_BACKUPS", "5"))
+
+# LogRecord の標準属性（これ以外は extra= で渡された構造化フィールドとして出力する）
+_RESERVED = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime"}
+
+_listener = None
+
+
+class JsonFormatter(logging.Formatter):
+    def __init__(self, component):
+        super().__init__()
+        self.component = component
+
+    def format(self, record):
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname,
+            "component": self.component,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RESERVED and not key.startswith("_"):
+                entry[key] = value
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+def _parse_levels(spec):
+    levels = {}
+    for part in (spec or "").split(","):
+        if "=" in part:
+            name, level = part.split("=", 1)
+            levels[name.strip()] = level.strip().upper()
+    return levels
+
+
+def setup_logging(component):
+    """エントリポイントで1回呼ぶ。2回目以降は何もしない"""
+    global _listener
+    if _listener is not None:
+        return
+
+    # 文字化け対策（Windowsのコンソールでも UTF-8 で出力する）
+    if hasattr(sys.stdout, "reconfigure"):
+        sys.stdout.reconfigure(encoding="utf-8")
+
+    os.makedirs(LOG_DIR, exist_ok=True)
+    file_handler = logging.handlers.RotatingFileHandler(
+        os.path.join(LOG_DIR, f"{component}.jsonl"),
+        maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUPS, encoding="utf-8"
+    )
+    file_handler.setFormatter(JsonFormatter(component))
+    console_handler = logging.StreamHandler(sys.stdout)
+    console_handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s [%(name)s] %(message)s", "%H:%M:%S"))
+
+    log_queue = queue.SimpleQueue()
+    root = logging.getLogger()
+    root.handlers[:] = [logging.handlers.QueueHandler(log_queue)]
+    root.setLevel(os.environ.get("LOG_LEVEL", "INFO").upper())
+    # ライブラリの冗長なログは抑える
+    for noisy in ("httpx", "httpcore", "urllib3"):
+        logging.getLogger(noisy).setLevel(logging.WARNING)
+    for name, level in _parse_levels(os.environ.get("LOG_LEVELS")).items():
+        logging.getLogger(name).setLevel(level)
+
+    _listener = logging.handlers.QueueListener(
+        log_queue, console_handler, file_handler, respect_handler_level=True
+    )
+    _listener.start()
+    atexit.register(_listener.stop)
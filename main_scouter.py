@@ -1,114 +1,96 @@
-from playwright.sync_api import sync_playwright
 import time
+import logging
+import os
 import sys
-import io
-import random
 from database_manager import DatabaseManager
+import metrics
+import profiling
+from browser_policy import PROFILE_DIR
+from log_config import setup_logging
+from platforms import get_adapters
+from scrape_cluster import NodeCoordinator, node_id_from_args
+from scrape_engine import ScrapeEngine
 
-# 文字化け対策
-sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8')
+logger = logging.getLogger("main_scouter")
 
-def parse_price(price_text):
-    """¥4,999 などの文字列を整数 4999 に変換"""
-    if not price_text:
-        return 0
-    clean_text = price_text.replace('¥', '').replace(',', '').replace(' ', '')
-    try:
-        return int(clean_text)
-    except ValueError:
-        return 0
+# --loop 時の巡回間隔（秒）
+SCRAPE_INTERVAL = int(os.environ.get("SCRAPE_INTERVAL", "300"))
+
+@profiling.profiled("scraper")
+def scrape_and_save(node_id=None, engine=None, coordinator=None):
+    """検索設定ごとに各マーケットプレイスを検索して新着商品を保存する
 
-def scrape_and_save():
+    node_id を指定すると分散モードになり、生存ノード間でキーワードを分担する。
+    engine / coordinator を渡すとそれを使い回す（--loop の連続運転用）。
+    """
     db = DatabaseManager()
     
     # 1. 監視設定を取得
     configs = db.get_active_search_configs()
     if not configs:
-        print("有効な監視設定がありません。")
+        logger.info("有効な監視設定がありません。")
         return
 
-    with sync_playwright() as p:
-        # ブラウザ起動
-        browser = p.chromium.launch(headless=True) # 本番はHeadlessでOK
-        context = browser.new_context(
-            user_agent="Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
-        )
-        page = context.new_page()
+    # 分析キューの優先度付けに使う相場統計（pandas を読み込むので、使う時点で import する）
+    from price_analytics import load_price_analytics
+    with profiling.span("price_analytics"):
+        analytics = load_price_analytics(db)
 
-        for config in configs:
-            keyword = config['keyword']
-            print(f"\n--- Searching for: {keyword} ---")
-            
-            # URL構築 (新しい順で検索すると効率が良い)
-            # sort=created_time, order=desc
-            url = f"https://jp.mercari.com/search?keyword={keyword}&sort=created_time&order=desc"
-            
-            try:
-                page.goto(url, wait_until="domcontentloaded")
-                page.wait_for_timeout(5000 + random.randint(1000, 3000)) # ランダム待機
-                
-                # 商品リストを取得
-                items = page.locator('li[data-testid="item-cell"]')
-                count = items.count()
-                print(f"Found {count} items.")
-                
-                # 上位10件のみ処理（頻繁に実行する前提）
-                process_count = min(count, 10)
-                
-                for i in range(process_count):
-                    item = items.nth(i)
-                    try:
-                        # リンク取得
-                        link_element = item.locator('a').first
-                        item_url = "https://jp.mercari.com" + link_element.get_attribute('href')
-                        
-                        # ID抽出 (URLから /item/m123456... を抽出)
-                        item_id = item_url.split('/item/')[-1]
-                        
-                        # すでにDBにあるかチェック（詳細ページに行く前にチェックして効率化）
-                        if db.product_exists('mercari', item_id):
-                            print(f"Skipping known item: {item_id}")
-                            continue
+    # 1回だけの実行では、終わってもノードの行は消さない（ハートビートの期限切れで外れる）
+    own_coordinator = coordinator is None and bool(node_id)
+    if own_coordinator:
+        coordinator = NodeCoordinator(node_id)
+        coordinator.start()
 
-                        # 情報抽出
-                        img = item.locator('img').first
-                        title = img.get_attribute('alt') if img.count() > 0 else "No Title"
-                        image_url = img.get_attribute('src') if img.count() > 0 else ""
-                        
-                        price_element = item.locator('span').filter(has_text="¥")
-                        price_text = price_element.first.inner_text() if price_element.count() > 0 else "0"
-                        price = parse_price(price_text)
+    try:
+        if engine:
+            engine.run_cycle(configs, analytics, coordinator)
+        else:
+            engine = ScrapeEngine(db, get_adapters(), profile_dir_for(node_id))
+            engine.start()
+            try:
+                engine.run_cycle(configs, analytics, coordinator)
+            finally:
+                engine.close()
+    finally:
+        if own_coordinator:
+            coordinator.stop()
 
-                        # 価格取得エラー(0円)の場合はスキップ
-                        if price == 0:
-                            print(f"Skipping item with 0 price (parse error): {item_id}")
-                            continue
+    metrics.flush(db, "scraper")
 
-                        # データ構築
-                        product_data = {
-                            "platform": "mercari",
-                            "item_id": item_id,
-                            "title": title,
-                            "price": price,
-                            "image_url": image_url,
-                            "product_url": item_url,
-                            "status": "new" # 未分析状態
-                        }
-                        
-                        # DB保存
-                        db.save_product(product_data)
-                        
-                        # スクレイピングマナーのための待機
-                        time.sleep(1)
+def profile_dir_for(node_id):
+    # 同一ホストで複数ノードを動かせるよう、プロファイルはノードごとに分ける
+    return f"{PROFILE_DIR}-{node_id}" if node_id else PROFILE_DIR
 
-                    except Exception as e:
-                        print(f"Error processing item {i}: {e}")
-                        continue
+def run_forever(node_id=None, interval=SCRAPE_INTERVAL):
+    """ブラウザを開いたまま一定間隔でスクレイピングを繰り返す（--loop）
 
+    分散モードのハートビートはプロセスの間ずっと送り続け、終了時にだけ離脱する。
+    """
+    coordinator = None
+    if node_id:
+        coordinator = NodeCoordinator(node_id)
+        coordinator.start()
+    engine = ScrapeEngine(DatabaseManager(), get_adapters(), profile_dir_for(node_id))
+    engine.start()
+    try:
+        while True:
+            try:
+                scrape_and_save(node_id, engine, coordinator)
             except Exception as e:
-                print(f"Error scraping {keyword}: {e}")
-            
-        browser.close()
+                logger.exception(f"Error in scrape cycle: {e}")
+            logger.info(f"Cycle finished. Waiting {interval} seconds...")
+            time.sleep(interval)
+    finally:
+        engine.close()
+        if coordinator:
+            coordinator.stop(leave=True)
 
 if __name__ == "__main__":
-    scrape_and_save()
+    if "--profile" in sys.argv:
+        profiling.enable()
+    setup_logging("scraper")
+    if "--loop" in sys.argv:
+        run_forever(node_id_from_args())
+    else:
+        scrape_and_save(node_id_from_args())
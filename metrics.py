@@ -0,0 +1,145 @@
+import logging
+import threading
+from collections import Counter, defaultdict
+from datetime import datetime, timedelta, timezone
+
+# パイプラインの計測
+#
+# 1. カウンタ: モデル呼び出し・DB往復・ページ読み込みなどをプロセス内で数え、
+#    実行の最後に pipeline_runs テーブルへ1行で書き出す（計測自体のDB往復は1回）。
+#    ブラウザのメモリなど時間で変わる値はゲージとして (時刻, 値) の列で同じ行に載せる。
+# 2. 段階ごとの時刻: products の scraped_at / enqueued_at / analysis_started_at /
+#    analyzed_at / notified_at。既存の更新に相乗りして記録する。
+
+# (開始時刻, 終了時刻) の列名で各段階を定義
+STAGES = {
+    "scrape_to_enqueue": ("scraped_at", "enqueued_at"),
+    "queue_wait": ("enqueued_at", "analysis_started_at"),
+    "analysis": ("analysis_started_at", "analyzed_at"),
+    "notify": ("analyzed_at", "notified_at"),
+    "time_to_alert": ("scraped_at", "notified_at"),
+}
+STAGE_COLUMNS = "keyword, scraped_at, enqueued_at, analysis_started_at, analyzed_at, notified_at"
+PERCENTILES = (0.5, 0.95, 0.99)
+
+logger = logging.getLogger("metrics")
+
+_counters = Counter()
+_lock = threading.Lock()     # スクレイピングのワーカーや保存スレッドなど複数スレッドから触られる
+_gauges = defaultdict(list)
+_started_at = datetime.now(timezone.utc)
+
+
+def now_iso():
+    return datetime.now(timezone.utc).isoformat()
+
+
+def incr(name, n=1):
+    """カウンタを加算する（model_calls, db_round_trips, page_loads など）"""
+    with _lock:
+        _counters[name] += n
+
+
+def gauge(name, value):
+    """その時点の値を記録する（browser_rss_mb など）"""
+    with _lock:
+        _gauges[name].append([now_iso(), value])
+
+
+def snapshot():
+    with _lock:
+        return dict(_counters)
+
+
+def flush(db, component):
+    """この実行のカウンタを pipeline_runs に保存してリセットする"""
+    global _started_at
+    # 値を取り出してリセットするところだけロックし、DBへの書き込み中は加算を止めない
+    with _lock:
+        if not _counters and not _gauges:
+            return
+        row = {
+            "component": component,
+            "started_at": _started_at.isoformat(),
+            "finished_at": now_iso(),
+            "counters": dict(_counters),
+        }
+        if _gauges:
+            row["gauges"] = {name: list(values) for name, values in _gauges.items()}
+        _counters.clear()
+        _gauges.clear()
+        _started_at = datetime.now(timezone.utc)
+    try:
+        db.supabase.table("pipeline_runs").insert(row).execute()
+        logger.info(f"Metrics ({component}): {row['counters']}", extra={"counters": row['counters']})
+    except Exception as e:
+        logger.error(f"メトリクス保存エラー: {e}")
+
+
+def stage_latencies(rows):
+    """商品ごとの段階時刻から、段階ごとの所要秒数の縦長DataFrame(keyword, stage, seconds)を作る"""
+    import pandas as pd
+
+    df = pd.DataFrame.from_records(rows, columns=STAGE_COLUMNS.split(", "))
+    frames = []
+    for stage, (start, end) in STAGES.items():
+        begin = pd.to_datetime(df[start], utc=True, format="ISO8601")
+        finish = pd.to_datetime(df[end], utc=True, format="ISO8601")
+        seconds = (finish - begin).dt.total_seconds()
+        frames.append(pd.DataFrame({"keyword": df["keyword"], "stage": stage, "seconds": seconds}))
+    out = pd.concat(frames, ignore_index=True)
+    return out.dropna(subset=["seconds"])
+
+
+def latency_percentiles(latencies, by=("stage",)):
+    """段階（とキーワード）ごとの p50/p95/p99 と件数"""
+    grouped = latencies.groupby(list(by))["seconds"]
+    table = grouped.quantile(list(PERCENTILES)).unstack()
+    table.columns = [f"p{int(p * 100)}" for p in PERCENTILES]
+    table["count"] = grouped.size()
+    return table
+
+
+def load_stage_rows(db, since_hours=24):
+    """直近 since_hours 時間に取得した商品の段階時刻を全件読む"""
+    cutoff = (datetime.now(timezone.utc) - timedelta(hours=since_hours)).isoformat()
+    return list(db.iter_rows(
+        "products", f"id, {STAGE_COLUMNS}",
+        key="scraped_at", since=(cutoff, "00000000-0000-0000-0000-000000000000")
+    ))
+
+
+def gauge_series(runs, name):
+    """pipeline_runs の行からゲージの時系列 DataFrame(time, value) を作る"""
+    import pandas as pd
+
+    points = [point for run in runs for point in (run.get("gauges") or {}).get(name, [])]
+    df = pd.DataFrame(points, columns=["time", "value"])
+    df["time"] = pd.to_datetime(df["time"], utc=True, format="ISO8601")
+    return df.sort_values("time")
+
+
+def load_recent_runs(db, limit=200):
+    response = db.supabase.table("pipeline_runs")\
+        .select("*")\
+        .order("finished_at", desc=True)\
+        .limit(limit)\
+        .execute()
+    return response.data
+
+
+def print_report(since_hours=24):
+    """段階別・キーワード別のレイテンシを表示する"""
+    from database_manager import DatabaseManager
+
+    latencies = stage_latencies(load_stage_rows(DatabaseManager(), since_hours))
+    if latencies.empty:
+        print("計測データがありません。")
+    else:
+        print(latency_percentiles(latencies).to_string())
+        print()
+        print(latency_percentiles(latencies, by=("keyword", "stage")).to_string())
+
+
+if __name__ == "__main__":
+    print_report()
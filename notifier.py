@@ -1,44 +1,265 @@
 import os
+import json
+import logging
+import sqlite3
+import threading
+import time
 import requests
+from requests.adapters import HTTPAdapter
 from dotenv import load_dotenv
 
 load_dotenv()
 
+logger = logging.getLogger("notifier")
+
+# 通知するランク（カンマ区切り）。空なら通知しない。例: "S,A"
+NOTIFY_RANKS = [r.strip() for r in os.environ.get("NOTIFY_RANKS", "").split(",") if r.strip()]
+# 送信待ちの通知を保存するファイル（プロセスが落ちても次回起動時に再送する）
+OUTBOX_PATH = os.environ.get("NOTIFY_OUTBOX_PATH", "notify_outbox.db")
+# Discordの1メッセージあたりのembed上限
+MAX_EMBEDS = 10
+# 最初の通知からこの秒数だけ待って、まとめて1メッセージで送る
+COALESCE_SECONDS = float(os.environ.get("NOTIFY_COALESCE_SECONDS", "1.0"))
+REQUEST_TIMEOUT = float(os.environ.get("NOTIFY_TIMEOUT", "10"))
+MAX_ATTEMPTS = int(os.environ.get("NOTIFY_MAX_ATTEMPTS", "8"))
+# 終了時に送信待ちが無くなるまで待つ最大秒数（残りはアウトボックスに残る）
+DRAIN_TIMEOUT = float(os.environ.get("NOTIFY_DRAIN_TIMEOUT", "30"))
+
+RANK_EMOJI = {"S": "💎", "A": "🔥", "B": "✅", "C": "👀"}
+
+
+def build_embed(product, analysis):
+    """商品と分析結果からDiscordのembedを作る"""
+    inv_val = analysis.get('investment_value', 'C')
+    emoji = RANK_EMOJI.get(inv_val, "✨")
+    embed = {
+        "title": f"{emoji} 【ランク {inv_val}】お宝商品を発見！",
+        "description": f"**{product['title']}**",
+        "url": product['product_url'],
+        "color": 0x00ff00 if inv_val == 'S' else 0xffff00,
+        "fields": [
+            # Discordは空文字のフィールドを受け付けないので '-' で埋める
+            {"name": "価格", "value": f"¥{product['price']:,}", "inline": True},
+            {"name": "熱狂度", "value": analysis.get('heat_level') or '-', "inline": True},
+            {"name": "分析理由", "value": (analysis.get('trend_reason') or '-')[:1024]},
+            {"name": "未来予測", "value": (analysis.get('future_prediction') or '-')[:1024]}
+        ]
+    }
+    if product.get('image_url'):
+        embed["image"] = {"url": product['image_url']}
+    return embed
+
+
+class Outbox:
+    """送信待ち通知の永続キュー（SQLite）"""
+
+    def __init__(self, path=OUTBOX_PATH):
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("""
+            create table if not exists outbox (
+                id integer primary key autoincrement,
+                product_id text,
+                embed text not null,
+                attempts integer default 0,
+                next_attempt_at real default 0
+            )
+        """)
+        # 同じ商品の送信待ちは1件にまとめる（既存のファイルに重複があれば古い方を残す）
+        self._conn.execute("""
+            delete from outbox where product_id is not null
+              and id not in (select min(id) from outbox where product_id is not null group by product_id)
+        """)
+        self._conn.execute("create unique index if not exists outbox_product_idx on outbox (product_id)")
+        self._conn.commit()
+
+    def put(self, product_id, embed):
+        """通知を積む。同じ商品が送信待ちなら内容だけ最新にする（試行回数と順番はそのまま）"""
+        with self._lock:
+            self._conn.execute(
+                "insert into outbox (product_id, embed) values (?, ?) "
+                "on conflict (product_id) do update set embed = excluded.embed",
+                (product_id, json.dumps(embed, ensure_ascii=False))
+            )
+            self._conn.commit()
+
+    def take(self, limit, now):
+        """送信可能な通知を古い順に最大 limit 件返す [(id, product_id, embed, attempts)]"""
+        with self._lock:
+            rows = self._conn.execute(
+                "select id, product_id, embed, attempts from outbox where next_attempt_at <= ? order by id limit ?",
+                (now, limit)
+            ).fetchall()
+        return [(row_id, product_id, json.loads(embed), attempts) for row_id, product_id, embed, attempts in rows]
+
+    def oldest_pending(self):
+        """次に送信可能になる時刻（送信待ちが無ければ None）"""
+        with self._lock:
+            return self._conn.execute("select min(next_attempt_at) from outbox").fetchone()[0]
+
+    def delete(self, ids):
+        with self._lock:
+            self._conn.executemany("delete from outbox where id = ?", [(i,) for i in ids])
+            self._conn.commit()
+
+    def retry_later(self, ids, delay):
+        """失敗した通知の試行回数を増やし、上限に達したものは破棄する"""
+        with self._lock:
+            self._conn.executemany(
+                "update outbox set attempts = attempts + 1, next_attempt_at = ? where id = ?",
+                [(time.time() + delay, i) for i in ids]
+            )
+            dropped = self._conn.execute("delete from outbox where attempts >= ?", (MAX_ATTEMPTS,)).rowcount
+            self._conn.commit()
+        if dropped:
+            logger.error(f"通知を {dropped} 件破棄しました（{MAX_ATTEMPTS}回失敗）")
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("select count(*) from outbox").fetchone()[0]
+
+
+class NotificationDispatcher(threading.Thread):
+    """アウトボックスの通知をまとめてWebhookに送るバックグラウンドスレッド
+
+    - 最大10件のembedを1メッセージに詰める
+    - 最初の1件から COALESCE_SECONDS 待って同時期の通知をまとめる
+    - X-RateLimit-Remaining / X-RateLimit-Reset-After と 429 の retry_after に従う
+    """
+
+    def __init__(self, webhook_url, outbox, on_delivered=None):
+        super().__init__(daemon=True)
+        self.webhook_url = webhook_url
+        self.outbox = outbox
+        self.on_delivered = on_delivered
+        self.session = requests.Session()
+        self.session.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=2))
+        self.session.mount("http://", HTTPAdapter(pool_connections=1, pool_maxsize=2))
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._idle = threading.Event()
+        self._blocked_until = 0.0
+
+    def notify(self):
+        self._idle.clear()
+        self._wakeup.set()
+
+    def run(self):
+        while not self._stopping.is_set():
+            next_at = self.outbox.oldest_pending()
+            if next_at is None:
+                self._idle.set()
+                self._wakeup.wait()
+                self._wakeup.clear()
+                # まとめ送りのために少し待つ
+                self._stopping.wait(COALESCE_SECONDS)
+                continue
+
+            wait = max(next_at, self._blocked_until) - time.time()
+            if wait > 0:
+                self._wakeup.wait(min(wait, 5.0))
+                self._wakeup.clear()
+                continue
+
+            batch = self.outbox.take(MAX_EMBEDS, time.time())
+            if batch:
+                self._send(batch)
+
+    def _send(self, batch):
+        ids = [row[0] for row in batch]
+        payload = {"embeds": [row[2] for row in batch]}
+        try:
+            response = self.session.post(self.webhook_url, json=payload, timeout=REQUEST_TIMEOUT)
+        except requests.RequestException as e:
+            logger.warning(f"通知エラー: {e}")
+            self.outbox.retry_later(ids, self._backoff(batch))
+            return
+
+        self._apply_rate_limit_headers(response)
+        if response.status_code == 429:
+            retry_after = self._retry_after(response)
+            logger.warning(f"Discordのレート制限: {retry_after:.1f}秒後に再送します")
+            self._blocked_until = time.time() + retry_after
+            return
+        if response.status_code >= 500:
+            logger.warning(f"通知エラー: HTTP {response.status_code}")
+            self.outbox.retry_later(ids, self._backoff(batch))
+            return
+        if not response.ok:
+            # 4xx（429以外）は再送しても通らないので破棄する
+            logger.error(f"通知を破棄: HTTP {response.status_code} {response.text[:200]}")
+            self.outbox.delete(ids)
+            return
+
+        self.outbox.delete(ids)
+        logger.info(f"通知を送信しました ({len(batch)}件)")
+        if self.on_delivered:
+            try:
+                self.on_delivered([row[1] for row in batch if row[1]])
+            except Exception as e:
+                logger.error(f"通知完了の記録に失敗: {e}")
+
+    def _backoff(self, batch):
+        # 指数バックオフ（2, 4, 8... 最大5分）
+        attempts = max(row[3] for row in batch)
+        return min(2 ** (attempts + 1), 300)
+
+    def _retry_after(self, response):
+        try:
+            return float(response.json().get("retry_after", 1.0))
+        except ValueError:
+            return float(response.headers.get("Retry-After", 1.0))
+
+    def _apply_rate_limit_headers(self, response):
+        remaining = response.headers.get("X-RateLimit-Remaining")
+        reset_after = response.headers.get("X-RateLimit-Reset-After")
+        if remaining is not None and reset_after is not None and int(remaining) == 0:
+            self._blocked_until = time.time() + float(reset_after)
+
+    def drain(self, timeout=DRAIN_TIMEOUT):
+        """送信待ちが無くなるまで（最大 timeout 秒）待つ"""
+        self.notify()
+        deadline = time.time() + timeout
+        while len(self.outbox) and time.time() < deadline:
+            self._idle.wait(0.2)
+        return len(self.outbox) == 0
+
+    def stop(self):
+        self._stopping.set()
+        self._wakeup.set()
+        self.join(timeout=5)
+
+
 class Notifier:
-    def __init__(self):
+    def __init__(self, on_delivered=None):
         self.webhook_url = os.environ.get("DISCORD_WEBHOOK_URL")
+        self.dispatcher = None
+        if self.webhook_url and NOTIFY_RANKS:
+            self.dispatcher = NotificationDispatcher(self.webhook_url, Outbox(), on_delivered)
+            self.dispatcher.start()
+            # 前回送れなかった通知があれば再送する
+            self.dispatcher.notify()
 
     def send_profitable_item(self, product, analysis):
-        """利益商品を通知する"""
-        if not self.webhook_url:
-            return
+        """利益商品の通知を送信待ちに積む（積んだ場合は True を返す）
 
-        inv_val = analysis.get('investment_value', 'C')
-        
-        # SランクまたはAランクのみ通知
-        # if inv_val not in ['S', 'A']:
-        return
-
-        rank_emoji = {"S": "💎", "A": "🔥", "B": "✅", "C": "👀"}
-        emoji = rank_emoji.get(inv_val, "✨")
-
-        payload = {
-            "embeds": [{
-                "title": f"{emoji} 【ランク {inv_val}】お宝商品を発見！",
-                "description": f"**{product['title']}**",
-                "url": product['product_url'],
-                "color": 0x00ff00 if inv_val == 'S' else 0xffff00,
-                "fields": [
-                    {"name": "価格", "value": f"¥{product['price']:,}", "inline": True},
-                    {"name": "熱狂度", "value": analysis.get('heat_level', '-'), "inline": True},
-                    {"name": "分析理由", "value": analysis.get('trend_reason', '')},
-                    {"name": "未来予測", "value": analysis.get('future_prediction', '')}
-                ],
-                "image": {"url": product.get('image_url', '')}
-            }]
-        }
+        実際の送信はバックグラウンドで行われ、完了時に on_delivered が呼ばれる。
+        """
+        if not self.dispatcher:
+            return False
 
-        try:
-            requests.post(self.webhook_url, json=payload)
-        except Exception as e:
-            print(f"通知エラー: {e}")
+        # NOTIFY_RANKS に含まれるランクのみ通知
+        if analysis.get('investment_value', 'C') not in NOTIFY_RANKS:
+            return False
+
+        self.dispatcher.outbox.put(product.get('id'), build_embed(product, analysis))
+        self.dispatcher.notify()
+        return True
+
+    def close(self):
+        """送信待ちを可能な限り送ってから停止する"""
+        if not self.dispatcher:
+            return
+        if not self.dispatcher.drain():
+            logger.warning(f"未送信の通知 {len(self.dispatcher.outbox)} 件は次回送信します")
+        self.dispatcher.stop()
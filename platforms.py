@@ -0,0 +1,152 @@
+import logging
+import os
+from urllib.parse import quote, urljoin
+
+# マーケットプレイスごとの差分（URL・抽出・ID・マナー）をまとめたアダプタ
+#
+# 新しいマーケットプレイスは PlatformAdapter を継承して search_url / extract を実装し、
+# @register を付ければ scrape_engine.py が他と並行して巡回する。
+# 巡回するプラットフォームは SCOUTER_PLATFORMS（カンマ区切り）で選ぶ。
+
+ENABLED_PLATFORMS = [p.strip() for p in os.environ.get("SCOUTER_PLATFORMS", "mercari").split(",") if p.strip()]
+
+logger = logging.getLogger("platforms")
+
+PLATFORMS = {}
+
+
+def register(cls):
+    """アダプタクラスを名前で登録するデコレータ"""
+    PLATFORMS[cls.name] = cls
+    return cls
+
+
+def get_adapters(names=None):
+    """有効なプラットフォームのアダプタを返す"""
+    names = ENABLED_PLATFORMS if names is None else names
+    unknown = [name for name in names if name not in PLATFORMS]
+    if unknown:
+        raise ValueError(f"Unknown platform(s): {', '.join(unknown)} (available: {', '.join(PLATFORMS)})")
+    return [PLATFORMS[name]() for name in names]
+
+
+def parse_price(price_text):
+    """¥4,999 などの文字列を整数 4999 に変換"""
+    if not price_text:
+        return 0
+    clean_text = price_text.replace('¥', '').replace(',', '').replace(' ', '').strip()
+    try:
+        return int(clean_text)
+    except ValueError:
+        return 0
+
+
+class PlatformAdapter:
+    """マーケットプレイス1つ分の検索・抽出ルール"""
+
+    name = None
+    base_url = None
+
+    # マナー（プラットフォームごとの負荷のかけ方）
+    pages_per_minute = 0        # 検索ページ読み込みの上限（/分）。0 なら無制限
+    settle_ms = (6000, 8000)    # 読み込み後に一覧が描画されるまで待つ時間（ミリ秒, ランダム）
+    item_settle_ms = (2000, 3000)   # 価格の再確認で商品ページを読み込んだ後の待機時間
+    max_items = 10              # 1ページで処理する上位件数（新着順なので上位だけで十分）
+    block_patterns = []         # browser_policy に追加で遮断するURLパターン
+
+    def search_url(self, keyword):
+        """キーワードの新着順の検索URL"""
+        raise NotImplementedError
+
+    def extract(self, page):
+        """検索結果ページから生の商品情報 [{href, title, image_url, price_text}] を取り出す"""
+        raise NotImplementedError
+
+    def parse_item_id(self, url):
+        """商品URLからプラットフォーム上のIDを取り出す"""
+        raise NotImplementedError
+
+    def check_item(self, page):
+        """商品ページから (価格 or None, "open"/"sold") を読み取る（価格の再確認用）"""
+        raise NotImplementedError
+
+    def normalize(self, raw):
+        """生の商品情報を保存用の形に整える。使えないものは None"""
+        if not raw.get('href'):
+            return None
+        product_url = urljoin(self.base_url, raw['href'])
+        item_id = self.parse_item_id(product_url)
+        price = parse_price(raw.get('price_text'))
+        # 価格取得エラー(0円)の場合はスキップ
+        if not item_id or price == 0:
+            logger.warning(f"Skipping item with 0 price or no id (parse error): {product_url}",
+                           extra={"platform": self.name})
+            return None
+        return {
+            "item_id": item_id,
+            "title": raw.get('title') or "No Title",
+            "price": price,
+            "image_url": raw.get('image_url') or "",
+            "product_url": product_url,
+        }
+
+    def items(self, page):
+        """検索結果ページから保存用の商品を返す"""
+        products = []
+        for raw in self.extract(page)[:self.max_items]:
+            product = self.normalize(raw)
+            if product:
+                products.append(product)
+        return products
+
+
+# 一覧のセルから必要な属性を1回の評価でまとめて取り出す（要素ごとの往復をしない）
+_CELL_EXTRACTOR = """
+(cells, max) => cells.slice(0, max).map(cell => {
+    const link = cell.querySelector('a');
+    const img = cell.querySelector('img');
+    const price = Array.from(cell.querySelectorAll('span')).find(s => s.textContent.includes('¥'));
+    return {
+        href: link ? link.getAttribute('href') : null,
+        title: img ? img.getAttribute('alt') : null,
+        image_url: img ? img.getAttribute('src') : '',
+        price_text: price ? price.innerText : '0',
+    };
+})
+"""
+
+
+_ITEM_CHECKER = """
+() => {
+    const price = document.querySelector('[data-testid="price"]');
+    const checkout = document.querySelector('[data-testid="checkout-button"]');
+    const sold = !!checkout && (checkout.disabled || checkout.textContent.includes('売り切れ'));
+    return {price_text: price ? price.innerText : null, sold: sold};
+}
+"""
+
+
+@register
+class MercariAdapter(PlatformAdapter):
+    name = "mercari"
+    base_url = os.environ.get("MERCARI_BASE_URL", "https://jp.mercari.com")
+    item_selector = 'li[data-testid="item-cell"]'
+    block_patterns = ["*/thumb/*", "*/item/detail/orig/*"]
+
+    def search_url(self, keyword):
+        # 新しい順で検索すると効率が良い (sort=created_time, order=desc)
+        return f"{self.base_url}/search?keyword={quote(keyword)}&sort=created_time&order=desc"
+
+    def extract(self, page):
+        return page.locator(self.item_selector).evaluate_all(_CELL_EXTRACTOR, self.max_items)
+
+    def parse_item_id(self, url):
+        # ID抽出 (URLから /item/m123456... を抽出)
+        if '/item/' not in url:
+            return None
+        return url.split('/item/')[-1].split('?')[0].strip('/')
+
+    def check_item(self, page):
+        result = page.evaluate(_ITEM_CHECKER)
+        price = parse_price(result['price_text']) or None
+        return price, "sold" if result['sold'] else "open"
@@ -0,0 +1,225 @@
+import logging
+import math
+import os
+import pickle
+import re
+import unicodedata
+import zlib
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+
+# 明らかに価値の低い出品をAIに送る前に除外するためのローカル判定
+
+# 付属品・ジャンク・空箱など、タイトルだけで対象外と分かるもの
+REJECT_PATTERNS = [
+    "ジャンク", "故障", "壊れ", "動作未確認", "部品取り", "パーツのみ",
+    "空箱", "箱のみ", "外箱のみ", "説明書のみ", "ケースのみ", "カバーのみ",
+    "保護フィルム", "ガラスフィルム", "スマホケース", "互換", "ステッカー",
+]
+
+MIN_PRICE = int(os.environ.get("PREFILTER_MIN_PRICE", "500"))
+# モデルの有望確率がこの値未満なら自動で除外
+DISCARD_BELOW = float(os.environ.get("PREFILTER_DISCARD_BELOW", "0.05"))
+# 学習に使う過去ラベルの最大件数と、分類器を有効にする各クラスの最小件数
+TRAIN_LIMIT = int(os.environ.get("PREFILTER_TRAIN_LIMIT", "1000"))
+MIN_CLASS_SAMPLES = int(os.environ.get("PREFILTER_MIN_CLASS_SAMPLES", "20"))
+# 再現率の評価用に取り分ける割合
+HOLDOUT_RATIO = float(os.environ.get("PREFILTER_HOLDOUT_RATIO", "0.2"))
+# 学習済みの分類器の保存先。前回の学習から RETRAIN_HOURS 時間経つか、
+# ラベルが RETRAIN_MIN_NEW_LABELS 件以上増減するまでは保存したものを使う
+MODEL_PATH = os.environ.get("PREFILTER_MODEL_PATH", "prefilter_model.pkl")
+RETRAIN_HOURS = float(os.environ.get("PREFILTER_RETRAIN_HOURS", "24"))
+RETRAIN_MIN_NEW_LABELS = int(os.environ.get("PREFILTER_RETRAIN_MIN_NEW_LABELS", "100"))
+
+# 保存形式や特徴量を変えたら上げる（古いモデルは読み捨てて学習し直す）
+MODEL_VERSION = 2
+
+_SPACE_RE = re.compile(r"\s+")
+
+logger = logging.getLogger("prefilter")
+
+
+def _normalize(text):
+    return _SPACE_RE.sub("", unicodedata.normalize("NFKC", text or "").lower())
+
+
+def extract_features(title, price):
+    """タイトルの文字bigramと価格帯をトークン化する（分かち書き不要で日本語にも効く）"""
+    norm = _normalize(title)
+    tokens = [norm[i:i + 2] for i in range(len(norm) - 1)] or [norm]
+    if price and price > 0:
+        tokens.append(f"__price_{int(math.log2(price))}")
+    return tokens
+
+
+def rule_reason(product):
+    """ルールで除外すべき場合はその理由を返す"""
+    # 価格0・欠損は取得時のパース失敗なので、安価品として除外しない
+    price = product.get('price')
+    if price and price < MIN_PRICE:
+        return f"price below {MIN_PRICE}"
+    title = unicodedata.normalize("NFKC", product.get('title') or "")
+    for pattern in REJECT_PATTERNS:
+        if pattern in title:
+            return f"keyword '{pattern}'"
+    return None
+
+
+class NaiveBayesFilter:
+    """profitable / discarded の2クラス多項ナイーブベイズ"""
+
+    def __init__(self):
+        self.token_counts = {True: Counter(), False: Counter()}
+        self.doc_counts = {True: 0, False: 0}
+        self.vocab = set()
+
+    @property
+    def is_trained(self):
+        return min(self.doc_counts.values()) >= MIN_CLASS_SAMPLES
+
+    def fit(self, rows):
+        for row in rows:
+            label = row['status'] == 'profitable'
+            tokens = extract_features(row.get('title'), row.get('price'))
+            self.token_counts[label].update(tokens)
+            self.doc_counts[label] += 1
+            self.vocab.update(tokens)
+        self._totals = {k: sum(v.values()) for k, v in self.token_counts.items()}
+        return self
+
+    def predict_proba(self, product):
+        """有望(profitable)である確率を返す"""
+        tokens = extract_features(product.get('title'), product.get('price'))
+        n_docs = sum(self.doc_counts.values())
+        v = len(self.vocab) + 1
+        scores = {}
+        for label in (True, False):
+            score = math.log(self.doc_counts[label] / n_docs)
+            counts, total = self.token_counts[label], self._totals[label]
+            for token in tokens:
+                score += math.log((counts[token] + 1) / (total + v))
+            scores[label] = score
+        # log-sum-exp で確率に戻す
+        m = max(scores.values())
+        pos, neg = math.exp(scores[True] - m), math.exp(scores[False] - m)
+        return pos / (pos + neg)
+
+
+def _is_holdout(row):
+    # idのハッシュで決定的に分割し、実行ごとに評価セットがぶれないようにする
+    return zlib.crc32(str(row['id']).encode()) % 1000 < HOLDOUT_RATIO * 1000
+
+
+class PreFilter:
+    def __init__(self, classifier=None, report=None):
+        self.classifier = classifier
+        # 学習時に取り分けたデータでの評価結果（evaluate の戻り値）
+        self.report = report
+
+    def decide(self, product):
+        """除外する場合は (True, 理由, スコア)、AIに送る場合は (False, None, スコア)"""
+        reason = rule_reason(product)
+        if reason:
+            return True, reason, 0.0
+        if self.classifier is None:
+            return False, None, None
+        score = self.classifier.predict_proba(product)
+        if score < DISCARD_BELOW:
+            return True, f"score {score:.3f} < {DISCARD_BELOW}", score
+        return False, None, score
+
+    def split(self, products):
+        """商品を (AIに送るもの, 除外するもの[(product, reason, score)]) に分ける"""
+        candidates, rejected = [], []
+        for product in products:
+            discard, reason, score = self.decide(product)
+            if discard:
+                rejected.append((product, reason, score))
+            else:
+                candidates.append(product)
+        return candidates, rejected
+
+    def evaluate(self, rows):
+        """ラベル付きデータでの再現率（有望品を誤って除外しなかった割合）と除外率を返す"""
+        positives = [r for r in rows if r['status'] == 'profitable']
+        kept = sum(1 for r in positives if not self.decide(r)[0])
+        discarded = sum(1 for r in rows if self.decide(r)[0])
+        return {
+            "samples": len(rows),
+            "recall": kept / len(positives) if positives else None,
+            "discard_rate": discarded / len(rows) if rows else None,
+        }
+
+
+def _load_model(path):
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, "rb") as f:
+            state = pickle.load(f)
+        if state.get("version") == MODEL_VERSION:
+            return state
+        logger.info("PreFilter: 保存済みモデルの形式が古いため学習し直します")
+    except Exception as e:
+        logger.warning(f"PreFilter: 保存済みモデルの読み込みに失敗したため学習し直します: {e}")
+    return None
+
+
+def _save_model(path, state):
+    # 書き込み途中で落ちても壊れたファイルが残らないよう、一時ファイルから置き換える
+    tmp = f"{path}.tmp"
+    with open(tmp, "wb") as f:
+        pickle.dump(state, f)
+    os.replace(tmp, path)
+
+
+def train_prefilter(db):
+    """過去のラベルから分類器を学習し、取り分けたデータで評価した PreFilter を返す"""
+    rows = db.get_labeled_products(limit=TRAIN_LIMIT)
+    train = [r for r in rows if not _is_holdout(r)]
+    holdout = [r for r in rows if _is_holdout(r)]
+
+    classifier = NaiveBayesFilter().fit(train)
+    if not classifier.is_trained:
+        logger.info(f"PreFilter: ラベル付きデータ不足のためルールのみで判定します ({classifier.doc_counts})")
+        return PreFilter()
+
+    prefilter = PreFilter(classifier)
+    prefilter.report = prefilter.evaluate(holdout)
+    return prefilter
+
+
+def _log_report(report):
+    if report and report["recall"] is not None:
+        logger.info(f"PreFilter: holdout recall={report['recall']:.3f} "
+                    f"discard_rate={report['discard_rate']:.3f} (n={report['samples']})", extra=report)
+
+
+def build_prefilter(db, path=MODEL_PATH, now=None):
+    """保存済みの分類器がまだ新しければそれを、そうでなければ学習し直した PreFilter を返す"""
+    now = now or datetime.now(timezone.utc)
+    label_count = db.count_labeled_products()
+    state = _load_model(path)
+    if (state is not None
+            and now - state["trained_at"] < timedelta(hours=RETRAIN_HOURS)
+            and abs(label_count - state["label_count"]) < RETRAIN_MIN_NEW_LABELS):
+        prefilter = PreFilter(state["classifier"], state["report"])
+        _log_report(prefilter.report)
+        return prefilter
+
+    prefilter = train_prefilter(db)
+    _log_report(prefilter.report)
+    try:
+        _save_model(path, {"version": MODEL_VERSION, "trained_at": now, "label_count": label_count,
+                           "classifier": prefilter.classifier, "report": prefilter.report})
+    except OSError as e:
+        logger.warning(f"PreFilter: モデルを保存できませんでした: {e}")
+    return prefilter
+
+
+if __name__ == "__main__":
+    from database_manager import DatabaseManager
+    from log_config import setup_logging
+
+    setup_logging("prefilter")
+    _log_report(train_prefilter(DatabaseManager()).report)
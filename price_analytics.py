@@ -0,0 +1,175 @@
+import logging
+import os
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+import pandas as pd
+
+from keywords import normalize_keyword
+
+# キーワード/クラスタ単位の直近価格分布を列指向で集計し、相場より安い出品を検出する
+
+STATE_PATH = os.environ.get("PRICE_STATS_PATH", "price_stats.pkl")
+WINDOW_DAYS = int(os.environ.get("PRICE_STATS_WINDOW_DAYS", "14"))
+PAGE_SIZE = int(os.environ.get("PRICE_STATS_PAGE_SIZE", "1000"))
+# 統計を信用するのに必要な最小サンプル数（未満ならクラスタ = 正規化キーワードの統計にフォールバック）
+MIN_SAMPLES = int(os.environ.get("PRICE_STATS_MIN_SAMPLES", "5"))
+# Tukeyの外れ値基準: Q1 - k*IQR を下回れば「相場より明らかに安い」
+ANOMALY_IQR_K = float(os.environ.get("PRICE_ANOMALY_IQR_K", "1.5"))
+# 後からコミットされた行（scraped_at がカーソルより前）を拾うため、前回の終端からこの秒数だけ読み直す
+OVERLAP_SECONDS = int(os.environ.get("PRICE_STATS_OVERLAP_SECONDS", "300"))
+
+# 保存形式やクラスタの定義を変えたら上げる（古い状態は読み捨てて再構築する）
+STATE_VERSION = 3
+
+logger = logging.getLogger("price_analytics")
+
+
+def _empty_frame():
+    return pd.DataFrame({
+        "id": pd.Series(dtype="string"),
+        "keyword": pd.Series(dtype="string"),
+        "cluster": pd.Series(dtype="string"),
+        "price": pd.Series(dtype="int64"),
+        "scraped_at": pd.Series(dtype="datetime64[ns, UTC]"),
+    })
+
+
+def _page_to_frame(rows):
+    df = pd.DataFrame.from_records(rows, columns=["id", "keyword", "price", "scraped_at"])
+    df = df.dropna(subset=["keyword", "price"])
+    return pd.DataFrame({
+        "id": df["id"].astype("string"),
+        "keyword": df["keyword"].astype("string"),
+        "cluster": df["keyword"].map(normalize_keyword).astype("string"),
+        "price": df["price"].astype("int64"),
+        "scraped_at": pd.to_datetime(df["scraped_at"], utc=True, format="ISO8601"),
+    })
+
+
+def _group_stats(frame, key, now):
+    if frame.empty:
+        return pd.DataFrame(columns=["q1", "median", "q3", "iqr", "count", "velocity"], dtype="float64")
+    grouped = frame.groupby(key, observed=True)["price"]
+    quantiles = grouped.quantile([0.25, 0.5, 0.75]).unstack()
+    quantiles.columns = ["q1", "median", "q3"]
+    stats = quantiles.assign(
+        iqr=quantiles["q3"] - quantiles["q1"],
+        count=grouped.size(),
+    )
+    # 直近24時間の新規出品数/時間 = 出品の勢い
+    recent = frame[frame["scraped_at"] >= now - pd.Timedelta(hours=24)]
+    velocity = recent.groupby(key, observed=True).size() / 24.0
+    stats["velocity"] = velocity.reindex(stats.index).fillna(0.0)
+    return stats
+
+
+class PriceAnalytics:
+    """直近 WINDOW_DAYS 日分の (id, keyword, price, scraped_at) を保持し、差分だけ読み足して統計を更新する"""
+
+    def __init__(self, frame=None, cursor=None):
+        self.frame = _empty_frame() if frame is None else frame
+        self.cursor = cursor
+        self._stats = None
+
+    @classmethod
+    def load(cls, path=STATE_PATH):
+        if os.path.exists(path):
+            try:
+                state = pd.read_pickle(path)
+                if state.get("version") == STATE_VERSION:
+                    return cls(state["frame"], state["cursor"])
+                logger.info("価格統計の形式が古いため再構築します")
+            except Exception as e:
+                logger.warning(f"価格統計の読み込みに失敗したため再構築します: {e}")
+        return cls()
+
+    def save(self, path=STATE_PATH):
+        pd.to_pickle({"version": STATE_VERSION, "frame": self.frame, "cursor": self.cursor}, path)
+
+    def update(self, db, now=None):
+        """前回のカーソル以降の商品だけをページ単位で取り込み、ウィンドウ外を捨てる
+
+        カーソルの OVERLAP_SECONDS 秒前から読み直し、重複はidで除く。
+        """
+        now = now or datetime.now(timezone.utc)
+        window_start = now - timedelta(days=WINDOW_DAYS)
+        start = window_start
+        if self.cursor:
+            start = pd.Timestamp(self.cursor[0]) - timedelta(seconds=OVERLAP_SECONDS)
+        since = (start.isoformat(), "00000000-0000-0000-0000-000000000000")
+
+        chunks = [self.frame]
+        for rows in db.iter_product_pages("id, keyword, price, scraped_at", since=since, page_size=PAGE_SIZE):
+            chunks.append(_page_to_frame(rows))
+            self.cursor = (rows[-1]['scraped_at'], rows[-1]['id'])
+
+        before = len(self.frame)
+        frame = pd.concat(chunks, ignore_index=True) if len(chunks) > 1 else self.frame
+        frame = frame.drop_duplicates(subset="id", keep="last")
+        added = len(frame) - before
+        self.frame = frame[frame["scraped_at"] >= pd.Timestamp(window_start)].reset_index(drop=True)
+        self._stats = None
+        logger.info(f"価格統計を更新: 新規 {added} 件 / ウィンドウ内 {len(self.frame)} 件")
+        return added
+
+    def stats(self, now=None):
+        """(keyword統計, cluster統計) を返す。列: q1, median, q3, iqr, count, velocity"""
+        if self._stats is None:
+            now = pd.Timestamp(now or datetime.now(timezone.utc))
+            self._stats = (
+                _group_stats(self.frame, "keyword", now),
+                _group_stats(self.frame, "cluster", now),
+            )
+        return self._stats
+
+    def score(self, products):
+        """各商品の割安度を返す（DataFrame: id, discount_score, is_anomaly, velocity）
+
+        discount_score = (中央値 - 価格) / IQR。正の値ほど相場より安い。
+        キーワードのサンプルが少ない場合はクラスタの統計を使う。
+        """
+        if not products:
+            return pd.DataFrame(columns=["id", "discount_score", "is_anomaly", "velocity"])
+
+        df = pd.DataFrame.from_records(products, columns=["id", "keyword", "price"])
+        df["cluster"] = df["keyword"].map(normalize_keyword)
+        by_keyword, by_cluster = self.stats()
+
+        kw = by_keyword.reindex(df["keyword"]).reset_index(drop=True)
+        cl = by_cluster.reindex(df["cluster"]).reset_index(drop=True)
+        use_kw = (kw["count"] >= MIN_SAMPLES).to_numpy()
+        chosen = cl.where(pd.Series(~use_kw), kw, axis=0)
+        enough = (chosen["count"] >= MIN_SAMPLES).to_numpy()
+
+        price = df["price"].to_numpy(dtype="float64")
+        median = chosen["median"].to_numpy()
+        # IQRが0（同値ばかり）のときは中央値の10%を尺度にする
+        scale = np.maximum(chosen["iqr"].to_numpy(), np.maximum(median * 0.1, 1.0))
+        discount = np.where(enough, (median - price) / scale, 0.0)
+        anomaly = enough & (price < chosen["q1"].to_numpy() - ANOMALY_IQR_K * chosen["iqr"].to_numpy())
+
+        return pd.DataFrame({
+            "id": df["id"],
+            "discount_score": np.nan_to_num(discount),
+            "is_anomaly": anomaly,
+            "velocity": chosen["velocity"].fillna(0.0).to_numpy(),
+        })
+
+
+def load_price_analytics(db):
+    """保存済みの統計を読み込み、差分を反映して保存したものを返す"""
+    analytics = PriceAnalytics.load()
+    analytics.update(db)
+    analytics.save()
+    return analytics
+
+
+if __name__ == "__main__":
+    from database_manager import DatabaseManager
+    from log_config import setup_logging
+
+    setup_logging("price_analytics")
+    analytics = load_price_analytics(DatabaseManager())
+    by_keyword, _ = analytics.stats()
+    print(by_keyword.sort_values("velocity", ascending=False).head(20).to_string())
@@ -0,0 +1,140 @@
+import logging
+import os
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+
+import metrics
+from priority import base_priority
+
+# 既知の商品の価格変化の追跡
+#
+# 価格の観測は2か所から入る:
+#   1. 検索結果に既知の商品が再び出てきたとき（追加のページ読み込みなし）
+#   2. next_check_at を過ぎた出品中の商品を商品ページで再確認したとき
+# 変化があれば price_history に差分（円）だけを追記し、products.price を更新する。
+# 変化率が PRICE_REQUEUE_RATIO 以上なら分析をやり直すため status を 'new' に戻す。
+# 再確認の間隔はAIのランクで決め、価値の高い商品ほど頻繁に見る。
+# 対象外(discarded)・隔離中の商品は追跡せず、1サイクルの枠は高ランクから順に使う。
+# 確認に失敗した商品は通常の間隔だけ先送りし、同じ商品が毎回先頭に来ないようにする。
+
+# ランクごとの再確認間隔（時間）。"new" は未分析の商品
+CHECK_INTERVAL_HOURS = {
+    rank: float(hours)
+    for rank, hours in (
+        pair.split("=") for pair in os.environ.get("PRICE_CHECK_INTERVALS", "S=0.5,A=1,B=3,C=24,new=6").split(",")
+    )
+}
+# 取得からこの日数を過ぎた商品は追跡をやめる
+TRACK_DAYS = float(os.environ.get("PRICE_TRACK_DAYS", "14"))
+# この割合以上の価格変化で再分析する
+REQUEUE_RATIO = float(os.environ.get("PRICE_REQUEUE_RATIO", "0.1"))
+# 1サイクルで再確認する商品数（プラットフォームごと）
+CHECKS_PER_CYCLE = int(os.environ.get("PRICE_CHECKS_PER_CYCLE", "20"))
+# ランク順に並べ直すために、枠の何倍の候補を読み込むか
+DUE_POOL_FACTOR = int(os.environ.get("PRICE_DUE_POOL_FACTOR", "5"))
+
+# 1サイクルの枠を使う順（未分析は B と C の間）
+RANK_ORDER = {"S": 0, "A": 1, "B": 2, "new": 3, "C": 4}
+
+TRACK_COLUMNS = "id, item_id, platform, keyword, price, status, product_url, rank:ai_analysis->>investment_value"
+
+logger = logging.getLogger("price_tracker")
+
+
+def check_interval(product):
+    """商品の再確認間隔（ランクが無い・分からない場合は未分析扱い）"""
+    rank = product.get('rank') if product.get('status') != 'new' else None
+    return timedelta(hours=CHECK_INTERVAL_HOURS.get(rank or "new", CHECK_INTERVAL_HOURS.get("new", 6.0)))
+
+
+def next_check_at(product, now):
+    """次に再確認する時刻（追跡期間の打ち切りは due_products 側で行う）"""
+    return (now + check_interval(product)).isoformat()
+
+
+def _rank(product):
+    return product.get('rank') if product.get('status') != 'new' else "new"
+
+
+def due_products(db, platform, limit=CHECKS_PER_CYCLE, now=None):
+    """再確認の時刻を過ぎた出品中の商品を、ランクの高い順・遅れている順に limit 件"""
+    now = now or datetime.now(timezone.utc)
+    candidates = db.get_due_price_checks(platform, now, now - timedelta(days=TRACK_DAYS),
+                                         limit * DUE_POOL_FACTOR, TRACK_COLUMNS)
+    # 取得順（next_check_at の古い順）を保ったままランクで並べ直す
+    return sorted(candidates, key=lambda product: RANK_ORDER.get(_rank(product) or "new", len(RANK_ORDER)))[:limit]
+
+
+def defer_checks(db, products, now=None):
+    """確認できなかった商品の次の確認を、ランクの通常の間隔だけ先に送る"""
+    now = now or datetime.now(timezone.utc)
+    by_time = defaultdict(list)
+    for product in products:
+        by_time[next_check_at(product, now)].append(product['id'])
+    for when, ids in by_time.items():
+        db.update_by_ids("products", {"next_check_at": when}, ids)
+    metrics.incr("price_checks_failed", len(products))
+
+
+def apply_observations(db, observations, analytics=None, configs=None, now=None):
+    """価格の観測結果を反映する
+
+    observations: [{"product": TRACK_COLUMNS の行, "price": 観測価格 or None, "listing_status": "open"/"sold"/"gone"}]
+    価格が変わった商品は個別に、変わらなかった商品は更新内容ごとにまとめて更新する。
+    """
+    if not observations:
+        return
+    now = now or datetime.now(timezone.utc)
+    now_iso = now.isoformat()
+    configs = configs or {}
+    history = []
+    unchanged = defaultdict(list)    # 更新内容 -> 商品ID
+
+    for observation in observations:
+        product = observation["product"]
+        status = observation.get("listing_status") or "open"
+        values = {
+            "last_checked_at": now_iso,
+            "listing_status": status,
+            # 売り切れ・削除済みはもう見ない
+            "next_check_at": next_check_at(product, now) if status == "open" else None,
+        }
+        if status != "open":
+            metrics.incr("listings_closed")
+
+        price = observation.get("price")
+        if not price or price == product['price']:
+            unchanged[tuple(sorted(values.items()))].append(product['id'])
+            continue
+
+        delta = price - product['price']
+        history.append({"product_id": product['id'], "observed_at": now_iso, "price_delta": delta})
+        values["price"] = price
+        metrics.incr("price_changes")
+        logger.info(f"Price change: {product['price']} -> {price} ({product['item_id']})",
+                    extra={"product_id": product['id'], "keyword": product.get('keyword'), "price_delta": delta})
+
+        # 大きく変わった商品は分析をやり直す（分析待ち・隔離中はそのまま）
+        if abs(delta) / max(product['price'], 1) >= REQUEUE_RATIO and product['status'] not in ('new', 'quarantined'):
+            discount = 0.0
+            if analytics is not None:
+                score = analytics.score([{"id": product['id'], "keyword": product.get('keyword'), "price": price}])
+                discount = float(score['discount_score'].iloc[0])
+            values.update({
+                "status": "new",
+                "enqueued_at": now_iso,
+                "analysis_attempts": 0,
+                "priority": base_priority(configs.get(product.get('keyword'), {}), discount, now),
+                # 前回の分析の段階時刻が残ると、段階ごとの所要時間が負になる
+                "analysis_started_at": None,
+                "analyzed_at": None,
+                "notified_at": None,
+            })
+            metrics.incr("price_requeued")
+        db.update_product(product['id'], values)
+
+    # 差分の記録は1回の挿入で
+    db.insert_price_history(history)
+    for values, ids in unchanged.items():
+        db.update_by_ids("products", dict(values), ids)
+    metrics.incr("price_checks", len(observations))
@@ -0,0 +1,81 @@
+import math
+import os
+import re
+from datetime import datetime, timezone
+
+# 分析キューの優先度計算
+#
+# priority = キーワードの熱量 + 割安度 + 目標利益                （products.priority に保存）
+# 分析する順 = priority + 新しさ（キューに入ってからの経過時間で半減し、最大 RECENCY_WEIGHT）
+#
+# 新しさは時間とともに変わるので保存せず、分析時に候補（priority 上位と新着）を
+# 読み込んでから queue_score で並べ直す。新しさに上限があるので、熱いキーワードや
+# 大きな割安は数時間新しい商品より先に分析される。
+
+RECENCY_WEIGHT = float(os.environ.get("PRIORITY_RECENCY_WEIGHT", "2.0"))
+RECENCY_HALF_LIFE_HOURS = float(os.environ.get("PRIORITY_RECENCY_HALF_LIFE_HOURS", "6"))
+HOTNESS_WEIGHT = float(os.environ.get("PRIORITY_HOTNESS_WEIGHT", "2.0"))
+DISCOUNT_WEIGHT = float(os.environ.get("PRIORITY_DISCOUNT_WEIGHT", "1.5"))
+PROFIT_WEIGHT = float(os.environ.get("PRIORITY_PROFIT_WEIGHT", "1.0"))
+# トレンドで検出されたキーワードの熱量が半分になるまでの時間
+TREND_HALF_LIFE_HOURS = float(os.environ.get("TREND_HALF_LIFE_HOURS", "24"))
+
+_FRACTION_RE = re.compile(r"\.(\d+)")
+
+
+def _parse_time(value):
+    if not value:
+        return None
+    if isinstance(value, datetime):
+        return value
+    # PostgREST は小数秒の末尾の0を削る（".12345"）が、Python 3.10 の fromisoformat は
+    # 3桁か6桁しか読めないので6桁に揃える
+    value = _FRACTION_RE.sub(lambda m: "." + m.group(1)[:6].ljust(6, "0"), value.replace("Z", "+00:00"), count=1)
+    return datetime.fromisoformat(value)
+
+
+def keyword_hotness(config, now=None):
+    """trend_watcher が付けた trend_score を最終検出からの経過時間で減衰させる"""
+    seen_at = _parse_time(config.get('trend_seen_at'))
+    score = config.get('trend_score') or 0
+    if not seen_at or score <= 0:
+        return 0.0
+    now = now or datetime.now(timezone.utc)
+    age_hours = max((now - seen_at).total_seconds() / 3600, 0.0)
+    return score * 0.5 ** (age_hours / TREND_HALF_LIFE_HOURS)
+
+
+def recency_bonus(enqueued_at, now=None):
+    """キューに入ってからの経過時間で半減する新しさの項（0〜RECENCY_WEIGHT）"""
+    enqueued_at = _parse_time(enqueued_at)
+    if enqueued_at is None:
+        return 0.0
+    now = now or datetime.now(timezone.utc)
+    age_hours = max((now - enqueued_at).total_seconds() / 3600, 0.0)
+    return RECENCY_WEIGHT * 0.5 ** (age_hours / RECENCY_HALF_LIFE_HOURS)
+
+
+def base_priority(config, discount_score=0.0, now=None):
+    """時間で変わらない部分の優先度（products.priority に保存する値）"""
+    hotness = math.log1p(keyword_hotness(config, now))
+    discount = min(max(discount_score, -2.0), 5.0)
+    profit = math.log1p((config.get('target_profit') or 0) / 1000)
+    return HOTNESS_WEIGHT * hotness + DISCOUNT_WEIGHT * discount + PROFIT_WEIGHT * profit
+
+
+def compute_priority(config, discount_score=0.0, enqueued_at=None, now=None):
+    """商品の分析優先度を返す（大きいほど先に分析）"""
+    now = now or datetime.now(timezone.utc)
+    return base_priority(config, discount_score, now) + recency_bonus(enqueued_at or now, now)
+
+
+def queue_score(product, now=None):
+    """保存済みの priority に現在の新しさを足した、分析する順の値"""
+    return (product.get('priority') or 0.0) + recency_bonus(product.get('enqueued_at') or product.get('scraped_at'), now)
+
+
+def rank_queue(products, now=None):
+    """分析待ちの候補を queue_score の高い順に並べる（重複は除く）"""
+    now = now or datetime.now(timezone.utc)
+    unique = {product['id']: product for product in products}
+    return sorted(unique.values(), key=lambda product: queue_score(product, now), reverse=True)
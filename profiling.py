@@ -0,0 +1,254 @@
+import functools
+import json
+import logging
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter, defaultdict
+from contextlib import nullcontext
+from datetime import datetime
+
+# オプトインのプロファイリング
+#
+# SCOUTER_PROFILE=1 もしくは各スクリプトの --profile で有効化する。無効時は
+# span() が共有の nullcontext を返すだけで、ライブラリへのパッチも当てない。
+#
+# 有効時は1サイクルごとに PROFILE_DIR に以下を出力する:
+#   <component>-<時刻>.json        スパン集計・メモリスナップショット・上位割り当て箇所
+#   <component>-<時刻>.cpu.folded  サンプリングCPUプロファイル（flamegraph.pl / speedscope 形式）
+#                                  待機中のスレッド（ロック・キュー・selectの待ち）は含めない
+#   <component>-<時刻>.wall.folded スパンの入れ子による実時間（ミリ秒）の folded 形式
+
+PROFILE_DIR = os.environ.get("PROFILE_DIR", "profiles")
+SAMPLE_INTERVAL = float(os.environ.get("PROFILE_SAMPLE_INTERVAL_MS", "10")) / 1000
+
+ENABLED = os.environ.get("SCOUTER_PROFILE", "0").lower() in ("1", "true", "yes")
+
+logger = logging.getLogger("profiling")
+
+# スタックの先頭（実行中の関数）がこれらなら、そのスレッドはCPUを使わずに待っている
+IDLE_FRAMES = {
+    ("threading.py", "wait"),
+    ("threading.py", "_wait_for_tstate_lock"),
+    ("queue.py", "get"),
+    ("selectors.py", "select"),
+    ("socket.py", "accept"),
+}
+
+_NULL_SPAN = nullcontext()
+_local = threading.local()
+# _spans / _wall_stacks はワーカースレッドからも更新されるので、このロックの中で触る
+_lock = threading.Lock()
+_spans = defaultdict(list)      # name -> [秒]
+_wall_stacks = Counter()        # "親;子" -> ミリ秒
+_memory = []
+_instrumented = False
+
+
+def enable():
+    global ENABLED
+    ENABLED = True
+
+
+class _Span:
+    __slots__ = ("name", "start", "child_time")
+
+    def __init__(self, name):
+        self.name = name
+        self.child_time = 0.0
+
+    def __enter__(self):
+        stack = getattr(_local, "stack", None)
+        if stack is None:
+            stack = _local.stack = []
+        stack.append(self)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        elapsed = time.perf_counter() - self.start
+        stack = _local.stack
+        # folded形式は各スタックの「自分自身の時間」を並べるので、子スパンの時間を引く
+        folded = ";".join(s.name for s in stack)
+        with _lock:
+            _spans[self.name].append(elapsed)
+            _wall_stacks[folded] += (elapsed - self.child_time) * 1000
+        stack.pop()
+        if stack:
+            stack[-1].child_time += elapsed
+        return False
+
+
+def span(name):
+    """外部呼び出しなどを囲む実時間スパン（無効時はほぼコストなし）"""
+    if not ENABLED:
+        return _NULL_SPAN
+    return _Span(name)
+
+
+def memory_snapshot(label):
+    """現在と最大のトレース済みメモリを記録する"""
+    if not ENABLED or not tracemalloc.is_tracing():
+        return
+    current, peak = tracemalloc.get_traced_memory()
+    _memory.append({"label": label, "time": time.time(), "current_kb": current // 1024, "peak_kb": peak // 1024})
+
+
+def _instrument(cls, method_name, span_name):
+    original = getattr(cls, method_name)
+
+    @functools.wraps(original)
+    def wrapper(*args, **kwargs):
+        with _Span(span_name):
+            return original(*args, **kwargs)
+
+    setattr(cls, method_name, wrapper)
+
+
+def _instrument_libraries():
+    """外部呼び出し（ブラウザ・Supabase・Gemini）にスパンを差し込む"""
+    global _instrumented
+    if _instrumented:
+        return
+    _instrumented = True
+
+    try:
+        from playwright.sync_api import Locator, Page
+        for method in ("goto", "wait_for_timeout", "route"):
+            _instrument(Page, method, f"page.{method}")
+        for method in ("count", "get_attribute", "inner_text", "all", "evaluate_all"):
+            _instrument(Locator, method, f"locator.{method}")
+    except ImportError:
+        pass
+
+    try:
+        from postgrest._sync import request_builder
+        for cls in (request_builder.SyncQueryRequestBuilder,
+                    request_builder.SyncSingleRequestBuilder,
+                    request_builder.SyncMaybeSingleRequestBuilder):
+            _instrument(cls, "execute", "supabase.execute")
+    except ImportError:
+        pass
+
+    try:
+        import google.generativeai as genai
+        _instrument(genai.GenerativeModel, "generate_content", "gemini.generate_content")
+    except ImportError:
+        pass
+
+
+class _Sampler(threading.Thread):
+    """全スレッドのスタックを一定間隔で採取する簡易サンプリングプロファイラ
+
+    スクレイピングはワーカースレッドで動くので、呼び出し元のスレッドだけでは足りない。
+    スタックの先頭にスレッド名を付けるので、flamegraph ではスレッドごとに分かれる。
+    IDLE_FRAMES で待機しているスレッドは idle_samples に数えるだけで、CPUプロファイルには入れない。
+    """
+
+    def __init__(self):
+        super().__init__(daemon=True, name="profiler-sampler")
+        self.samples = Counter()
+        self.idle_samples = 0
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.wait(SAMPLE_INTERVAL):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == self.ident:
+                    continue
+                if (os.path.basename(frame.f_code.co_filename), frame.f_code.co_name) in IDLE_FRAMES:
+                    self.idle_samples += 1
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                    frame = frame.f_back
+                if stack:
+                    stack.append(names.get(thread_id, f"thread-{thread_id}"))
+                    self.samples[";".join(reversed(stack))] += 1
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+
+def _summarize_spans(spans):
+    summary = {}
+    for name, durations in spans.items():
+        ordered = sorted(durations)
+        summary[name] = {
+            "count": len(ordered),
+            "total_s": round(sum(ordered), 4),
+            "mean_ms": round(sum(ordered) / len(ordered) * 1000, 2),
+            "p95_ms": round(ordered[int(0.95 * (len(ordered) - 1))] * 1000, 2),
+            "max_ms": round(ordered[-1] * 1000, 2),
+        }
+    return dict(sorted(summary.items(), key=lambda kv: kv[1]["total_s"], reverse=True))
+
+
+def _write_folded(path, counts, scale=1):
+    with open(path, "w", encoding="utf-8") as f:
+        for stack, value in counts.items():
+            f.write(f"{stack} {max(int(round(value * scale)), 1)}\n")
+
+
+def profiled(component):
+    """エントリ関数に付けるデコレータ。有効時のみ1回の実行をプロファイルしてレポートを書く"""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not ENABLED:
+                return func(*args, **kwargs)
+
+            _instrument_libraries()
+            with _lock:
+                _spans.clear()
+                _wall_stacks.clear()
+            _memory.clear()
+            tracemalloc.start()
+            sampler = _Sampler()
+            sampler.start()
+            started = time.perf_counter()
+            try:
+                with _Span(component):
+                    return func(*args, **kwargs)
+            finally:
+                wall = time.perf_counter() - started
+                sampler.stop()
+                memory_snapshot("end")
+                top = tracemalloc.take_snapshot().statistics("lineno")[:15]
+                tracemalloc.stop()
+                _write_report(component, wall, sampler, top)
+        return wrapper
+    return decorator
+
+
+def _write_report(component, wall, sampler, top_allocations):
+    with _lock:
+        spans = {name: list(durations) for name, durations in _spans.items()}
+        wall_stacks = Counter(_wall_stacks)
+    samples = sampler.samples
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    base = os.path.join(PROFILE_DIR, f"{component}-{datetime.now():%Y%m%d-%H%M%S}")
+    report = {
+        "component": component,
+        "wall_s": round(wall, 3),
+        "cpu_samples": sum(samples.values()),
+        "idle_samples": sampler.idle_samples,
+        "sample_interval_ms": SAMPLE_INTERVAL * 1000,
+        "spans": _summarize_spans(spans),
+        "memory": _memory,
+        "top_allocations": [
+            {"where": str(stat.traceback[0]), "size_kb": stat.size // 1024, "count": stat.count}
+            for stat in top_allocations
+        ],
+    }
+    with open(f"{base}.json", "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    _write_folded(f"{base}.cpu.folded", samples)
+    _write_folded(f"{base}.wall.folded", wall_stacks)
+    logger.info(f"Profile written: {base}.json", extra={"wall_s": report["wall_s"]})
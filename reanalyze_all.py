@@ -5,11 +5,9 @@ def reset_to_new():
     print("全商品のステータスを 'new' にリセットして、AIに再分析させます...")
     
     try:
-        db.supabase.table("products")\
-            .update({"status": "new", "ai_analysis": None})\
-            .neq("id", "00000000-0000-0000-0000-000000000000")\
-            .execute()
-        print("リセット完了！ 'ai_analyzer.py' を実行してください。")
+        ids = (row['id'] for row in db.iter_rows("products", "id"))
+        count = db.requeue_for_analysis(ids)
+        print(f"リセット完了！ ({count}件) 'ai_analyzer.py' を実行してください。")
     except Exception as e:
         print(f"エラー: {e}")
 
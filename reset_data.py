@@ -2,7 +2,7 @@ from database_manager import DatabaseManager
 import sys
 
 def reset_all_data():
-    print("⚠️ 警告: すべての商品データと検索設定を削除します。よろしいですか？")
+    print("⚠️ 警告: すべての商品データ・検索設定・トレンドの取得状態を削除します。よろしいですか？")
     confirm = input("削除する場合は 'yes' と入力してください: ")
     
     if confirm != "yes":
@@ -14,15 +14,23 @@ def reset_all_data():
     try:
         # 商品データの削除 (products)
         print("商品データを削除中...")
-        # deleteにはwhere句が必須なので、idがnullでない(全件)を指定するハック
-        db.supabase.table("products").delete().neq("id", "00000000-0000-0000-0000-000000000000").execute()
+        # IDをページ単位で読みながら分割して削除する（1回の巨大な削除でタイムアウトしないように）
+        count = db.delete_by_ids("products", (row['id'] for row in db.iter_rows("products", "id")))
+        print(f"  {count}件削除しました。")
         
         # 検索設定の削除 (search_configs)
         print("検索設定を削除中...")
-        db.supabase.table("search_configs").delete().neq("id", "00000000-0000-0000-0000-000000000000").execute()
+        count = db.delete_by_ids("search_configs", (row['id'] for row in db.iter_rows("search_configs", "id")))
+        print(f"  {count}件削除しました。")
+        
+        # トレンドの取得状態 (seen_headlines, trend_feeds)
+        # 残っていると既読の見出しやETagのせいで、次のトレンド取得でキーワードが1件も入らない
+        print("トレンドの取得状態を削除中...")
+        count = db.delete_all("seen_headlines", "hash") + db.delete_all("trend_feeds", "url")
+        print(f"  {count}件削除しました。")
         
         print("✨ データのリセットが完了しました！")
-        print("次は 'trend_watcher.py' を実行して、トレンドキーワードを取り込んでください。")
+        print("次は 'python scouter.py trends' を実行して、トレンドキーワードを取り込んでください。")
 
     except Exception as e:
         print(f"エラーが発生しました: {e}")
@@ -6,16 +6,13 @@ def reset_analysis_status():
     print("分析済みデータのステータスを 'new' にリセットします...")
     
     # statusが 'profitable' または 'discarded' のものを対象にする
-    # SupabaseのPythonクライアントでOR条件が複雑なため、単純に全件更新を試みるか、分けて実行
+    # 対象のIDをページ単位で読みながら、分割して更新する
     
     try:
-        # profitable -> new
-        res1 = db.supabase.table("products").update({"status": "new", "ai_analysis": None}).eq("status", "profitable").execute()
-        print(f"Reset {len(res1.data)} profitable items.")
-        
-        # discarded -> new (必要であれば)
-        res2 = db.supabase.table("products").update({"status": "new", "ai_analysis": None}).eq("status", "discarded").execute()
-        print(f"Reset {len(res2.data)} discarded items.")
+        for status in ("profitable", "discarded"):
+            ids = (row['id'] for row in db.iter_rows("products", "id", filters=lambda q, s=status: q.eq("status", s)))
+            count = db.requeue_for_analysis(ids)
+            print(f"Reset {count} {status} items.")
         
         print("リセット完了。スクレイピング済みとして再度分析待ちになりました。")
         
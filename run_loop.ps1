@@ -13,11 +13,11 @@ while ($true) {
 
     # 1. スクレイピング実行
     Write-Host "1. 商品を収集しています..." -ForegroundColor Yellow
-    & $pythonPath main_scouter.py
+    & $pythonPath scouter.py scrape
     
     # 2. AI分析実行
     Write-Host "2. AI分析を実行しています..." -ForegroundColor Yellow
-    & $pythonPath ai_analyzer.py
+    & $pythonPath scouter.py analyze
 
     Write-Host "完了。次のサイクルまで待機中... ($intervalSeconds 秒)" -ForegroundColor Gray
     
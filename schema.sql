@@ -7,17 +7,64 @@ create table products (
   price bigint not null,
   image_url text,
   product_url text,
+  keyword text, -- この商品を見つけた検索キーワード（相場統計の単位）
   scraped_at timestamp with time zone default now(),
+
+  -- パイプライン各段階の時刻（metrics.py でレイテンシを集計）
+  enqueued_at timestamp with time zone default now(), -- 分析キューに入った時刻（スクレイパーが保存直前に付ける）
+  analysis_started_at timestamp with time zone,
+  analyzed_at timestamp with time zone,
+  notified_at timestamp with time zone,
   
   -- AI分析結果
   ai_analysis jsonb, -- { "condition": "A", "estimated_price": 50000, "profit": 5000 }
   
   -- ステータス管理
-  status text default 'new', -- 'new'(新規), 'analyzed'(分析済), 'profitable'(利益あり), 'discarded'(対象外)
+  status text default 'new', -- 'new'(新規), 'analyzed'(分析済), 'profitable'(利益あり), 'discarded'(対象外), 'quarantined'(分析失敗の隔離)
+  analysis_attempts integer default 0, -- AI分析の失敗回数
+  last_analysis_error text, -- 直近の分析失敗理由
+  priority double precision, -- 分析キューの優先度（priority.py で計算、大きいほど先）
+  updated_at timestamp with time zone default now(), -- 最終更新時刻（トリガーで更新、export_snapshot.py の差分出力用）
+
+  -- 価格の追跡（price_tracker.py）
+  listing_status text default 'open', -- 'open'(出品中), 'sold'(売り切れ), 'gone'(削除済み)
+  last_checked_at timestamp with time zone,
+  next_check_at timestamp with time zone, -- 次に価格を再確認する時刻（ランクが高いほど早い）
   
   unique(platform, item_id)
 );
 
+-- 相場統計の差分読み込み（キーセットページング）用
+create index products_scraped_at_id_idx on products (scraped_at, id);
+-- 分析キュー（status='new' を優先度順に取り出す）用
+create index products_queue_idx on products (priority desc nulls last, scraped_at desc) where status = 'new';
+-- 分析キューの新着側の候補用（新しさは保存せず、分析時に加える）
+create index products_queue_recent_idx on products (enqueued_at desc) where status = 'new';
+-- スナップショットの差分出力（updated_at のキーセットページング）用
+create index products_updated_at_id_idx on products (updated_at, id);
+
+create or replace function set_updated_at() returns trigger as $$
+begin
+  new.updated_at = now();
+  return new;
+end;
+$$ language plpgsql;
+
+create trigger products_set_updated_at before update on products
+  for each row execute function set_updated_at();
+-- 価格の再確認（出品中で時刻を過ぎたもの）用
+create index products_next_check_idx on products (platform, next_check_at) where listing_status = 'open';
+
+-- 価格変化の履歴（追記のみ・差分だけを持つ）
+-- 任意の時点の価格は products.price から、それ以降の差分を引いて求める
+create table price_history (
+  id bigint generated always as identity primary key,
+  product_id uuid not null references products(id) on delete cascade,
+  observed_at timestamp with time zone default now(),
+  price_delta integer not null -- 新価格 - 旧価格（円）
+);
+create index price_history_product_idx on price_history (product_id, observed_at);
+
 -- 検索設定（監視リスト）を保存するテーブル
 create table search_configs (
   id uuid default gen_random_uuid() primary key,
@@ -26,9 +73,129 @@ create table search_configs (
   max_price bigint,
   target_profit bigint default 3000, -- 目標利益額
   is_active boolean default true,
+  trend_score double precision default 0, -- トレンドで検出された回数（熱量）
+  trend_seen_at timestamp with time zone, -- 最後にトレンドで検出された時刻
+  source text default 'manual', -- 'manual'(手動登録), 'trend'(trend_watcherが追加、期限切れで自動無効化)
   created_at timestamp with time zone default now()
 );
 
+-- 実行ごとのカウンタ（モデル呼び出し・DB往復・ページ読み込みなど）
+create table pipeline_runs (
+  id bigint generated always as identity primary key,
+  component text not null, -- 'scraper', 'analyzer', 'trend_watcher'
+  started_at timestamp with time zone,
+  finished_at timestamp with time zone default now(),
+  counters jsonb,
+  gauges jsonb -- {"browser_rss_mb": [[時刻, 値], ...]}
+);
+
+-- トレンド取得元RSSの条件付きGET用の状態
+create table trend_feeds (
+  url text primary key,
+  etag text,
+  last_modified text,
+  checked_at timestamp with time zone default now()
+);
+
+-- 処理済みのニュース見出し（新しい見出しが無ければGeminiを呼ばない）
+create table seen_headlines (
+  hash text primary key,
+  title text,
+  first_seen_at timestamp with time zone default now()
+);
+
+-- 分散スクレイピングのノード（ハートビートが途切れたノードの担当は他ノードが引き継ぐ）
+create table scrape_nodes (
+  node_id text primary key,
+  hostname text,
+  heartbeat_at timestamp with time zone default now()
+);
+
 -- 初期データのサンプル（テスト用）
 insert into search_configs (keyword, min_price, max_price, target_profit)
 values ('MacBook Air M1', 30000, 80000, 10000);
+
+-- 既存環境向けマイグレーション
+alter table products add column if not exists analysis_attempts integer default 0;
+alter table products add column if not exists last_analysis_error text;
+alter table products add column if not exists keyword text;
+create index if not exists products_scraped_at_id_idx on products (scraped_at, id);
+alter table products add column if not exists priority double precision;
+create index if not exists products_queue_idx on products (priority desc nulls last, scraped_at desc) where status = 'new';
+alter table search_configs add column if not exists trend_score double precision default 0;
+alter table search_configs add column if not exists trend_seen_at timestamp with time zone;
+-- 既存の未分析商品の優先度（新しさは分析時に enqueued_at から加える）
+update products set priority = 0 where priority is null and status = 'new';
+-- 既存の行は追加時点の時刻で埋まらないよう、既定値なしで追加して取得時刻で埋める
+alter table products add column if not exists enqueued_at timestamp with time zone;
+update products set enqueued_at = scraped_at where enqueued_at is null;
+alter table products alter column enqueued_at set default now();
+alter table products add column if not exists analysis_started_at timestamp with time zone;
+alter table products add column if not exists analyzed_at timestamp with time zone;
+alter table products add column if not exists notified_at timestamp with time zone;
+create index if not exists products_queue_recent_idx on products (enqueued_at desc) where status = 'new';
+create table if not exists pipeline_runs (
+  id bigint generated always as identity primary key,
+  component text not null,
+  started_at timestamp with time zone,
+  finished_at timestamp with time zone default now(),
+  counters jsonb
+);
+create table if not exists trend_feeds (
+  url text primary key,
+  etag text,
+  last_modified text,
+  checked_at timestamp with time zone default now()
+);
+create table if not exists seen_headlines (
+  hash text primary key,
+  title text,
+  first_seen_at timestamp with time zone default now()
+);
+alter table search_configs add column if not exists source text default 'manual';
+-- 既存の行は 'manual' のままにする。trend_score は手動登録のキーワードにも加算されるので、
+-- それでトレンド由来かは判定できない（期限切れで手動のキーワードが止まってしまう）
+create table if not exists scrape_nodes (
+  node_id text primary key,
+  hostname text,
+  heartbeat_at timestamp with time zone default now()
+);
+
+-- ゲージ（ブラウザのメモリ推移など）
+alter table pipeline_runs add column if not exists gauges jsonb;
+
+-- スナップショットの差分出力用の更新時刻
+drop trigger if exists products_set_updated_at on products;
+alter table products add column if not exists updated_at timestamp with time zone default now();
+-- 追加時点の時刻で埋まるので、分かっている最後の更新時刻に寄せる
+update products set updated_at = greatest(scraped_at, analyzed_at, notified_at);
+create index if not exists products_updated_at_id_idx on products (updated_at, id);
+create or replace function set_updated_at() returns trigger as $$
+begin
+  new.updated_at = now();
+  return new;
+end;
+$$ language plpgsql;
+create trigger products_set_updated_at before update on products
+  for each row execute function set_updated_at();
+
+-- 価格の追跡
+alter table products add column if not exists listing_status text default 'open';
+alter table products add column if not exists last_checked_at timestamp with time zone;
+alter table products add column if not exists next_check_at timestamp with time zone;
+create index if not exists products_next_check_idx on products (platform, next_check_at) where listing_status = 'open';
+-- 既存の商品は取得から6時間後を最初の再確認にする（古いものは追跡期間外として無視される）
+-- updated_at を書き換えてスナップショットを全件出し直させないよう、トリガーを止めて埋める
+alter table products disable trigger products_set_updated_at;
+update products set next_check_at = scraped_at + interval '6 hours' where next_check_at is null;
+alter table products enable trigger products_set_updated_at;
+create table if not exists price_history (
+  id bigint generated always as identity primary key,
+  product_id uuid not null references products(id) on delete cascade,
+  observed_at timestamp with time zone default now(),
+  price_delta integer not null
+);
+create index if not exists price_history_product_idx on price_history (product_id, observed_at);
+-- 古い行には ai_analysis がJSON文字列（jsonbの文字列値）で入っているものがあり、->> で項目を取れない。
+-- オブジェクトに直す（内容が変わるので updated_at は更新させ、スナップショットにも反映する）
+update products set ai_analysis = (ai_analysis #>> '{}')::jsonb where jsonb_typeof(ai_analysis) = 'string' and ai_analysis #>> '{}' like '{%';
@@ -0,0 +1,119 @@
+import argparse
+import sys
+
+# 統一CLI
+#
+#   python scouter.py scrape [--node-id ID] [--loop] [--profile]
+#   python scouter.py analyze [--profile]
+#   python scouter.py trends [--profile]
+#   python scouter.py reset {analysis,all,data}
+#   python scouter.py inspect {db,products,profitable,analysis,nodes,metrics}
+#
+# 重い依存（google.generativeai / supabase / playwright / pandas）はサブコマンドの
+# 中で必要なモジュールだけを import する。この1ファイルの読み込みは標準ライブラリのみ。
+# 起動時間の確認は bench_imports.py で行う。
+
+
+def _start(component, args):
+    import profiling
+    from log_config import setup_logging
+
+    if args.profile:
+        profiling.enable()
+    setup_logging(component)
+
+
+def cmd_scrape(args):
+    _start("scraper", args)
+    import main_scouter
+    from scrape_cluster import node_id_from_args
+
+    node_id = args.node_id or node_id_from_args([])
+    if args.loop:
+        main_scouter.run_forever(node_id)
+    else:
+        main_scouter.scrape_and_save(node_id)
+
+
+def cmd_analyze(args):
+    _start("analyzer", args)
+    import ai_analyzer
+    ai_analyzer.run_analysis_loop()
+
+
+def cmd_trends(args):
+    _start("trend_watcher", args)
+    import trend_watcher
+    trend_watcher.fetch_and_add_trends()
+
+
+def cmd_reset(args):
+    if args.target == "analysis":
+        from reset_data_status import reset_analysis_status
+        reset_analysis_status()
+    elif args.target == "all":
+        from reanalyze_all import reset_to_new
+        reset_to_new()
+    elif args.target == "data":
+        from reset_data import reset_all_data
+        reset_all_data()
+
+
+def cmd_inspect(args):
+    if args.target == "db":
+        from debug_db import debug_db_status
+        debug_db_status()
+    elif args.target == "products":
+        from debug_products import check_products
+        check_products()
+    elif args.target == "profitable":
+        from check_latest_profitable import check_profitable
+        check_profitable()
+    elif args.target == "analysis":
+        from inspect_analysis import inspect_analysis_data
+        inspect_analysis_data()
+    elif args.target == "nodes":
+        from scrape_cluster import print_assignment
+        print_assignment()
+    elif args.target == "metrics":
+        from metrics import print_report
+        print_report(args.hours)
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="scouter", description="メルカリ・トレンドスカウター")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("scrape", help="検索設定ごとに新着商品を取得する")
+    p.add_argument("--node-id", help="分散モードのノードID（省略時は SCOUTER_NODE_ID）")
+    p.add_argument("--loop", action="store_true", help="ブラウザを開いたまま一定間隔で繰り返す")
+    p.add_argument("--profile", action="store_true", help="プロファイルを profiles/ に出力する")
+    p.set_defaults(func=cmd_scrape)
+
+    p = sub.add_parser("analyze", help="分析待ちの商品をAIで分析する")
+    p.add_argument("--profile", action="store_true", help="プロファイルを profiles/ に出力する")
+    p.set_defaults(func=cmd_analyze)
+
+    p = sub.add_parser("trends", help="ニュースからトレンドキーワードを取り込む")
+    p.add_argument("--profile", action="store_true", help="プロファイルを profiles/ に出力する")
+    p.set_defaults(func=cmd_trends)
+
+    p = sub.add_parser("reset", help="分析状態やデータをリセットする")
+    p.add_argument("target", choices=["analysis", "all", "data"],
+                   help="analysis: 判定済みを再分析待ちに / all: 全商品を再分析待ちに / data: 全データ削除")
+    p.set_defaults(func=cmd_reset)
+
+    p = sub.add_parser("inspect", help="DBや計測の状態を表示する")
+    p.add_argument("target", choices=["db", "products", "profitable", "analysis", "nodes", "metrics"])
+    p.add_argument("--hours", type=int, default=24, help="metrics の集計期間（時間）")
+    p.set_defaults(func=cmd_inspect)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
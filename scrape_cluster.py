@@ -0,0 +1,169 @@
+import bisect
+import hashlib
+import logging
+import os
+import socket
+import sys
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+from database_manager import DatabaseManager
+
+# 複数ノードでのスクレイピング分担
+#
+# 各ノードは scrape_nodes テーブルにハートビートを書き、生きているノード一覧から
+# コンシステントハッシュのリングを作って search_configs を分担する。
+# ノードが止まるとハートビートが途切れ、NODE_TTL 秒後には他ノードのリングから外れて
+# そのキーワードは自動的に引き継がれる。--loop のプロセスは終了時に即座に離脱する。
+# サイクルの合間はハートビートの期限切れに任せ、行は消さない。1回ずつ起動する運用
+# （bot_runner など）では、NODE_TTL を起動間隔より長くしないと合間にリングから外れる。
+#
+# ローカルでの確認例（Supabase CLI の `supabase start` で立ち上げたローカルの
+# Postgres + PostgREST に SUPABASE_URL/KEY を向けて、schema.sql を流しておく）:
+#   SCOUTER_NODE_ID=node-a python main_scouter.py
+#   SCOUTER_NODE_ID=node-b python main_scouter.py
+#   python scrape_cluster.py      # 現在の割り当てを表示
+
+HEARTBEAT_INTERVAL = float(os.environ.get("SCOUTER_HEARTBEAT_INTERVAL", "15"))
+NODE_TTL = float(os.environ.get("SCOUTER_NODE_TTL", "60"))
+VIRTUAL_NODES = int(os.environ.get("SCOUTER_VIRTUAL_NODES", "64"))
+# ノードごとの検索ページ読み込み上限（/分）。0 なら無制限
+PAGES_PER_MINUTE = float(os.environ.get("SCOUTER_PAGES_PER_MINUTE", "0"))
+
+logger = logging.getLogger("scrape_cluster")
+
+
+def _hash(value):
+    return int.from_bytes(hashlib.md5(value.encode("utf-8")).digest()[:8], "big")
+
+
+def shard_key(config, platform):
+    # 同じキーワードでもプラットフォームが違えば別のノードに割り振れるようにする
+    return f"{platform}:{config['id']}"
+
+
+class HashRing:
+    """仮想ノード付きのコンシステントハッシュリング"""
+
+    def __init__(self, nodes, vnodes=VIRTUAL_NODES):
+        self.nodes = sorted(nodes)
+        self._ring = sorted((_hash(f"{node}#{i}"), node) for node in self.nodes for i in range(vnodes))
+        self._keys = [h for h, _ in self._ring]
+
+    def node_for(self, key):
+        if not self._ring:
+            return None
+        i = bisect.bisect(self._keys, _hash(str(key))) % len(self._ring)
+        return self._ring[i][1]
+
+
+class RateLimiter:
+    """トークンバケットによるノード単位の速度制限"""
+
+    def __init__(self, per_minute=PAGES_PER_MINUTE, burst=1):
+        self.interval = 60.0 / per_minute if per_minute > 0 else 0.0
+        self.capacity = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    def acquire(self):
+        if not self.interval:
+            return
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) / self.interval)
+        self.updated = now
+        if self.tokens < 1:
+            time.sleep((1 - self.tokens) * self.interval)
+            self.tokens = 1
+            self.updated = time.monotonic()
+        self.tokens -= 1
+
+
+class NodeCoordinator(threading.Thread):
+    """ハートビートを送りつつ、生存ノードのリングを定期的に作り直すスレッド"""
+
+    def __init__(self, node_id, db=None):
+        super().__init__(daemon=True)
+        self.node_id = node_id
+        # スクレイピング側と接続を分けるため、専用のクライアントを持つ
+        self.db = db or DatabaseManager()
+        self.ring = HashRing([node_id])
+        self._stopping = threading.Event()
+
+    def heartbeat(self):
+        now = datetime.now(timezone.utc)
+        self.db.supabase.table("scrape_nodes").upsert({
+            "node_id": self.node_id,
+            "hostname": socket.gethostname(),
+            "heartbeat_at": now.isoformat()
+        }, on_conflict="node_id").execute()
+
+        cutoff = (now - timedelta(seconds=NODE_TTL)).isoformat()
+        response = self.db.supabase.table("scrape_nodes")\
+            .select("node_id")\
+            .gt("heartbeat_at", cutoff)\
+            .execute()
+        nodes = {row['node_id'] for row in response.data} | {self.node_id}
+        if set(self.ring.nodes) != nodes:
+            logger.info(f"ノード構成が変わりました: {sorted(nodes)}", extra={"nodes": sorted(nodes)})
+            self.ring = HashRing(nodes)
+
+    def run(self):
+        while not self._stopping.wait(HEARTBEAT_INTERVAL):
+            try:
+                self.heartbeat()
+            except Exception as e:
+                logger.warning(f"ハートビート失敗: {e}")
+
+    def start(self):
+        # 起動直後に参加して、最初のキーワードから正しく分担する
+        self.heartbeat()
+        super().start()
+
+    def owns(self, config, platform="mercari"):
+        """この検索設定（または価格を再確認する商品）× プラットフォームが自ノードの担当か"""
+        return self.ring.node_for(shard_key(config, platform)) == self.node_id
+
+    def stop(self, leave=False):
+        """ハートビートを止める。leave=True ならノードの行も消して即座に離脱する
+
+        行を残した場合は NODE_TTL 秒後に他ノードのリングから外れる。
+        """
+        self._stopping.set()
+        if self.is_alive():
+            self.join(timeout=5)
+        if leave:
+            self.leave()
+
+    def leave(self):
+        """ノードの行を消す（他ノードが次の確認で引き継ぐ）"""
+        try:
+            self.db.supabase.table("scrape_nodes").delete().eq("node_id", self.node_id).execute()
+        except Exception as e:
+            logger.warning(f"ノード離脱の記録に失敗: {e}")
+
+
+def node_id_from_args(argv=None):
+    """--node-id <id> または SCOUTER_NODE_ID（未指定なら単独モード）"""
+    argv = sys.argv if argv is None else argv
+    if "--node-id" in argv:
+        return argv[argv.index("--node-id") + 1]
+    return os.environ.get("SCOUTER_NODE_ID")
+
+
+def print_assignment():
+    """生存ノードとキーワードの現在の割り当てを表示する"""
+    db = DatabaseManager()
+    cutoff = (datetime.now(timezone.utc) - timedelta(seconds=NODE_TTL)).isoformat()
+    nodes = [row['node_id'] for row in db.supabase.table("scrape_nodes").select("node_id").gt("heartbeat_at", cutoff).execute().data]
+    print(f"生存ノード: {nodes}")
+    ring = HashRing(nodes)
+    from platforms import ENABLED_PLATFORMS
+    for config in db.get_active_search_configs():
+        for platform in ENABLED_PLATFORMS:
+            print(f"{ring.node_for(shard_key(config, platform))}\t{platform}\t{config['keyword']}")
+
+
+if __name__ == "__main__":
+    print_assignment()
@@ -0,0 +1,347 @@
+import logging
+import os
+import queue
+import random
+import threading
+import time
+from datetime import datetime, timezone
+
+import metrics
+import price_tracker
+import profiling
+from browser_policy import EXTRA_PATTERNS, PROFILE_DIR, ResourcePolicy
+from browser_session import BrowserSession
+from priority import base_priority
+from scrape_cluster import PAGES_PER_MINUTE, RateLimiter
+
+# 複数マーケットプレイスの並行スクレイピング
+#
+#   Scheduler ──(platform, 検索設定 / 価格の再確認)──> PlatformWorker（プラットフォームごとに1スレッド・1ブラウザ）
+#                                                          │ 抽出した商品・観測した価格
+#                                                          v
+#                                     ProductSink（1スレッド）: 既存チェック1回 + 一括保存1回 + 価格変化の記録
+#
+# Playwright の sync API はスレッドをまたいで使えないため、各ワーカーが自分の
+# sync_playwright とブラウザを持つ。ワーカーはサイクルをまたいで生き続けるので、
+# --loop ではブラウザ（とキャッシュ）がそのまま使い回される。
+# マナー（読み込み間隔・待機時間）はプラットフォーム単位で守られ、
+# プラットフォームを増やすと直列の待ち時間ではなくスループットが増える。
+
+logger = logging.getLogger("scrape_engine")
+
+# 1キーワードでブラウザが落ちたときに起動し直して再試行する回数
+MAX_BROWSER_RESTARTS = int(os.environ.get("BROWSER_MAX_RESTARTS", "2"))
+# ブラウザの起動に失敗したときの待ち時間（秒）。失敗が続くと倍々に延ばす
+LAUNCH_BACKOFF_SECONDS = float(os.environ.get("BROWSER_LAUNCH_BACKOFF_SECONDS", "5"))
+
+
+SEARCH = "search"
+RECHECK = "recheck"
+
+
+class Scheduler:
+    """サイクルごとの仕事をプラットフォーム別のキューで配る
+
+    仕事は (SEARCH, 検索設定) か (RECHECK, 価格を再確認する商品)。検索を先に積むので、
+    再確認は各プラットフォームの検索が終わってから行われる。
+    """
+
+    def __init__(self, platform_names):
+        self.queues = {name: queue.Queue() for name in platform_names}
+        self.coordinator = None
+
+    def submit(self, configs, coordinator=None):
+        self.coordinator = coordinator
+        for q in self.queues.values():
+            for config in configs:
+                q.put((SEARCH, config))
+
+    def submit_rechecks(self, platform, products):
+        for product in products:
+            self.queues[platform].put((RECHECK, product))
+
+    def next(self, platform):
+        """次の担当分の仕事を返す（停止時は None）。担当は取り出した時点のリングで判定する"""
+        q = self.queues[platform]
+        while True:
+            job = q.get()
+            if job is None:
+                q.task_done()
+                return None
+            coordinator = self.coordinator
+            if coordinator and not coordinator.owns(job[1], platform):
+                q.task_done()
+                continue
+            return job
+
+    def done(self, platform):
+        self.queues[platform].task_done()
+
+    def wait(self):
+        for q in self.queues.values():
+            q.join()
+
+    def close(self):
+        for q in self.queues.values():
+            q.put(None)
+
+
+class ProductSink(threading.Thread):
+    """抽出した商品を受け取り、既存チェックと保存をまとめて行うスレッド"""
+
+    def __init__(self, db):
+        super().__init__(daemon=True, name="product-sink")
+        self.db = db
+        self.analytics = None
+        self.configs = {}       # keyword -> 検索設定（再分析時の優先度計算用）
+        self.queue = queue.Queue()
+
+    def put(self, adapter, config, products, scraped_at):
+        self.queue.put((self.save, (adapter, config, products, scraped_at)))
+
+    def put_check(self, product, price, listing_status):
+        self.queue.put((self.record_check, (product, price, listing_status)))
+
+    def put_failed_check(self, product):
+        self.queue.put((self.record_failed_check, (product,)))
+
+    def run(self):
+        while True:
+            job = self.queue.get()
+            try:
+                if job is None:
+                    return
+                func, args = job
+                func(*args)
+            except Exception as e:
+                logger.error(f"Error saving batch: {e}")
+            finally:
+                self.queue.task_done()
+
+    def save(self, adapter, config, products, scraped_at):
+        keyword = config['keyword']
+        with profiling.span("sink.exists"):
+            known = self.db.get_known_items(adapter.name, [p['item_id'] for p in products], price_tracker.TRACK_COLUMNS)
+        fresh = [p for p in products if p['item_id'] not in known]
+        if len(known):
+            logger.debug(f"Skipping {len(known)} known items", extra={"keyword": keyword, "platform": adapter.name})
+
+        # 既知の商品が検索結果に違う価格で出ていれば、ページを開かずに価格変化として記録する
+        changed = [
+            {"product": known[p['item_id']], "price": p['price'], "listing_status": "open"}
+            for p in products if p['item_id'] in known and known[p['item_id']]['price'] != p['price']
+        ]
+        if changed:
+            price_tracker.apply_observations(self.db, changed, self.analytics, self.configs)
+        if not fresh:
+            return
+
+        # 相場に対する割安度から分析優先度を決める
+        scores = self.analytics.score([{"id": p['item_id'], "keyword": keyword, "price": p['price']} for p in fresh])
+        rows = []
+        for product, score in zip(fresh, scores.itertuples(index=False)):
+            if score.is_anomaly:
+                logger.info(f"Price anomaly: {product['title']} (¥{product['price']}, score={score.discount_score:.2f})",
+                            extra={"item_id": product['item_id'], "keyword": keyword, "platform": adapter.name})
+            rows.append({
+                "platform": adapter.name,
+                "keyword": keyword,
+                **product,
+                "scraped_at": scraped_at.isoformat(),
+                "priority": base_priority(config, float(score.discount_score), scraped_at),
+                "next_check_at": price_tracker.next_check_at({"status": "new"}, scraped_at),
+                "status": "new"  # 未分析状態
+            })
+
+        # 段階時刻はどちらもこのプロセスの時計で付ける（scrape_to_enqueue に時計のずれを混ぜない）
+        enqueued_at = datetime.now(timezone.utc).isoformat()
+        for row in rows:
+            row["enqueued_at"] = enqueued_at
+        with profiling.span("sink.save"):
+            saved = self.db.save_products(rows)
+        metrics.incr("products_saved", len(saved))
+
+    def record_check(self, product, price, listing_status):
+        price_tracker.apply_observations(
+            self.db, [{"product": product, "price": price, "listing_status": listing_status}],
+            self.analytics, self.configs
+        )
+
+    def record_failed_check(self, product):
+        price_tracker.defer_checks(self.db, [product])
+
+    def wait(self):
+        self.queue.join()
+
+    def close(self):
+        self.queue.put(None)
+        self.join(timeout=30)
+
+
+class PlatformWorker(threading.Thread):
+    """1プラットフォーム分のブラウザを持ち、スケジューラから検索設定を受け取って巡回するスレッド"""
+
+    def __init__(self, adapter, scheduler, sink, profile_dir):
+        super().__init__(daemon=True, name=f"scrape-{adapter.name}")
+        self.adapter = adapter
+        self.scheduler = scheduler
+        self.sink = sink
+        self.profile_dir = profile_dir
+        # プラットフォームのマナー設定がなければノード共通の上限を使う
+        self.rate_limiter = RateLimiter(adapter.pages_per_minute or PAGES_PER_MINUTE)
+        self.policy = ResourcePolicy(extra=EXTRA_PATTERNS + adapter.block_patterns)
+        self.error = None
+
+    def run(self):
+        from playwright.sync_api import sync_playwright
+
+        try:
+            with sync_playwright() as p:
+                session = BrowserSession(p, self.profile_dir, self.policy)
+                try:
+                    while True:
+                        job = self.scheduler.next(self.adapter.name)
+                        if job is None:
+                            return
+                        kind, target = job
+                        try:
+                            if kind == RECHECK:
+                                self._recheck(session, target)
+                            else:
+                                self._scrape(session, target)
+                        finally:
+                            self.scheduler.done(self.adapter.name)
+                finally:
+                    session.close()
+        except Exception as e:
+            # ブラウザを起動できないなどの致命的なエラー。残りの担当分は捨てて待ちを解く
+            self.error = e
+            logger.exception(f"{self.adapter.name} worker stopped: {e}")
+            self._drain()
+
+    def _drain(self):
+        q = self.scheduler.queues[self.adapter.name]
+        while True:
+            try:
+                q.get_nowait()
+            except queue.Empty:
+                return
+            q.task_done()
+
+    def _scrape(self, session, config):
+        keyword = config['keyword']
+        extra = {"keyword": keyword, "platform": self.adapter.name}
+        logger.info(f"--- Searching {self.adapter.name} for: {keyword} ---", extra=extra)
+
+        # ブラウザが途中で落ちたら起動し直して同じキーワードをやり直す。
+        # 起動・再起動の失敗も1回の失敗として数え、ワーカーは止めない
+        loaded = False
+        for attempt in range(MAX_BROWSER_RESTARTS + 1):
+            page = self._open_page(session, attempt)
+            if page is None:
+                continue
+            loaded = True
+            try:
+                products = self._search(page, keyword)
+                self.sink.put(self.adapter, config, products, datetime.now(timezone.utc))
+            except Exception as e:
+                logger.error(f"Error scraping {keyword}: {e}", extra=extra)
+            if session.healthy():
+                break
+            logger.warning(f"Browser crashed while scraping {keyword} (attempt {attempt + 1})", extra=extra)
+
+        if loaded:
+            session.page_done()
+        profiling.memory_snapshot(f"{self.adapter.name}:{keyword}")
+
+    def _open_page(self, session, attempt=0):
+        """ページを返す。ブラウザを起動できなければ間を空けて None を返す"""
+        try:
+            return session.page()
+        except Exception as e:
+            metrics.incr("browser_launch_failures")
+            delay = LAUNCH_BACKOFF_SECONDS * 2 ** attempt
+            logger.warning(f"{self.adapter.name}: ブラウザの起動に失敗しました ({e})。{delay:.0f}秒後に再試行します",
+                           extra={"platform": self.adapter.name, "attempt": attempt + 1})
+            time.sleep(delay)
+            return None
+
+    def _recheck(self, session, product):
+        """商品ページを開いて価格と出品状態を確認する"""
+        extra = {"item_id": product['item_id'], "platform": self.adapter.name}
+        # 起動できなければこの商品は次回の対象に残る
+        page = self._open_page(session)
+        if page is None:
+            return
+        try:
+            self.rate_limiter.acquire()
+            response = page.goto(product['product_url'], wait_until="domcontentloaded")
+            metrics.incr("item_page_loads")
+            if response is not None and response.status in (404, 410):
+                self.sink.put_check(product, None, "gone")
+            else:
+                page.wait_for_timeout(random.randint(*self.adapter.item_settle_ms))
+                price, listing_status = self.adapter.check_item(page)
+                self.sink.put_check(product, price, listing_status)
+        except Exception as e:
+            # 確認できなかった商品は通常の間隔だけ先送りする（毎サイクル同じ商品で枠を使わない）
+            logger.warning(f"Error re-checking {product['item_id']}: {e}", extra=extra)
+            self.sink.put_failed_check(product)
+        session.page_done()
+
+    def _search(self, page, keyword):
+        self.rate_limiter.acquire()
+        page.goto(self.adapter.search_url(keyword), wait_until="domcontentloaded")
+        metrics.incr("page_loads")
+        page.wait_for_timeout(random.randint(*self.adapter.settle_ms))  # ランダム待機
+        products = self.adapter.items(page)
+        logger.info(f"Found {len(products)} items.",
+                    extra={"keyword": keyword, "platform": self.adapter.name, "count": len(products)})
+        return products
+
+
+class ScrapeEngine:
+    """全プラットフォームのワーカーと保存スレッドをまとめて動かす"""
+
+    def __init__(self, db, adapters, profile_dir=PROFILE_DIR):
+        self.scheduler = Scheduler([adapter.name for adapter in adapters])
+        self.sink = ProductSink(db)
+        # 永続プロファイルは同時に1プロセスしか開けないので、プラットフォームごとに分ける
+        self.workers = [PlatformWorker(adapter, self.scheduler, self.sink, f"{profile_dir}-{adapter.name}")
+                        for adapter in adapters]
+
+    def start(self):
+        self.sink.start()
+        for worker in self.workers:
+            worker.start()
+
+    def run_cycle(self, configs, analytics, coordinator=None):
+        """1サイクル分の検索と価格の再確認を全プラットフォームで行い、保存まで終わるのを待つ"""
+        failed = [worker.adapter.name for worker in self.workers if worker.error or not worker.is_alive()]
+        if failed:
+            raise RuntimeError(f"scrape worker(s) not running: {', '.join(failed)}")
+        self.sink.analytics = analytics
+        self.sink.configs = {config['keyword']: config for config in configs}
+        self.scheduler.submit(configs, coordinator)
+
+        # 価格の再確認。分散モードでは各ノードが担当分だけ処理するので、ノード数分まとめて取る
+        nodes = len(coordinator.ring.nodes) if coordinator else 1
+        for worker in self.workers:
+            try:
+                due = price_tracker.due_products(self.sink.db, worker.adapter.name, price_tracker.CHECKS_PER_CYCLE * nodes)
+            except Exception as e:
+                logger.warning(f"価格の再確認対象の取得に失敗: {e}", extra={"platform": worker.adapter.name})
+                continue
+            self.scheduler.submit_rechecks(worker.adapter.name, due)
+
+        self.scheduler.wait()
+        self.sink.wait()
+        failed = [worker for worker in self.workers if worker.error]
+        if failed:
+            raise RuntimeError(f"scrape worker(s) stopped: {', '.join(w.adapter.name for w in failed)}")
+
+    def close(self):
+        self.scheduler.close()
+        for worker in self.workers:
+            worker.join(timeout=30)
+        self.sink.close()
@@ -0,0 +1,89 @@
+import os
+import sys
+
+import duckdb
+
+from export_snapshot import PRODUCTS_DIR
+
+# スナップショット（export_snapshot.py の出力）に対する DuckDB のクエリCLI
+#
+#   python snapshot_query.py "select status, count(*) from products group by 1"
+#   python snapshot_query.py --preset ranks      # 定型クエリ
+#   python snapshot_query.py                     # 対話モード（空行で終了）
+#
+# products ビューは id ごとに最新版の行だけを返す。本番DBには一切接続しない。
+
+PRESETS = {
+    "daily": """
+        select dt, count(*) as items, count(analyzed_at) as analyzed,
+               count(*) filter (where status = 'profitable') as profitable
+        from products group by dt order by dt desc limit 30
+    """,
+    "ranks": """
+        select keyword, ai_investment_value as rank, count(*) as items, median(price) as median_price
+        from products where ai_investment_value is not null
+        group by all order by keyword, rank
+    """,
+    "genres": """
+        select ai_genre as genre, count(*) as items,
+               count(*) filter (where ai_investment_value in ('S', 'A')) as top_ranked
+        from products where ai_genre is not null
+        group by all order by items desc limit 30
+    """,
+    "latency": """
+        select keyword,
+               quantile_cont(epoch(analyzed_at - scraped_at), 0.5) as p50_s,
+               quantile_cont(epoch(analyzed_at - scraped_at), 0.95) as p95_s,
+               count(*) as items
+        from products where analyzed_at is not null
+        group by keyword order by p95_s desc
+    """,
+}
+
+
+def connect(products_dir=PRODUCTS_DIR):
+    con = duckdb.connect()
+    # ビューの定義にはパラメータを使えないので、パス中の引用符をエスケープして埋め込む
+    pattern = os.path.join(products_dir, "*", "*.parquet").replace("'", "''")
+    con.execute(f"""
+        create view products_all as
+        select * from read_parquet('{pattern}', hive_partitioning = true, union_by_name = true)
+    """)
+    con.execute("""
+        create view products as
+        select * from products_all
+        qualify row_number() over (partition by id order by updated_at desc) = 1
+    """)
+    return con
+
+
+def run(con, sql):
+    try:
+        print(con.sql(sql).df().to_string(index=False))
+    except duckdb.Error as e:
+        print(f"エラー: {e}")
+
+
+if __name__ == "__main__":
+    if not os.path.isdir(PRODUCTS_DIR):
+        print(f"{PRODUCTS_DIR} がありません。先に python export_snapshot.py を実行してください。")
+        sys.exit(1)
+
+    con = connect()
+    if "--preset" in sys.argv:
+        name = sys.argv[sys.argv.index("--preset") + 1]
+        if name not in PRESETS:
+            print(f"定型クエリ: {', '.join(PRESETS)}")
+            sys.exit(1)
+        run(con, PRESETS[name])
+    elif len(sys.argv) > 1:
+        run(con, " ".join(sys.argv[1:]))
+    else:
+        while True:
+            try:
+                sql = input("snapshot> ").strip()
+            except EOFError:
+                break
+            if not sql:
+                break
+            run(con, sql)
@@ -0,0 +1,51 @@
+import json
+
+import pytest
+
+from analysis_schema import AnalysisValidationError, parse_analysis
+
+VALID = {
+    "trend_reason": "発売直後で品薄",
+    "heat_level": "High",
+    "future_prediction": "しばらく高値が続く",
+    "investment_value": "A",
+    "genre": "ゲーム",
+}
+
+
+def test_valid_json_passes_through():
+    assert parse_analysis(json.dumps(VALID, ensure_ascii=False)) == VALID
+
+
+def test_fenced_response_with_trailing_text():
+    text = "```json\n" + json.dumps(VALID, ensure_ascii=False) + "\n```\n以上です。"
+    assert parse_analysis(text) == VALID
+
+
+def test_wrapped_in_array_and_object():
+    assert parse_analysis(json.dumps([VALID], ensure_ascii=False)) == VALID
+    assert parse_analysis(json.dumps({"analysis": VALID}, ensure_ascii=False)) == VALID
+
+
+@pytest.mark.parametrize("heat, rank", [("high", "s"), ("HIGH", "Sランク"), ("High", "Ｓ"), ("high", "A (高い)")])
+def test_ranked_variants_are_normalized(heat, rank):
+    data = parse_analysis(json.dumps({**VALID, "heat_level": heat, "investment_value": rank}, ensure_ascii=False))
+    assert data["heat_level"] == "High"
+    assert data["investment_value"] == rank[0].upper().replace("Ｓ", "S")
+
+
+def test_non_string_text_field_is_stringified():
+    assert parse_analysis(json.dumps({**VALID, "genre": 123}))["genre"] == "123"
+
+
+@pytest.mark.parametrize("field", ["trend_reason", "genre", "investment_value"])
+def test_missing_field_fails(field):
+    data = {k: v for k, v in VALID.items() if k != field}
+    with pytest.raises(AnalysisValidationError, match=field):
+        parse_analysis(json.dumps(data, ensure_ascii=False))
+
+
+@pytest.mark.parametrize("text", ["", "   ", "分析できませんでした", '{"trend_reason": '])
+def test_unparseable_response_fails(text):
+    with pytest.raises(AnalysisValidationError):
+        parse_analysis(text)
@@ -0,0 +1,27 @@
+import pytest
+
+from keywords import KeywordIndex
+
+
+def _index(*keywords):
+    return KeywordIndex([{"id": str(i), "keyword": k} for i, k in enumerate(keywords)])
+
+
+@pytest.mark.parametrize("existing, keyword", [
+    ("iPhone17 Pro", "iPhone 17"),
+    ("ポケモンカード", "ぽけもん かーど"),
+    ("ＰＳ５", "ps5"),
+    ("ドラゴンクエスト", "ドラゴンクエスト！"),
+])
+def test_spelling_variants_match(existing, keyword):
+    assert _index(existing).match(keyword)["keyword"] == existing
+
+
+@pytest.mark.parametrize("existing, keyword", [
+    ("iPhone 16", "iPhone 17"),
+    ("Nintendo Switch", "Nintendo Switch 2"),
+    ("Nintendo Switch 2", "Nintendo Switch"),
+    ("MacBook Air M1", "MacBook Air M2"),
+])
+def test_different_models_do_not_match(existing, keyword):
+    assert _index(existing).match(keyword) is None
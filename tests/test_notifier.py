@@ -0,0 +1,112 @@
+import sqlite3
+import time
+
+import pytest
+
+import notifier
+from notifier import NotificationDispatcher, Outbox
+
+
+class FakeResponse:
+    def __init__(self, status_code, body=None, headers=None):
+        self.status_code = status_code
+        self.ok = status_code < 400
+        self._body = body or {}
+        self.headers = headers or {}
+        self.text = ""
+
+    def json(self):
+        return self._body
+
+
+class FakeSession:
+    def __init__(self, responses):
+        self.responses = list(responses)
+        self.payloads = []
+
+    def post(self, url, json, timeout):
+        self.payloads.append(json)
+        return self.responses.pop(0)
+
+
+@pytest.fixture
+def outbox(tmp_path):
+    return Outbox(str(tmp_path / "outbox.db"))
+
+
+def dispatcher(outbox, responses, delivered=None):
+    d = NotificationDispatcher("https://example.invalid/webhook", outbox,
+                               on_delivered=delivered.extend if delivered is not None else None)
+    d.session = FakeSession(responses)
+    return d
+
+
+def test_pending_notifications_are_deduplicated_per_product(outbox):
+    outbox.put("p1", {"title": "old"})
+    outbox.put("p2", {"title": "other"})
+    outbox.put("p1", {"title": "new"})
+    outbox.put(None, {"title": "no id"})
+    outbox.put(None, {"title": "no id"})
+
+    rows = outbox.take(10, time.time())
+    assert [(r[1], r[2]["title"]) for r in rows] == [("p1", "new"), ("p2", "other"), (None, "no id"), (None, "no id")]
+
+
+def test_existing_duplicates_are_collapsed_on_open(tmp_path):
+    path = str(tmp_path / "outbox.db")
+    conn = sqlite3.connect(path)
+    conn.execute("create table outbox (id integer primary key autoincrement, product_id text, embed text not null,"
+                 " attempts integer default 0, next_attempt_at real default 0)")
+    conn.executemany("insert into outbox (product_id, embed) values (?, ?)", [("p1", "{}"), ("p1", "{}"), ("p2", "{}")])
+    conn.commit()
+    conn.close()
+
+    assert len(Outbox(path)) == 2
+
+
+def test_server_error_is_retried_later_then_dropped(outbox, monkeypatch):
+    monkeypatch.setattr(notifier, "MAX_ATTEMPTS", 2)
+    outbox.put("p1", {"title": "x"})
+    d = dispatcher(outbox, [FakeResponse(500), FakeResponse(503)])
+
+    d._send(outbox.take(10, time.time()))
+    assert outbox.take(10, time.time()) == []
+    assert outbox.take(10, time.time() + 10)[0][3] == 1
+
+    d._send(outbox.take(10, time.time() + 10))
+    assert len(outbox) == 0
+
+
+def test_rate_limit_keeps_batch_and_blocks(outbox):
+    outbox.put("p1", {"title": "x"})
+    d = dispatcher(outbox, [FakeResponse(429, body={"retry_after": 3.0})])
+
+    d._send(outbox.take(10, time.time()))
+    assert len(outbox) == 1
+    assert outbox.take(10, time.time())[0][3] == 0
+    assert d._blocked_until > time.time() + 2
+
+
+def test_success_deletes_and_reports_delivered(outbox):
+    delivered = []
+    for i in range(3):
+        outbox.put(f"p{i}", {"title": str(i)})
+    outbox.put(None, {"title": "no id"})
+    d = dispatcher(outbox, [FakeResponse(204, headers={"X-RateLimit-Remaining": "0", "X-RateLimit-Reset-After": "1.5"})],
+                   delivered)
+
+    d._send(outbox.take(10, time.time()))
+    assert len(outbox) == 0
+    assert delivered == ["p0", "p1", "p2"]
+    assert len(d.session.payloads[0]["embeds"]) == 4
+    assert d._blocked_until > time.time() + 1
+
+
+def test_client_error_is_dropped_without_delivery(outbox):
+    delivered = []
+    outbox.put("p1", {"title": "x"})
+    d = dispatcher(outbox, [FakeResponse(400)], delivered)
+
+    d._send(outbox.take(10, time.time()))
+    assert len(outbox) == 0
+    assert delivered == []
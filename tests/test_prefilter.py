@@ -0,0 +1,76 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+import prefilter
+from prefilter import PreFilter, build_prefilter, rule_reason
+
+
+def labeled_rows(n=200):
+    rows = []
+    for i in range(n):
+        if i % 2:
+            rows.append({"id": f"p{i}", "title": f"PS5 本体 新品 未開封 {i}", "price": 60000, "status": "profitable"})
+        else:
+            rows.append({"id": f"d{i}", "title": f"中古 Tシャツ まとめ売り {i}", "price": 800, "status": "discarded"})
+    return rows
+
+
+class FakeDB:
+    def __init__(self, rows):
+        self.rows = rows
+        self.train_calls = 0
+
+    def count_labeled_products(self):
+        return len(self.rows)
+
+    def get_labeled_products(self, limit):
+        self.train_calls += 1
+        return self.rows[:limit]
+
+
+@pytest.mark.parametrize("product, expected", [
+    ({"title": "PS5 本体 ジャンク", "price": 10000}, "keyword 'ジャンク'"),
+    ({"title": "PS5 本体", "price": 100}, f"price below {prefilter.MIN_PRICE}"),
+    ({"title": "PS5 本体", "price": 0}, None),
+    ({"title": "PS5 本体", "price": None}, None),
+    ({"title": "ｽﾏﾎｹｰｽ 新品", "price": 1000}, "keyword 'スマホケース'"),
+])
+def test_rule_reason(product, expected):
+    assert rule_reason(product) == expected
+
+
+def test_rules_only_without_enough_labels(tmp_path):
+    pf = build_prefilter(FakeDB(labeled_rows(10)), path=str(tmp_path / "model.pkl"))
+    assert pf.classifier is None
+    assert pf.decide({"title": "中古 Tシャツ", "price": 800}) == (False, None, None)
+
+
+def test_classifier_discards_unpromising_items(tmp_path):
+    pf = build_prefilter(FakeDB(labeled_rows()), path=str(tmp_path / "model.pkl"))
+    keep, rejected = pf.split([
+        {"id": "a", "title": "PS5 本体 新品 未開封", "price": 60000},
+        {"id": "b", "title": "中古 Tシャツ まとめ売り", "price": 800},
+    ])
+    assert [p["id"] for p in keep] == ["a"]
+    assert [p["id"] for p, _, _ in rejected] == ["b"]
+    assert pf.report["recall"] == 1.0
+
+
+def test_cached_model_keeps_holdout_report(tmp_path):
+    path = str(tmp_path / "model.pkl")
+    db = FakeDB(labeled_rows())
+    now = datetime(2025, 1, 1, tzinfo=timezone.utc)
+    trained = build_prefilter(db, path=path, now=now)
+
+    cached = build_prefilter(db, path=path, now=now + timedelta(hours=1))
+    assert db.train_calls == 1
+    assert isinstance(cached, PreFilter)
+    assert cached.report == trained.report
+
+    build_prefilter(db, path=path, now=now + timedelta(hours=prefilter.RETRAIN_HOURS + 1))
+    assert db.train_calls == 2
+
+    db.rows = labeled_rows(200 + prefilter.RETRAIN_MIN_NEW_LABELS)
+    build_prefilter(db, path=path, now=now + timedelta(hours=prefilter.RETRAIN_HOURS + 2))
+    assert db.train_calls == 3
@@ -0,0 +1,65 @@
+from datetime import datetime, timedelta, timezone
+
+from price_analytics import PriceAnalytics
+
+
+class FakeDB:
+    """iter_product_pages と同じく (scraped_at, id) のキーセットで古い順に返す"""
+
+    def __init__(self, rows):
+        self.rows = rows
+
+    def iter_product_pages(self, columns, since=None, page_size=1000):
+        def key(row):
+            return (datetime.fromisoformat(row["scraped_at"]), row["id"])
+        start = (datetime.fromisoformat(since[0]), since[1])
+        rows = sorted((r for r in self.rows if key(r) > start), key=key)
+        for i in range(0, len(rows), page_size):
+            yield rows[i:i + page_size]
+
+
+NOW = datetime(2025, 1, 15, 12, tzinfo=timezone.utc)
+
+
+def row(i, keyword, price, minutes_ago):
+    return {"id": f"{i:08d}-0000-0000-0000-000000000000", "keyword": keyword, "price": price,
+            "scraped_at": (NOW - timedelta(minutes=minutes_ago)).isoformat()}
+
+
+def test_incremental_update_picks_up_late_commits_without_duplicates():
+    db = FakeDB([row(i, "PS5", 50000 + i * 100, 60 - i) for i in range(10)])
+    analytics = PriceAnalytics()
+    assert analytics.update(db, now=NOW) == 10
+
+    # カーソルより少し前の scraped_at で後からコミットされた行
+    db.rows.append(row(99, "PS5", 40000, 55))
+    assert analytics.update(db, now=NOW) == 1
+    assert len(analytics.frame) == 11
+    assert analytics.frame["id"].is_unique
+
+
+def test_rows_outside_window_are_dropped():
+    db = FakeDB([row(1, "PS5", 50000, 60 * 24 * 20), row(2, "PS5", 50000, 10)])
+    analytics = PriceAnalytics()
+    analytics.update(db, now=NOW)
+    assert list(analytics.frame["id"]) == [db.rows[1]["id"]]
+
+
+def test_score_flags_cheap_listing(tmp_path):
+    db = FakeDB([row(i, "PS5", 50000 + (i % 5) * 1000, i) for i in range(20)])
+    analytics = PriceAnalytics()
+    analytics.update(db, now=NOW)
+
+    path = str(tmp_path / "stats.pkl")
+    analytics.save(path)
+    loaded = PriceAnalytics.load(path)
+    scores = loaded.score([
+        {"id": "cheap", "keyword": "PS5", "price": 30000},
+        {"id": "normal", "keyword": "PS5", "price": 52000},
+        {"id": "unknown", "keyword": "Switch", "price": 100},
+    ]).set_index("id")
+
+    assert bool(scores.loc["cheap", "is_anomaly"])
+    assert scores.loc["cheap", "discount_score"] > 0
+    assert not bool(scores.loc["normal", "is_anomaly"])
+    assert scores.loc["unknown", "discount_score"] == 0.0
@@ -0,0 +1,85 @@
+from datetime import datetime, timedelta, timezone
+
+from price_tracker import apply_observations, due_products
+
+NOW = datetime(2025, 1, 1, 12, tzinfo=timezone.utc)
+
+
+class FakeDB:
+    def __init__(self, due=()):
+        self.due = list(due)
+        self.updates = {}
+        self.bulk_updates = []
+        self.history = []
+
+    def update_product(self, product_id, values):
+        self.updates[product_id] = values
+
+    def update_by_ids(self, table, values, ids):
+        self.bulk_updates.append((values, list(ids)))
+        return len(self.bulk_updates[-1][1])
+
+    def insert_price_history(self, rows):
+        self.history.extend(rows)
+
+    def get_due_price_checks(self, platform, now, tracked_since, limit, columns):
+        return self.due[:limit]
+
+
+def product(pid, price=10000, status="profitable", rank="A"):
+    return {"id": pid, "item_id": f"m{pid}", "platform": "mercari", "keyword": "PS5",
+            "price": price, "status": status, "rank": rank}
+
+
+def test_small_price_drop_records_history_without_requeue():
+    db = FakeDB()
+    apply_observations(db, [{"product": product("p1"), "price": 9500, "listing_status": "open"}], now=NOW)
+
+    assert db.history == [{"product_id": "p1", "observed_at": NOW.isoformat(), "price_delta": -500}]
+    values = db.updates["p1"]
+    assert values["price"] == 9500
+    assert values["next_check_at"] == (NOW + timedelta(hours=1)).isoformat()
+    assert "status" not in values
+
+
+def test_large_price_drop_requeues_and_clears_stage_times():
+    db = FakeDB()
+    apply_observations(db, [{"product": product("p1"), "price": 5000, "listing_status": "open"}], now=NOW)
+
+    values = db.updates["p1"]
+    assert values["status"] == "new"
+    assert values["enqueued_at"] == NOW.isoformat()
+    assert values["analysis_attempts"] == 0
+    assert values["analysis_started_at"] is None
+    assert values["analyzed_at"] is None
+    assert values["notified_at"] is None
+
+
+def test_pending_and_quarantined_products_are_not_requeued():
+    db = FakeDB()
+    apply_observations(db, [
+        {"product": product("p1", status="new", rank=None), "price": 5000},
+        {"product": product("p2", status="quarantined", rank=None), "price": 5000},
+    ], now=NOW)
+    assert "status" not in db.updates["p1"]
+    assert "status" not in db.updates["p2"]
+
+
+def test_unchanged_and_closed_listings_are_batched():
+    db = FakeDB()
+    apply_observations(db, [
+        {"product": product("p1"), "price": 10000, "listing_status": "open"},
+        {"product": product("p2"), "price": None, "listing_status": "open"},
+        {"product": product("p3"), "price": None, "listing_status": "sold"},
+    ], now=NOW)
+
+    assert db.updates == {} and db.history == []
+    by_ids = {tuple(ids): values for values, ids in db.bulk_updates}
+    assert by_ids[("p1", "p2")]["listing_status"] == "open"
+    assert by_ids[("p3",)]["next_check_at"] is None
+
+
+def test_due_products_spend_slots_on_high_ranks_first():
+    due = [product("c", rank="C"), product("new", status="new", rank=None), product("s", rank="S"), product("b", rank="B")]
+    ranked = due_products(FakeDB(due), "mercari", limit=3, now=NOW)
+    assert [p["id"] for p in ranked] == ["s", "b", "new"]
@@ -0,0 +1,41 @@
+from datetime import datetime, timedelta, timezone
+
+from priority import _parse_time, base_priority, compute_priority, rank_queue
+
+
+def test_parse_time_trimmed_fractions():
+    # PostgREST は末尾の0を削った小数秒を返す
+    expected = datetime(2025, 1, 1, 0, 0, 0, 123450, tzinfo=timezone.utc)
+    assert _parse_time("2025-01-01T00:00:00.12345+00:00") == expected
+    assert _parse_time("2025-01-01T00:00:00.1+00:00") == expected.replace(microsecond=100000)
+    assert _parse_time("2025-01-01T00:00:00+00:00") == expected.replace(microsecond=0)
+    assert _parse_time("2025-01-01T00:00:00.1234567Z") == expected.replace(microsecond=123456)
+
+
+def test_compute_priority_accepts_postgrest_timestamps():
+    config = {"trend_score": 3, "trend_seen_at": "2025-01-01T00:00:00.12345+00:00"}
+    now = datetime(2025, 1, 1, 12, tzinfo=timezone.utc)
+    assert compute_priority(config, 0.0, now - timedelta(hours=1), now) > compute_priority({}, 0.0, now - timedelta(hours=1), now)
+
+
+def test_discount_outranks_a_slightly_newer_item():
+    now = datetime(2025, 1, 1, 12, tzinfo=timezone.utc)
+    older_discounted = compute_priority({}, 2.0, now - timedelta(hours=3), now)
+    newer_full_price = compute_priority({}, 0.0, now, now)
+    assert older_discounted > newer_full_price
+
+
+def test_recency_breaks_ties_between_equal_items():
+    now = datetime(2025, 1, 1, 12, tzinfo=timezone.utc)
+    assert compute_priority({}, 0.5, now - timedelta(minutes=10), now) > compute_priority({}, 0.5, now - timedelta(hours=5), now)
+
+
+def test_rank_queue_adds_recency_to_stored_priority():
+    now = datetime(2025, 1, 1, 12, tzinfo=timezone.utc)
+    rows = [
+        {"id": "fresh", "priority": base_priority({}, 0.0), "enqueued_at": now.isoformat()},
+        {"id": "deal", "priority": base_priority({}, 2.0), "enqueued_at": (now - timedelta(hours=3)).isoformat()},
+        {"id": "stale", "priority": base_priority({}, 0.0), "enqueued_at": "2024-12-30T12:00:00.5+00:00"},
+    ]
+    ranked = rank_queue(rows + rows[:1], now)
+    assert [row["id"] for row in ranked] == ["deal", "fresh", "stale"]
@@ -0,0 +1,109 @@
+import browser_session
+import scrape_engine
+from scrape_engine import PlatformWorker, Scheduler
+
+
+class FakePage:
+    def on(self, *args):
+        pass
+
+    def is_closed(self):
+        return False
+
+    def goto(self, url, **kwargs):
+        return None
+
+    def wait_for_timeout(self, ms):
+        pass
+
+
+class FakeContext:
+    def on(self, *args):
+        pass
+
+    def close(self):
+        pass
+
+
+class FakeAdapter:
+    name = "fake"
+    pages_per_minute = 0
+    block_patterns = []
+    settle_ms = (0, 0)
+    item_settle_ms = (0, 0)
+
+    def search_url(self, keyword):
+        return f"http://example.invalid/search?keyword={keyword}"
+
+    def items(self, page):
+        return [{"item_id": "m1", "title": "t", "price": 1000, "image_url": "", "product_url": "u"}]
+
+    def check_item(self, page):
+        return 900, "open"
+
+
+class FakeSink:
+    def __init__(self):
+        self.saved = []
+        self.checks = []
+
+    def put(self, adapter, config, products, scraped_at):
+        self.saved.append((config["keyword"], products))
+
+    def put_check(self, product, price, listing_status):
+        self.checks.append((product["item_id"], price, listing_status))
+
+
+def _worker(monkeypatch, launch_failures):
+    calls = {"launch": 0}
+
+    def launch(playwright, profile_dir):
+        calls["launch"] += 1
+        if calls["launch"] <= launch_failures:
+            raise RuntimeError("Browser closed unexpectedly")
+        return FakeContext()
+
+    sleeps = []
+    monkeypatch.setattr(browser_session, "launch_search_context", launch)
+    monkeypatch.setattr(browser_session, "open_search_page", lambda context, policy: FakePage())
+    monkeypatch.setattr(browser_session, "child_rss_mb", lambda: None)
+    monkeypatch.setattr(scrape_engine.time, "sleep", sleeps.append)
+
+    sink = FakeSink()
+    worker = PlatformWorker(FakeAdapter(), Scheduler(["fake"]), sink, "unused-profile")
+    session = browser_session.BrowserSession(None, "unused-profile")
+    return worker, session, sink, calls, sleeps
+
+
+def test_scrape_relaunches_after_a_failed_launch(monkeypatch):
+    worker, session, sink, calls, sleeps = _worker(monkeypatch, launch_failures=1)
+
+    worker._scrape(session, {"keyword": "iPhone"})
+
+    assert calls["launch"] == 2
+    assert sleeps == [scrape_engine.LAUNCH_BACKOFF_SECONDS]
+    assert sink.saved == [("iPhone", FakeAdapter().items(None))]
+
+
+def test_failed_launches_skip_the_keyword_but_keep_the_worker(monkeypatch):
+    attempts = scrape_engine.MAX_BROWSER_RESTARTS + 1
+    worker, session, sink, calls, sleeps = _worker(monkeypatch, launch_failures=attempts)
+
+    worker._scrape(session, {"keyword": "iPhone"})
+    assert sink.saved == []
+    assert sleeps == [scrape_engine.LAUNCH_BACKOFF_SECONDS * 2 ** i for i in range(attempts)]
+
+    # 次のキーワードでは起動し直して続けられる
+    worker._scrape(session, {"keyword": "Switch"})
+    assert [keyword for keyword, _ in sink.saved] == ["Switch"]
+
+
+def test_recheck_leaves_the_item_when_the_browser_cannot_start(monkeypatch):
+    worker, session, sink, calls, sleeps = _worker(monkeypatch, launch_failures=1)
+    product = {"item_id": "m1", "product_url": "http://example.invalid/item/m1"}
+
+    worker._recheck(session, product)
+    assert sink.checks == []
+
+    worker._recheck(session, product)
+    assert sink.checks == [("m1", 900, "open")]
@@ -1,50 +1,163 @@
 import requests
 import feedparser
+import hashlib
 import os
 import re
-import google.generativeai as genai
 from dotenv import load_dotenv
 from database_manager import DatabaseManager
+from keywords import KeywordIndex
+import gemini
+import metrics
+import profiling
+from log_config import setup_logging
+import logging
 import sys
-import io
-import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
 
-# 文字化け対策
-sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8')
+logger = logging.getLogger("trend_watcher")
 
 load_dotenv()
-API_KEY = os.environ.get("GEMINI_API_KEY")
-genai.configure(api_key=API_KEY)
-model = genai.GenerativeModel('gemini-2.0-flash')
 
-def fetch_and_add_trends():
-    print("最新ニュースからトレンドを分析中...")
-    
-    # 複数のRSSソースからニュースを取得（安定性重視）
-    rss_urls = [
-        "https://news.yahoo.co.jp/rss/categories/business.xml",
-        "https://news.yahoo.co.jp/rss/categories/it.xml",
-        "https://news.yahoo.co.jp/rss/topics/top-picks.xml"
-    ]
-    
+# 複数のRSSソースからニュースを取得（安定性重視）
+# TREND_RSS_URLS にカンマ/改行区切りで指定すると差し替えられる
+DEFAULT_RSS_URLS = [
+    "https://news.yahoo.co.jp/rss/categories/business.xml",
+    "https://news.yahoo.co.jp/rss/categories/it.xml",
+    "https://news.yahoo.co.jp/rss/topics/top-picks.xml"
+]
+RSS_URLS = [u.strip() for u in re.split(r"[,\n]", os.environ.get("TREND_RSS_URLS", "")) if u.strip()] or DEFAULT_RSS_URLS
+FEED_TIMEOUT = float(os.environ.get("TREND_FEED_TIMEOUT", "10"))
+FEED_WORKERS = int(os.environ.get("TREND_FEED_WORKERS", "8"))
+ENTRIES_PER_FEED = int(os.environ.get("TREND_ENTRIES_PER_FEED", "10"))
+# この日数トレンドに挙がらなかったトレンド由来キーワードは監視を止める
+KEYWORD_TTL_DAYS = float(os.environ.get("TREND_KEYWORD_TTL_DAYS", "7"))
+USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
+
+
+def headline_hash(title):
+    return hashlib.sha1(" ".join(title.split()).encode("utf-8")).hexdigest()[:16]
+
+
+def fetch_feed(url, state):
+    """1つのフィードを条件付きGETで取得する。(フィード状態, 見出しリスト) を返す
+
+    ETag/Last-Modified が変わっていなければ 304 で本文を受け取らず、見出しは空になる。
+    """
+    headers = {"User-Agent": USER_AGENT}
+    if state.get('etag'):
+        headers["If-None-Match"] = state['etag']
+    if state.get('last_modified'):
+        headers["If-Modified-Since"] = state['last_modified']
+
+    with profiling.span("rss.fetch"):
+        response = requests.get(url, headers=headers, timeout=FEED_TIMEOUT)
+    metrics.incr("feed_requests")
+    if response.status_code == 304:
+        metrics.incr("feeds_not_modified")
+        return None, []
+    response.raise_for_status()
+
+    feed = feedparser.parse(response.content)
+    titles = [entry.title for entry in feed.entries[:ENTRIES_PER_FEED] if entry.get('title')]
+    new_state = {
+        "url": url,
+        "etag": response.headers.get("ETag"),
+        "last_modified": response.headers.get("Last-Modified"),
+        "checked_at": datetime.now(timezone.utc).isoformat()
+    }
+    return new_state, titles
+
+
+def fetch_headlines(db, urls):
+    """全フィードを並列に取得し、(未処理の見出し {hash: title}, 新しいフィード状態) を返す
+
+    フィード状態は見出しを処理し終えてから保存すること。先に保存すると、抽出に
+    失敗した次の回は 304 で見出しが返らず、再挑戦できない。
+    """
+    states = db.get_feed_states(urls)
     headlines = []
-    for url in rss_urls:
-        try:
-            feed = feedparser.parse(url)
-            for entry in feed.entries[:10]:
-                headlines.append(entry.title)
-        except Exception as e:
-            print(f"RSS取得エラー ({url}): {e}")
-
-    if not headlines:
-        print("ニュース記事を取得できませんでした。")
+    new_states = []
+    with ThreadPoolExecutor(max_workers=min(FEED_WORKERS, len(urls))) as pool:
+        futures = {url: pool.submit(fetch_feed, url, states.get(url, {})) for url in urls}
+        for url, future in futures.items():
+            try:
+                state, titles = future.result()
+            except Exception as e:
+                logger.warning(f"RSS取得エラー ({url}): {e}", extra={"feed_url": url})
+                continue
+            if state:
+                new_states.append(state)
+            headlines.extend(titles)
+
+    unique = {headline_hash(t): t for t in headlines}
+    seen = db.get_seen_headlines(unique.keys())
+    return {h: t for h, t in unique.items() if h not in seen}, new_states
+
+
+def upsert_trend_keywords(db, keywords):
+    """トレンドキーワードを既存の検索設定と突き合わせ、1回のupsertで反映する
+
+    表記揺れ・類似キーワードは既存行の熱量加算として扱い、新しい行を増やさない。
+    戻り値は新規追加した件数。
+    """
+    index = KeywordIndex(db.get_search_config_index_rows())
+    now = datetime.now(timezone.utc).isoformat()
+    rows = {}
+    added_count = 0
+
+    for keyword in keywords:
+        if len(keyword) < 2: continue
+
+        existing = index.match(keyword)
+        if existing is None:
+            row = {"id": str(uuid.uuid4()), "keyword": keyword, "source": "trend",
+                   "trend_score": 1, "trend_seen_at": now, "is_active": True}
+            index.add(row)
+            logger.info(f"追加: {keyword}", extra={"keyword": keyword})
+            added_count += 1
+        else:
+            # 再びトレンドに挙がったキーワードは熱量を加算（分析優先度に反映）
+            # 期限切れで止めたトレンド由来のキーワードは再開し、手動で止めたものはそのまま
+            row = rows.get(existing['id'], existing)
+            row = {
+                "id": row['id'], "keyword": row['keyword'], "source": row.get('source') or 'manual',
+                "trend_score": (row.get('trend_score') or 0) + 1, "trend_seen_at": now,
+                "is_active": row.get('is_active') or row.get('source') == 'trend'
+            }
+            logger.info(f"既登録（熱量を更新）: {keyword} -> {row['keyword']}", extra={"keyword": row['keyword']})
+        rows[row['id']] = row
+
+    try:
+        db.upsert_search_configs(list(rows.values()))
+    except Exception as e:
+        logger.error(f"DBエラー: {e}")
+        return 0
+    return added_count
+
+
+@profiling.profiled("trend_watcher")
+def fetch_and_add_trends():
+    logger.info("最新ニュースからトレンドを分析中...")
+    db = DatabaseManager()
+
+    new_headlines, feed_states = fetch_headlines(db, RSS_URLS)
+    if not new_headlines:
+        # 新しい見出しが無ければ、同じ内容でGeminiを呼ばない
+        logger.info("新しいニュース見出しがないため、キーワード抽出をスキップします。")
+        db.save_feed_states(feed_states)
+        metrics.incr("model_calls_avoided")
+        metrics.flush(db, "trend_watcher")
         return
+    logger.info(f"新しい見出し: {len(new_headlines)}件")
+    headlines = list(new_headlines.values())
 
     # Geminiにトレンドワードを抽出させる
     prompt = f"""
     以下の最新ニュースの見出しを読み、現在日本で注目が集まっており、
     メルカリなどのフリマサイトで「価格が高騰しそう」または「需要が急増しそう」な
-    具体的な商品名やキーワードを5つ抽出してください。
+    具体的な商品名やキーワードを最大5つ抽出してください。
     
     【ニュース見出し】
     {chr(10).join(headlines)}
@@ -52,11 +165,12 @@ def fetch_and_add_trends():
     【回答ルール】
     ・具体的な固有名詞（商品名、キャラクター名、ブランド名、イベント名）を出すこと。
     ・「設定」や「ニュース」などの一般用語は除外。
-    ・1行に1キーワード、合計5つ。解説は不要。
+    ・1行に1キーワード、最大5つ。解説は不要。
     """
 
     try:
-        response = model.generate_content(prompt)
+        metrics.incr("model_calls")
+        response = gemini.get_model().generate_content(prompt)
         # 行ごとに分割し、数字・記号・空白を徹底的に除去
         raw_lines = response.text.strip().split('\n')
         ai_keywords = []
@@ -67,31 +181,31 @@ def fetch_and_add_trends():
             if k:
                 ai_keywords.append(k)
         
-        print(f"AIが予測したトレンドワード: {ai_keywords}")
+        logger.info(f"AIが予測したトレンドワード: {ai_keywords}", extra={"keywords": ai_keywords})
 
-        db = DatabaseManager()
-        added_count = 0
+        # 抽出に成功した見出しだけを処理済みにする（失敗時は次回再挑戦）
+        now = datetime.now(timezone.utc).isoformat()
+        db.mark_headlines_seen([
+            {"hash": h, "title": t[:200], "first_seen_at": now} for h, t in new_headlines.items()
+        ])
+        # 見出しを処理済みにできてから条件付きGETの状態を進める
+        db.save_feed_states(feed_states)
 
-        for keyword in ai_keywords[:5]:
-            if len(keyword) < 2: continue
-            
-            print(f"チェック中: {keyword}")
-            try:
-                existing = db.supabase.table("search_configs").select("id").eq("keyword", keyword).execute()
-                if len(existing.data) == 0:
-                    db.supabase.table("search_configs").insert({"keyword": keyword, "target_profit": 3000}).execute()
-                    print(f"  -> 追加: {keyword}")
-                    added_count += 1
-                else:
-                    print("  -> 既登録")
-            except Exception as e:
-                print(f"  -> DBエラー: {e}")
-            time.sleep(0.5)
+        added_count = upsert_trend_keywords(db, ai_keywords[:5])
+        expired = db.expire_trend_keywords(KEYWORD_TTL_DAYS)
+        if expired:
+            logger.info(f"期限切れのトレンドキーワードを無効化: {expired}件")
+        metrics.incr("keywords_expired", expired)
 
-        print(f"完了。新規追加: {added_count}件")
+        logger.info(f"完了。新規追加: {added_count}件")
+        metrics.incr("keywords_added", added_count)
+        metrics.flush(db, "trend_watcher")
 
     except Exception as e:
-        print(f"AI分析エラー: {e}")
+        logger.error(f"AI分析エラー: {e}")
 
 if __name__ == "__main__":
+    if "--profile" in sys.argv:
+        profiling.enable()
+    setup_logging("trend_watcher")
     fetch_and_add_trends()
\ No newline at end of file
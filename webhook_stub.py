@@ -0,0 +1,64 @@
+import json
+import sys
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Discord Webhook のローカル代替サーバー（通知まわりの動作確認用）
+#
+#   python webhook_stub.py [port] [バケット容量] [リセット秒]
+#   DISCORD_WEBHOOK_URL=http://127.0.0.1:8765/webhook NOTIFY_RANKS=S,A python ai_analyzer.py
+#
+# Discordと同じく X-RateLimit-* ヘッダーを返し、容量を超えると 429 と retry_after を返す。
+
+PORT = int(sys.argv[1]) if len(sys.argv) > 1 else 8765
+BUCKET_LIMIT = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+RESET_AFTER = float(sys.argv[3]) if len(sys.argv) > 3 else 2.0
+
+state = {"remaining": BUCKET_LIMIT, "reset_at": time.time() + RESET_AFTER, "messages": 0, "embeds": 0}
+
+
+class WebhookHandler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        now = time.time()
+        if now >= state["reset_at"]:
+            state["remaining"], state["reset_at"] = BUCKET_LIMIT, now + RESET_AFTER
+        reset_after = max(state["reset_at"] - now, 0)
+
+        if state["remaining"] <= 0:
+            self._reply(429, {"message": "You are being rate limited.", "retry_after": reset_after, "global": False},
+                        reset_after)
+            print(f"429 (retry_after={reset_after:.2f}s)")
+            return
+
+        state["remaining"] -= 1
+        embeds = json.loads(body).get("embeds", [])
+        if not 1 <= len(embeds) <= 10:
+            self._reply(400, {"message": "Invalid Form Body"}, reset_after)
+            return
+        state["messages"] += 1
+        state["embeds"] += len(embeds)
+        print(f"204 message #{state['messages']}: {len(embeds)} embeds (total {state['embeds']})")
+        self._reply(204, None, reset_after)
+
+    def _reply(self, status, payload, reset_after):
+        self.send_response(status)
+        self.send_header("X-RateLimit-Limit", str(BUCKET_LIMIT))
+        self.send_header("X-RateLimit-Remaining", str(max(state["remaining"], 0)))
+        self.send_header("X-RateLimit-Reset-After", f"{reset_after:.3f}")
+        if payload is not None:
+            data = json.dumps(payload).encode()
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+        else:
+            self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+if __name__ == "__main__":
+    print(f"Webhook stub listening on http://127.0.0.1:{PORT}/webhook")
+    ThreadingHTTPServer(("127.0.0.1", PORT), WebhookHandler).serve_forever()